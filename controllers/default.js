@@ -1,13 +1,213 @@
 const Pty = require('node-pty');
 const fs = require('fs');
+const net = require('net');
+const child = require('child_process');
+
+// Number of Python workers started ahead of the visitors
+const POOL_SIZE = parseInt(process.env.WORKER_POOL_SIZE || '2', 10);
+// Maximum number of terminal sessions at the same time
+const MAX_SESSIONS = parseInt(process.env.MAX_SESSIONS || '20', 10);
+// Milliseconds to wait before replacing a worker which failed to start
+const RESPAWN_DELAY = 5000;
+// Milliseconds a session process has to save its data after SIGHUP
+const EXIT_GRACE = 5000;
+// Printed by run.py --standby when the worker is ready for a session
+const STANDBY_READY = 'spa-booking: standby ready';
+// With SESSION_SERVER all sessions run in one Python process, which
+// shares the sheet data between them, instead of a process for each
+const SESSION_SERVER = !!process.env.SESSION_SERVER;
+const SESSION_SOCKET = process.env.SESSION_SOCKET || 'spa_sessions.sock';
+// With CACHE_DAEMON the session processes get the sheet data from one
+// cache daemon instead of each reading the spreadsheet
+const CACHE_DAEMON = !!process.env.CACHE_DAEMON && !SESSION_SERVER;
+const CACHE_SOCKET = process.env.CACHE_SOCKET || 'spa_cache.sock';
+const CACHE_ARGS = CACHE_DAEMON ? ['--cache-client', '--cache-socket', CACHE_SOCKET] : [];
+
+// Standby workers ready to be given a session
+const idle = [];
+let starting = 0;
+let sessions = 0;
 
 exports.install = function () {
 
     ROUTE('/');
     WEBSOCKET('/', socket, ['raw']);
 
+    // With CREDS the workers are started when creds.json is written
+    if (process.env.CREDS == null)
+        start();
+
 };
 
+function start() {
+    if (SESSION_SERVER) {
+        supervise('Session server', ['--server', '--socket', SESSION_SOCKET, '--max-sessions', String(MAX_SESSIONS)]);
+        return;
+    }
+    // The sessions read the spreadsheet themselves until the daemon runs
+    if (CACHE_DAEMON)
+        supervise('Cache daemon', ['--cache-daemon', '--cache-socket', CACHE_SOCKET]);
+    replenish();
+}
+
+// Run a Python server and restart it when it stops
+function supervise(name, args) {
+    const server = child.spawn('python3', ['run.py'].concat(args), {
+        cwd: process.env.PWD,
+        env: process.env,
+        stdio: 'inherit'
+    });
+    server.on('exit', function (code) {
+        console.log(name + ' exited with code ' + code);
+        setTimeout(function () {
+            supervise(name, args);
+        }, RESPAWN_DELAY);
+    });
+}
+
+// Connect the client to a session of the session server
+function connect(client) {
+    const connection = net.createConnection(SESSION_SOCKET);
+    connection.setEncoding('utf8');
+    connection.on('data', function (data) {
+        client.send(data);
+    });
+    connection.on('close', function () {
+        detach(client);
+    });
+    connection.on('error', function (err) {
+        console.log('Session server connection failed: ', err.message);
+    });
+    // The same interface as the terminal of a process
+    return {
+        write: function (data) {
+            connection.write(data);
+        },
+        kill: function () {
+            connection.destroy();
+        }
+    };
+}
+
+function spawn(args) {
+    return Pty.spawn('python3', ['run.py'].concat(args, CACHE_ARGS), {
+        name: 'xterm-color',
+        cols: 80,
+        rows: 24,
+        cwd: process.env.PWD,
+        env: process.env
+    });
+}
+
+// Start standby workers until the pool is full. A standby worker
+// imports the modules, authorises and loads the sheet data, then
+// waits for SIGUSR1 before it shows the menu.
+function replenish() {
+    while (idle.length + starting < POOL_SIZE) {
+        startWorker();
+    }
+}
+
+function startWorker() {
+
+    const worker = { tty: spawn(['--standby']), ready: false, client: null, output: '' };
+    starting++;
+
+    worker.tty.on('data', function (data) {
+        if (worker.client) {
+            worker.client.send(data);
+            return;
+        }
+        // The output of a worker without a session is discarded
+        if (!worker.ready) {
+            worker.output = (worker.output + data).slice(-1024);
+            if (worker.output.indexOf(STANDBY_READY) !== -1) {
+                worker.ready = true;
+                worker.output = '';
+                starting--;
+                idle.push(worker);
+            }
+        }
+    });
+
+    worker.tty.on('exit', function () {
+        const index = idle.indexOf(worker);
+        if (index !== -1)
+            idle.splice(index, 1);
+
+        if (worker.client) {
+            detach(worker.client);
+            return;
+        }
+
+        if (worker.ready) {
+            replenish();
+        } else {
+            // Don't restart a worker which fails at once in a loop
+            starting--;
+            console.log('Standby worker exited before it was ready');
+            setTimeout(replenish, RESPAWN_DELAY);
+        }
+    });
+}
+
+// Give the client a standby worker, or a new process if none is ready
+function attach(client) {
+
+    sessions++;
+    if (SESSION_SERVER) {
+        client.tty = connect(client);
+        return;
+    }
+
+    const worker = idle.shift();
+
+    if (worker) {
+        worker.client = client;
+        client.tty = worker.tty;
+        client.tty.kill('SIGUSR1');
+        replenish();
+        return;
+    }
+
+    client.tty = spawn([]);
+    client.tty.on('data', function (data) {
+        client.send(data);
+    });
+    client.tty.on('exit', function () {
+        detach(client);
+    });
+    replenish();
+}
+
+function detach(client) {
+    if (client.tty) {
+        client.tty = null;
+        sessions--;
+        client.close();
+        console.log("Process killed");
+    }
+}
+
+// Ask the session process to exit, so it saves the queued bookings and
+// the snapshot, and kill it if it doesn't exit in time
+function stop(tty) {
+    tty.kill('SIGHUP');
+    // A connection to the session server is closed at once
+    if (!tty.on)
+        return;
+    const timer = setTimeout(function () {
+        try {
+            tty.kill('SIGKILL');
+        } catch (err) {
+            // Exited meanwhile
+        }
+    }, EXIT_GRACE);
+    tty.on('exit', function () {
+        clearTimeout(timer);
+    });
+}
+
 function socket() {
 
     this.encodedecode = false;
@@ -15,32 +215,23 @@ function socket() {
 
     this.on('open', function (client) {
 
-        // Spawn terminal
-        client.tty = Pty.spawn('python3', ['run.py'], {
-            name: 'xterm-color',
-            cols: 80,
-            rows: 24,
-            cwd: process.env.PWD,
-            env: process.env
-        });
-
-        client.tty.on('exit', function (code, signal) {
-            client.tty = null;
+        if (sessions >= MAX_SESSIONS) {
+            client.send('The booking system is busy at the moment. Please try again in a minute.\r\n');
             client.close();
-            console.log("Process killed");
-        });
+            return;
+        }
 
-        client.tty.on('data', function (data) {
-            client.send(data);
-        });
+        attach(client);
 
     });
 
     this.on('close', function (client) {
         if (client.tty) {
-            client.tty.kill(9);
+            const tty = client.tty;
             client.tty = null;
-            console.log("Process killed and terminal unloaded");
+            sessions--;
+            stop(tty);
+            console.log("Process stopped and terminal unloaded");
         }
     });
 
@@ -55,6 +246,8 @@ if (process.env.CREDS != null) {
         if (err) {
             console.log('Error writing file: ', err);
             socket.emit("console_output", "Error saving credentials: " + err);
+            return;
         }
+        start();
     });
-}
\ No newline at end of file
+}
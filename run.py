@@ -1,25 +1,319 @@
-import gspread
-from google.oauth2.service_account import Credentials
+from __future__ import annotations
+
+import argparse
+import signal
+import sys
+from contextlib import nullcontext
+from typing import TYPE_CHECKING
 
-from source.flow_controller import FlowController
-from source.mixins import console
 from source.sheet_manager import SpaSheet
+from source.snapshot import SNAPSHOT_PATH, Snapshot
+from source.sockets import CACHE_SOCKET, MAX_SESSIONS, SOCKET_PATH
+from source.sqlite_storage import DATABASE_PATH, SQLiteStorage
+from source.startup import StartupProfile, warm_up
+from source.storage import StorageBackend
+from source.write_behind import QUEUE_PATH, BookingFlusher, BookingQueue
+
+if TYPE_CHECKING:
+    from source.sheets_client import SheetConnection
+
+SHEET_NAME = "spa_booking"
+# Seconds the spinner waits for the sheet data before showing the menu
+STARTUP_DEADLINE = 3.0
+# Printed by a standby worker when it is ready to be given a session,
+# the terminal server looks for it in the output
+STANDBY_READY = "spa-booking: standby ready"
+
+
+def parse_args(args: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Spa booking system")
+    parser.add_argument(
+        "--storage",
+        choices=("sheets", "sqlite"),
+        default="sheets",
+        help="where to keep services and bookings (default: sheets)",
+    )
+    parser.add_argument(
+        "--database",
+        default=DATABASE_PATH,
+        help=f"SQLite database file (default: {DATABASE_PATH})",
+    )
+    parser.add_argument(
+        "--import-sheets",
+        action="store_true",
+        help="copy the Google spreadsheet into the SQLite database",
+    )
+    parser.add_argument(
+        "--write-behind",
+        action="store_true",
+        help="queue new bookings in a local file and append them"
+        " to the spreadsheet in the background",
+    )
+    parser.add_argument(
+        "--queue",
+        default=QUEUE_PATH,
+        help="name of the write-behind queue files, each process adds"
+        f" its own id to it (default: {QUEUE_PATH})",
+    )
+    parser.add_argument(
+        "--delta-sync",
+        action="store_true",
+        help="refresh bookings by reading only the new rows of the sheet",
+    )
+    parser.add_argument(
+        "--snapshot",
+        default=SNAPSHOT_PATH,
+        help="local copy of the sheet data loaded at start"
+        f" (default: {SNAPSHOT_PATH})",
+    )
+    parser.add_argument(
+        "--no-snapshot",
+        dest="snapshot",
+        action="store_const",
+        const=None,
+        help="always download the sheet data",
+    )
+    parser.add_argument(
+        "--startup-deadline",
+        type=float,
+        default=STARTUP_DEADLINE,
+        help="seconds to wait for the sheet data at start, the rest"
+        f" is loaded in the background (default: {STARTUP_DEADLINE:g})",
+    )
+    parser.add_argument(
+        "--startup-profile",
+        action="store_true",
+        help="print the time of each startup phase and import",
+    )
+    parser.add_argument(
+        "--standby",
+        action="store_true",
+        help="load everything, then wait for SIGUSR1 before showing the"
+        " menu (used by the worker pool of the terminal server)",
+    )
+    parser.add_argument(
+        "--server",
+        action="store_true",
+        help="run the sessions of many terminals in this process, they"
+        " connect to a Unix socket and share the sheet data",
+    )
+    parser.add_argument(
+        "--socket",
+        default=SOCKET_PATH,
+        help=f"Unix socket of the session server (default: {SOCKET_PATH})",
+    )
+    parser.add_argument(
+        "--max-sessions",
+        type=int,
+        default=MAX_SESSIONS,
+        help="sessions the server runs at the same time"
+        f" (default: {MAX_SESSIONS})",
+    )
+    parser.add_argument(
+        "--cache-daemon",
+        action="store_true",
+        help="keep the sheet data for the sessions on this machine and"
+        " answer them on the cache socket",
+    )
+    parser.add_argument(
+        "--cache-client",
+        action="store_true",
+        help="get the sheet data from the cache daemon, if it is running",
+    )
+    parser.add_argument(
+        "--cache-socket",
+        default=CACHE_SOCKET,
+        help=f"Unix socket of the cache daemon (default: {CACHE_SOCKET})",
+    )
+    args = parser.parse_args(args)
+    if args.write_behind and sys.platform == "win32":
+        parser.error("--write-behind is not supported on this platform")
+    if args.standby and not hasattr(signal, "SIGUSR1"):
+        parser.error("--standby is not supported on this platform")
+    if args.standby and (args.server or args.cache_daemon):
+        parser.error("--standby only works for terminal sessions")
+    if args.server and args.cache_daemon:
+        parser.error("--server can't be used with --cache-daemon")
+    if args.cache_client and (args.write_behind or args.delta_sync):
+        parser.error(
+            "--cache-client can't be used with --write-behind"
+            " or --delta-sync, the cache daemon writes the bookings"
+        )
+    if args.cache_daemon and args.storage == "sqlite":
+        parser.error("--cache-daemon only works with --storage sheets")
+    return args
+
+
+def connect() -> SheetConnection:
+    """Create the connection to the spreadsheet. The Sheets client and
+    gspread are imported here, the SQLite backend doesn't need them.
+    """
+    from source.sheets_client import SheetConnection
+
+    return SheetConnection(SHEET_NAME)
+
+
+def create_storage(
+    args: argparse.Namespace, connection: SheetConnection | None = None
+) -> StorageBackend:
+    """Create the storage backend selected in the command line arguments
+
+    Args:
+        args (argparse.Namespace): The parsed arguments
+        connection (SheetConnection | None, optional): Connection to
+        the spreadsheet, opened only when the backend needs it.
+        Defaults to None, which connects when needed.
+
+    Returns:
+        StorageBackend: The backend
+    """
+    if args.storage == "sqlite":
+        storage = SQLiteStorage(args.database)
+        if args.import_sheets:
+            sheet = SpaSheet((connection or connect()).open())
+            storage.import_records(
+                sheet.spa_info.get_all_records(),
+                sheet.booking_data.get_all_records(),
+            )
+        return storage
+    if args.cache_client:
+        from source.cache_daemon import CacheClient, CachedSpaSheet
+
+        client = CacheClient(args.cache_socket)
+        try:
+            client.connect()
+        except OSError:
+            # Without the daemon the session reads the spreadsheet
+            pass
+        else:
+            return CachedSpaSheet(client)
+    queue = BookingQueue(args.queue) if args.write_behind else None
+    # The spreadsheet is opened on first use, after the snapshot is loaded
+    return SpaSheet(
+        None,
+        queue=queue,
+        delta_sync=args.delta_sync,
+        connection=connection or connect(),
+    )
+
 
-SCOPE = (
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive.file",
-    "https://www.googleapis.com/auth/drive",
-)
-CREDS = Credentials.from_service_account_file("creds.json")
-SCOPED_CREDS = CREDS.with_scopes(SCOPE)
-GSPREAD_CLIENT = gspread.authorize(SCOPED_CREDS)
-SHEET = GSPREAD_CLIENT.open("spa_booking")
+def wait_for_session() -> None:
+    """Tell the terminal server that the standby worker is ready and
+    wait until it is given a session. SIGUSR1 must be blocked before
+    any thread is started, so only this wait receives it.
+    """
+    print(STANDBY_READY, flush=True)
+    signal.sigwait({signal.SIGUSR1})
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGUSR1})
+
+
+def serve_sessions(
+    storage: StorageBackend, args: argparse.Namespace, session
+) -> None:
+    """Run the session server until it is stopped
+
+    Args:
+        storage (StorageBackend): The storage shared by the sessions
+        args (argparse.Namespace): The parsed arguments
+        session: Function which runs a session, e.g. FlowController
+    """
+    import asyncio
+
+    from source.session_server import SessionServer
+
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    server = SessionServer(storage, session, args.max_sessions)
+    print(f"Serving sessions on {args.socket}", flush=True)
+    asyncio.run(server.serve(args.socket))
+
+
+def serve_cache(storage: SpaSheet, args: argparse.Namespace) -> None:
+    """Run the cache daemon until it is stopped
+
+    Args:
+        storage (SpaSheet): The sheet shared by the sessions
+        args (argparse.Namespace): The parsed arguments
+    """
+    import asyncio
+
+    from source.cache_daemon import CacheDaemon
+
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"Cache daemon listening on {args.cache_socket}", flush=True)
+    asyncio.run(CacheDaemon(storage).serve(args.cache_socket))
 
 
 def main():
-    with console.status("Loading Spa...", spinner="earth"):
-        sheet = SpaSheet(SHEET)
-    FlowController(sheet)
+    args = parse_args()
+    if args.standby:
+        signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGUSR1})
+    profile = StartupProfile(enabled=args.startup_profile)
+    profile.install()
+    with profile.phase("imports"):
+        # Imported after the profile is installed to measure them
+        from source.flow_controller import FlowController
+        from source.mixins import console
+
+    if hasattr(signal, "SIGHUP"):
+        # The web terminal stops a session with SIGHUP when the visitor
+        # leaves and kills it after a grace period, exit normally to
+        # save the queued bookings and the snapshot
+        signal.signal(signal.SIGHUP, lambda *_: sys.exit(0))
+
+    snapshot = None
+    # A standby worker has no visitor yet, its output is discarded
+    loading = (
+        nullcontext()
+        if args.standby
+        else console.status("Loading Spa...", spinner="earth")
+    )
+    with loading:
+        with profile.phase("storage"):
+            storage = create_storage(args)
+        with profile.phase("sheet data"):
+            if isinstance(storage, SpaSheet):
+                # A client of the cache daemon is a subclass, the daemon
+                # keeps the snapshot for its clients
+                if args.snapshot and type(storage) is SpaSheet:
+                    snapshot = Snapshot(SHEET_NAME, args.snapshot)
+                if snapshot is not None and snapshot.load(storage):
+                    snapshot.revalidate(storage)
+                else:
+                    storage.prefetch(args.startup_deadline)
+
+    if profile.enabled:
+        profile.uninstall()
+        console.print("\n".join(profile.report()), highlight=False)
+    if args.standby:
+        warm_up().join()
+        wait_for_session()
+        if isinstance(storage, SpaSheet):
+            # Reload the data which expired while the worker waited
+            with console.status("Loading Spa...", spinner="earth"):
+                storage.prefetch(args.startup_deadline)
+    else:
+        # Modules used after the main menu are imported while it is shown
+        warm_up()
+
+    flusher = None
+    if getattr(storage, "queue", None) is not None:
+        flusher = BookingFlusher(storage)
+        flusher.start()
+    try:
+        if args.server:
+            serve_sessions(storage, args, FlowController)
+        elif args.cache_daemon:
+            serve_cache(storage, args)
+        else:
+            FlowController(storage)
+    finally:
+        if flusher is not None:
+            flusher.stop()
+            storage.queue.close()
+        if snapshot is not None:
+            snapshot.save(storage)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, Iterator
+
+# Slot steps and opening hours must be multiples of this number of minutes
+SLOT_RESOLUTION = 15
+DEFAULT_SLOT_STEP = 60
+DEFAULT_OPENING_HOURS = {weekday: ("08:00", "21:00") for weekday in range(7)}
+
+
+def time_to_minutes(time_str: str) -> int:
+    """Convert a time string in format HH:MM to minutes since midnight
+
+    Args:
+        time_str (str): The time string
+
+    Returns:
+        int: Number of minutes since midnight
+    """
+    time_obj = time.fromisoformat(time_str)
+    return time_obj.hour * 60 + time_obj.minute
+
+
+def minutes_to_datetime(date_obj: date, minutes: int) -> datetime:
+    """Convert minutes since midnight of the date to datetime object
+
+    Args:
+        date_obj (date): The date
+        minutes (int): Number of minutes since midnight
+
+    Returns:
+        datetime: The datetime object
+    """
+    return datetime.combine(date_obj, time()) + timedelta(minutes=minutes)
+
+
+class SlotMask:
+    """Available start times of a day stored as bits of an integer.
+    Bit n means that a service can start at n * SLOT_RESOLUTION minutes
+    since midnight.
+    """
+
+    __slots__ = ("bits",)
+
+    def __init__(self, bits: int = 0):
+        self.bits = bits
+
+    @classmethod
+    def from_minutes(cls, starts: Iterable[int]) -> SlotMask:
+        """Create a mask from start times
+
+        Args:
+            starts (Iterable[int]): Start times in minutes since midnight
+
+        Raises:
+            ValueError: If a start time is not a multiple of SLOT_RESOLUTION
+
+        Returns:
+            SlotMask: The mask of the start times
+        """
+        bits = 0
+        for start in starts:
+            slot, remainder = divmod(start, SLOT_RESOLUTION)
+            if remainder:
+                message = (
+                    f"Start time must be a multiple "
+                    f"of {SLOT_RESOLUTION} minutes."
+                )
+                raise ValueError(message)
+            bits |= 1 << slot
+        return cls(bits)
+
+    @classmethod
+    def from_time_ranges(cls, time_ranges: list[list[datetime]]) -> SlotMask:
+        """Create a mask from the start times of available time ranges
+
+        Args:
+            time_ranges (list[list[datetime]]): List of available times
+
+        Returns:
+            SlotMask: The mask of the start times
+        """
+        return cls.from_minutes(
+            time_range[0].hour * 60 + time_range[0].minute
+            for time_range in time_ranges
+        )
+
+    def __contains__(self, minutes: int) -> bool:
+        slot, remainder = divmod(minutes, SLOT_RESOLUTION)
+        return not remainder and slot >= 0 and bool(self.bits >> slot & 1)
+
+    def __iter__(self) -> Iterator[int]:
+        bits = self.bits
+        while bits:
+            lowest = bits & -bits
+            yield (lowest.bit_length() - 1) * SLOT_RESOLUTION
+            bits ^= lowest
+
+    def __len__(self) -> int:
+        return bin(self.bits).count("1")
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, SlotMask):
+            return NotImplemented
+        return self.bits == other.bits
+
+    def __repr__(self) -> str:
+        return f"SlotMask({list(self)})"
+
+
+class AvailabilityEngine:
+    """Class to calculate free booking slots. All calculations are done
+    with minutes since midnight, datetime objects are created only
+    for the result.
+    """
+
+    def __init__(
+        self,
+        opening_hours: dict[int, tuple[str, str] | None] | None = None,
+        slot_step: int = DEFAULT_SLOT_STEP,
+        buffer: int = 0,
+    ):
+        """
+        Args:
+            opening_hours (dict[int, tuple[str, str] | None], optional):
+            Open and close time in format HH:MM for each weekday where
+            Monday is 0. Days which are missing or None are closed.
+            Defaults to 08:00-21:00 every day.
+            slot_step (int, optional): Minutes between suggested start
+            times. Defaults to 60.
+            buffer (int, optional): Minutes kept free before and after
+            each booking. Defaults to 0.
+
+        Raises:
+            ValueError: If the slot step, the buffer or the opening hours
+            are not multiples of SLOT_RESOLUTION
+        """
+        if opening_hours is None:
+            opening_hours = DEFAULT_OPENING_HOURS
+
+        if slot_step <= 0 or slot_step % SLOT_RESOLUTION:
+            message = (
+                f"Slot step must be a positive multiple "
+                f"of {SLOT_RESOLUTION} minutes."
+            )
+            raise ValueError(message)
+
+        if buffer < 0:
+            message = "Buffer must not be negative."
+            raise ValueError(message)
+
+        self.slot_step = slot_step
+        self.buffer = buffer
+        self.opening_hours = {}
+        for weekday, hours in opening_hours.items():
+            if hours is None:
+                continue
+            open_time, close_time = map(time_to_minutes, hours)
+            if open_time % SLOT_RESOLUTION or close_time % SLOT_RESOLUTION:
+                message = (
+                    f"Opening hours must be multiples "
+                    f"of {SLOT_RESOLUTION} minutes."
+                )
+                raise ValueError(message)
+            self.opening_hours[weekday] = (open_time, close_time)
+
+    def free_intervals(
+        self, date_obj: date, booked: list[tuple[int, int]]
+    ) -> list[tuple[int, int]]:
+        """Calculate free intervals of the day between the bookings
+
+        Args:
+            date_obj (date): The date
+            booked (list[tuple[int, int]]): Sorted booked intervals
+            in minutes
+
+        Returns:
+            list[tuple[int, int]]: Sorted free intervals in minutes
+        """
+        hours = self.opening_hours.get(date_obj.weekday())
+        if hours is None:
+            return []
+
+        open_time, close_time = hours
+        free = []
+        cursor = open_time
+        for start, end in booked:
+            # The buffer is not needed at the opening and closing time
+            if start > open_time:
+                start -= self.buffer
+            if end < close_time:
+                end += self.buffer
+
+            if start > cursor:
+                free.append((cursor, min(start, close_time)))
+            cursor = max(cursor, end)
+            if cursor >= close_time:
+                break
+        else:
+            if cursor < close_time:
+                free.append((cursor, close_time))
+
+        return free
+
+    def slot_starts(
+        self, date_obj: date, duration: int, booked: list[tuple[int, int]]
+    ) -> list[int]:
+        """Calculate start times of the free slots. The start times are
+        aligned to the slot step counting from the opening time.
+
+        Args:
+            date_obj (date): The date
+            duration (int): Duration of the service in minutes
+            booked (list[tuple[int, int]]): Sorted booked intervals
+            in minutes
+
+        Returns:
+            list[int]: Sorted start times in minutes
+        """
+        free = self.free_intervals(date_obj, booked)
+        if not free:
+            return []
+
+        open_time = self.opening_hours[date_obj.weekday()][0]
+        step = self.slot_step
+        starts = []
+        for free_start, free_end in free:
+            # Round the start up to the next step
+            first = open_time - (open_time - free_start) // step * step
+            starts.extend(range(first, free_end - duration + 1, step))
+        return starts
+
+    def range_slot_starts(
+        self,
+        first_day: date,
+        days: int,
+        duration: int,
+        booked_days: Iterable[int],
+        starts: Iterable[int],
+        ends: Iterable[int],
+    ) -> dict[date, list[int]]:
+        """Calculate start times of the free slots for each day
+        of the range. The bookings are given as columns, e.g. the
+        columns of a BookingStore.
+
+        Args:
+            first_day (date): The first date of the range
+            days (int): Number of days in the range
+            duration (int): Duration of the service in minutes
+            booked_days (Iterable[int]): Day of each booking counted
+            from the first day
+            starts (Iterable[int]): Start minute of each booking
+            ends (Iterable[int]): End minute of each booking
+
+        Returns:
+            dict[date, list[int]]: Sorted start times for each date
+        """
+        booked = {}
+        for day, start, end in zip(booked_days, starts, ends):
+            if 0 <= day < days:
+                booked.setdefault(day, []).append((start, end))
+
+        result = {}
+        for day in range(days):
+            date_obj = first_day + timedelta(days=day)
+            result[date_obj] = self.slot_starts(
+                date_obj, duration, sorted(booked.get(day, []))
+            )
+        return result
+
+    def slot_mask(
+        self, date_obj: date, duration: int, booked: list[tuple[int, int]]
+    ) -> SlotMask:
+        """Calculate start times of the free slots as a SlotMask
+
+        Args:
+            date_obj (date): The date
+            duration (int): Duration of the service in minutes
+            booked (list[tuple[int, int]]): Sorted booked intervals
+            in minutes
+
+        Returns:
+            SlotMask: The mask of the start times
+        """
+        return SlotMask.from_minutes(
+            self.slot_starts(date_obj, duration, booked)
+        )
+
+    def available_times(
+        self, date_obj: date, duration: int, booked: list[tuple[int, int]]
+    ) -> list[list[datetime]]:
+        """Calculate available time ranges for booking
+
+        Args:
+            date_obj (date): The date
+            duration (int): Duration of the service in minutes
+            booked (list[tuple[int, int]]): Sorted booked intervals
+            in minutes
+
+        Returns:
+            list[list[datetime]]: List of [start, end] time ranges
+        """
+        return self.time_ranges(
+            date_obj, duration, self.slot_starts(date_obj, duration, booked)
+        )
+
+    def time_ranges(
+        self, date_obj: date, duration: int, starts: Iterable[int]
+    ) -> list[list[datetime]]:
+        """Convert start times of the slots to time ranges
+
+        Args:
+            date_obj (date): The date
+            duration (int): Duration of the service in minutes
+            starts (Iterable[int]): Start times in minutes
+
+        Returns:
+            list[list[datetime]]: List of [start, end] time ranges
+        """
+        midnight = minutes_to_datetime(date_obj, 0)
+        service_duration = timedelta(minutes=duration)
+        result = []
+        for start in starts:
+            start_time = midnight + timedelta(minutes=start)
+            result.append([start_time, start_time + service_duration])
+        return result
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import TYPE_CHECKING
+
+from source.availability import AvailabilityEngine
+
+try:
+    import numpy as np
+except ImportError:  # numpy is an optional dependency
+    np = None
+
+if TYPE_CHECKING:
+    from numpy.typing import ArrayLike, NDArray
+
+MINUTES_PER_DAY = 24 * 60
+
+
+class BitmapAvailability(AvailabilityEngine):
+    """Vectorized availability backend which gives the same results as
+    AvailabilityEngine. Each day is represented by a minute occupancy
+    array, so many days and bookings are processed at once with numpy.
+    """
+
+    def __init__(self, *args, **kwargs):
+        if np is None:
+            message = "numpy is required to use BitmapAvailability."
+            raise ImportError(message)
+        super().__init__(*args, **kwargs)
+
+    def opening_minutes(
+        self, first_day: date, days: int
+    ) -> tuple[NDArray, NDArray]:
+        """Get open and close minutes for each day of the range.
+        Closed days have zero open and close minutes.
+
+        Args:
+            first_day (date): The first date of the range
+            days (int): Number of days in the range
+
+        Returns:
+            tuple[NDArray, NDArray]: Open and close minutes arrays
+        """
+        by_weekday = np.zeros((7, 2), dtype=np.int32)
+        for weekday, hours in self.opening_hours.items():
+            by_weekday[weekday] = hours
+
+        weekdays = (first_day.weekday() + np.arange(days)) % 7
+        return by_weekday[weekdays, 0], by_weekday[weekdays, 1]
+
+    def occupancy(
+        self,
+        first_day: date,
+        days: int,
+        booked_days: ArrayLike,
+        starts: ArrayLike,
+        ends: ArrayLike,
+    ) -> NDArray:
+        """Paint the bookings and the closed time on minute arrays
+
+        Args:
+            first_day (date): The first date of the range
+            days (int): Number of days in the range
+            booked_days (ArrayLike): Day of each booking counted
+            from the first day
+            starts (ArrayLike): Start minute of each booking
+            ends (ArrayLike): End minute of each booking
+
+        Returns:
+            NDArray: Boolean array of shape (days, 1440) where True
+            means the minute is not available
+        """
+        open_minutes, close_minutes = self.opening_minutes(first_day, days)
+
+        booked_days = np.asarray(booked_days, dtype=np.int64)
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+
+        in_range = (booked_days >= 0) & (booked_days < days)
+        booked_days = booked_days[in_range]
+        starts = starts[in_range]
+        ends = ends[in_range]
+
+        # The buffer is not needed at the opening and closing time
+        starts = np.where(
+            starts > open_minutes[booked_days], starts - self.buffer, starts
+        )
+        ends = np.where(
+            ends < close_minutes[booked_days], ends + self.buffer, ends
+        )
+        starts = np.clip(starts, 0, MINUTES_PER_DAY)
+        ends = np.clip(ends, 0, MINUTES_PER_DAY)
+        valid = starts < ends
+
+        # Count overlapping bookings with a difference array
+        width = MINUTES_PER_DAY + 1
+        size = days * width
+        offsets = booked_days[valid] * width
+        changes = np.bincount(
+            offsets + starts[valid], minlength=size
+        ) - np.bincount(offsets + ends[valid], minlength=size)
+        booked = np.cumsum(changes.reshape(days, width), axis=1)
+
+        minutes = np.arange(MINUTES_PER_DAY)
+        closed = (minutes < open_minutes[:, None]) | (
+            minutes >= close_minutes[:, None]
+        )
+        return (booked[:, :MINUTES_PER_DAY] > 0) | closed
+
+    def start_mask(
+        self,
+        first_day: date,
+        days: int,
+        duration: int,
+        booked_days: ArrayLike,
+        starts: ArrayLike,
+        ends: ArrayLike,
+    ) -> NDArray:
+        """Find valid start minutes of a service for each day of the range
+
+        Args:
+            first_day (date): The first date of the range
+            days (int): Number of days in the range
+            duration (int): Duration of the service in minutes
+            booked_days (ArrayLike): Day of each booking counted
+            from the first day
+            starts (ArrayLike): Start minute of each booking
+            ends (ArrayLike): End minute of each booking
+
+        Returns:
+            NDArray: Boolean array of shape (days, 1440) where True
+            means the service can start at the minute
+        """
+        result = np.zeros((days, MINUTES_PER_DAY), dtype=bool)
+        if not 0 < duration <= MINUTES_PER_DAY:
+            return result
+
+        busy = self.occupancy(first_day, days, booked_days, starts, ends)
+
+        # Sliding window sum of busy minutes over the service duration
+        busy_sums = np.zeros((days, MINUTES_PER_DAY + 1), dtype=np.int32)
+        np.cumsum(busy, axis=1, out=busy_sums[:, 1:])
+        window = busy_sums[:, duration:] - busy_sums[:, :-duration]
+
+        open_minutes = self.opening_minutes(first_day, days)[0]
+        minutes = np.arange(window.shape[1])
+        on_step = (minutes - open_minutes[:, None]) % self.slot_step == 0
+
+        result[:, : window.shape[1]] = (window == 0) & on_step
+        return result
+
+    def slot_starts(
+        self, date_obj: date, duration: int, booked: list[tuple[int, int]]
+    ) -> list[int]:
+        """Calculate start times of the free slots. The start times are
+        aligned to the slot step counting from the opening time.
+
+        Args:
+            date_obj (date): The date
+            duration (int): Duration of the service in minutes
+            booked (list[tuple[int, int]]): Booked intervals in minutes
+
+        Returns:
+            list[int]: Sorted start times in minutes
+        """
+        intervals = np.array(booked, dtype=np.int64).reshape(-1, 2)
+        mask = self.start_mask(
+            date_obj,
+            1,
+            duration,
+            np.zeros(len(intervals), dtype=np.int64),
+            intervals[:, 0],
+            intervals[:, 1],
+        )
+        return np.flatnonzero(mask[0]).tolist()
+
+    def range_slot_starts(
+        self,
+        first_day: date,
+        days: int,
+        duration: int,
+        booked_days: ArrayLike,
+        starts: ArrayLike,
+        ends: ArrayLike,
+    ) -> dict[date, list[int]]:
+        """Calculate start times of the free slots for each day
+        of the range
+
+        Args:
+            first_day (date): The first date of the range
+            days (int): Number of days in the range
+            duration (int): Duration of the service in minutes
+            booked_days (ArrayLike): Day of each booking counted
+            from the first day
+            starts (ArrayLike): Start minute of each booking
+            ends (ArrayLike): End minute of each booking
+
+        Returns:
+            dict[date, list[int]]: Sorted start times for each date
+        """
+        mask = self.start_mask(
+            first_day, days, duration, booked_days, starts, ends
+        )
+        return {
+            first_day + timedelta(days=day): np.flatnonzero(row).tolist()
+            for day, row in enumerate(mask)
+        }
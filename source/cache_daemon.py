@@ -0,0 +1,442 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import pickle
+import queue
+import socket
+import stat
+import struct
+import threading
+from functools import partial
+from itertools import count
+from typing import TYPE_CHECKING, Any, Callable
+
+from source.sheet_manager import (
+    BOOKINGS_TTL,
+    CATALOG_TTL,
+    BookingIndex,
+    RecordCache,
+    ServiceCatalog,
+    SpaSheet,
+)
+from source.sockets import CACHE_SOCKET
+
+if TYPE_CHECKING:
+    from source.availability import AvailabilityEngine
+    from source.sheet_manager import Booking
+
+# Seconds a client waits for the answer of the daemon
+REQUEST_TIMEOUT = 60.0
+# Length prefix of the pickled messages
+HEADER = struct.Struct("!I")
+# Requests which change the bookings of all clients
+WRITES = frozenset({"save_booking", "delete_bookings"})
+METHODS = WRITES | {"state"}
+
+
+def spa_caches(sheet: SpaSheet) -> dict[str, RecordCache]:
+    """Get the caches of a SpaSheet by the names used by SpaSheet.load"""
+    return {
+        "catalog": sheet.catalog,
+        "bookings": sheet.bookings,
+        "header": sheet.booking_header,
+    }
+
+
+def encode(message: dict) -> bytes:
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    return HEADER.pack(len(data)) + data
+
+
+async def read_message(reader: asyncio.StreamReader) -> dict:
+    (size,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+    return pickle.loads(await reader.readexactly(size))
+
+
+def receive(connection: socket.socket) -> dict:
+    """Read a message from a blocking socket
+
+    Raises:
+        EOFError: If the connection was closed
+    """
+
+    def read(size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = connection.recv(size - len(data))
+            if not chunk:
+                raise EOFError
+            data += chunk
+        return bytes(data)
+
+    (size,) = HEADER.unpack(read(HEADER.size))
+    return pickle.loads(read(size))
+
+
+def error_message(error: Exception) -> dict:
+    """Describe an error of a request so the client can raise it again"""
+    # Imported here to keep gspread out of the client startup
+    from gspread.exceptions import APIError
+
+    if isinstance(error, APIError):
+        return {
+            "error": "APIError",
+            "status": error.response.status_code,
+            "content": error.response.content,
+        }
+    if isinstance(error, ValueError):
+        return {"error": "ValueError", "message": str(error)}
+    return {"error": "RuntimeError", "message": repr(error)}
+
+
+def raise_error(message: dict) -> None:
+    """Raise the error described by error_message"""
+    if message["error"] == "APIError":
+        from gspread.exceptions import APIError
+        from requests import Response
+
+        response = Response()
+        response.status_code = message["status"]
+        response._content = message["content"]
+        raise APIError(response)
+    if message["error"] == "ValueError":
+        raise ValueError(message["message"])
+    raise RuntimeError(message["message"])
+
+
+class CacheDaemon:
+    """Local server which owns the Sheets client and the caches of one
+    SpaSheet and answers the terminal sessions over a Unix socket.
+    Clients keep a copy of the caches and read it locally. When a
+    client writes a booking, the other clients are told to reload.
+
+    Messages are pickled, so the socket is only accessible to the user
+    who runs the daemon.
+    """
+
+    def __init__(self, sheet: SpaSheet):
+        """
+        Args:
+            sheet (SpaSheet): The sheet shared by the clients
+        """
+        self.sheet = sheet
+        self.writers: set[asyncio.StreamWriter] = set()
+
+    async def serve(self, path: str = CACHE_SOCKET) -> None:
+        """Answer clients on the Unix socket until cancelled
+
+        Args:
+            path (str, optional): Path of the socket.
+            Defaults to "spa_cache.sock".
+        """
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            # Left by a daemon which didn't stop cleanly
+            os.remove(path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # The socket is created without access for other users, they
+        # could connect before a chmod
+        umask = os.umask(0o177)
+        try:
+            listener.bind(path)
+        except OSError:
+            listener.close()
+            raise
+        finally:
+            os.umask(umask)
+        server = await asyncio.start_unix_server(self.handle, sock=listener)
+        async with server:
+            await server.serve_forever()
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Answer the requests of a client"""
+        loop = asyncio.get_running_loop()
+        self.writers.add(writer)
+        try:
+            while True:
+                try:
+                    request = await read_message(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                # Requests may call the Sheets API, keep the loop free
+                response = await loop.run_in_executor(None, self.call, request)
+                writer.write(encode(response))
+                if request["method"] in WRITES and "error" not in response:
+                    self.broadcast(["bookings"], writer)
+                await writer.drain()
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    def broadcast(
+        self, names: list[str], source: asyncio.StreamWriter
+    ) -> None:
+        """Tell the clients except the source to reload caches"""
+        message = encode({"event": "invalidate", "names": names})
+        for writer in self.writers:
+            if writer is not source and not writer.is_closing():
+                writer.write(message)
+
+    def call(self, request: dict) -> dict:
+        """Run a request. Requests of the clients run at the same time,
+        the SpaSheet serializes the loads and the writes itself.
+
+        Args:
+            request (dict): The id, the method and the keyword arguments
+
+        Returns:
+            dict: The response with the result or the error
+        """
+        if request["method"] not in METHODS:
+            return {
+                "id": request["id"],
+                "error": "RuntimeError",
+                "message": f"Unknown method {request['method']!r}",
+            }
+        method = getattr(self, request["method"])
+        try:
+            result = method(**request["kwargs"])
+        except Exception as error:
+            return {"id": request["id"], **error_message(error)}
+        return {"id": request["id"], "result": result}
+
+    def state(self, names: list[str], fresh: bool = False) -> dict[str, dict]:
+        """Get the state of the caches, loading the expired ones
+
+        Args:
+            names (list[str]): "catalog", "bookings" or "header"
+            fresh (bool, optional): Reload the bookings regardless of
+            their age. Defaults to False.
+
+        Returns:
+            dict[str, dict]: The states by name. The header comes with
+            the bookings, like in SpaSheet.load.
+        """
+        names = set(names)
+        if "bookings" in names:
+            names.add("header")
+            if fresh:
+                self.sheet.refresh_bookings()
+        self.sheet.load_stale(header="header" in names)
+        caches = spa_caches(self.sheet)
+        result = {}
+        for name in names:
+            # Loads a cache which load_stale leaves to itself
+            caches[name].get()
+            result[name] = caches[name].dump()
+        return result
+
+    def save_booking(self, info: dict) -> None:
+        self.sheet.save_booking(info)
+
+    def delete_bookings(self, bookings: list[tuple[int, Booking]]) -> None:
+        self.sheet.delete_bookings(bookings)
+
+
+class CacheClient:
+    """Connection of a terminal session to the cache daemon. Requests
+    are sent one at a time, invalidations pushed by the daemon are
+    passed to the listeners.
+    """
+
+    def __init__(
+        self, path: str = CACHE_SOCKET, timeout: float = REQUEST_TIMEOUT
+    ):
+        """
+        Args:
+            path (str, optional): Path of the daemon socket.
+            Defaults to "spa_cache.sock".
+            timeout (float, optional): Seconds to wait for an answer.
+            Defaults to 60.
+        """
+        self.path = path
+        self.timeout = timeout
+        self.connection: socket.socket | None = None
+        self.responses: queue.Queue[dict | None] = queue.Queue()
+        self.listeners: list[Callable[[list[str]], Any]] = []
+        self.ids = count()
+        self.lock = threading.Lock()
+
+    def connect(self) -> None:
+        """Connect to the daemon
+
+        Raises:
+            OSError: If the daemon is not running
+        """
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(self.path)
+        except OSError:
+            connection.close()
+            raise
+        self.connection = connection
+        self.responses = queue.Queue()
+        threading.Thread(
+            target=self.listen,
+            args=(connection, self.responses),
+            name="cache-client",
+            daemon=True,
+        ).start()
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def listen(
+        self, connection: socket.socket, responses: queue.Queue
+    ) -> None:
+        """Receive the messages of the daemon until the connection ends"""
+        try:
+            while True:
+                message = receive(connection)
+                if "event" in message:
+                    for listener in self.listeners:
+                        listener(message["names"])
+                else:
+                    responses.put(message)
+        except (OSError, EOFError):
+            responses.put(None)
+
+    def request(self, method: str, **kwargs) -> Any:
+        """Call a method of the daemon. A lost connection is opened
+        again once.
+
+        Args:
+            method (str): Name of the CacheDaemon method
+
+        Raises:
+            ConnectionError: If the daemon doesn't answer
+            ValueError: If the method raised ValueError
+            APIError: If the method failed to call the Sheets API
+
+        Returns:
+            Any: The result of the method
+        """
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    if self.connection is None:
+                        self.connect()
+                    request_id = next(self.ids)
+                    self.connection.sendall(
+                        encode(
+                            {
+                                "id": request_id,
+                                "method": method,
+                                "kwargs": kwargs,
+                            }
+                        )
+                    )
+                    response = self.responses.get(timeout=self.timeout)
+                except (OSError, queue.Empty) as error:
+                    self.close()
+                    raise ConnectionError(
+                        "The cache daemon is not available"
+                    ) from error
+                if response is not None:
+                    break
+                # The daemon was restarted, a write may have been lost
+                # together with the connection, so only reads are retried
+                self.close()
+                if attempt or method in WRITES:
+                    raise ConnectionError("The cache daemon is not available")
+
+        if "error" in response:
+            raise_error(response)
+        return response["result"]
+
+
+class RemoteCache:
+    """Mixin for the caches of a CachedSpaSheet. The loader returns the
+    state of the daemon's cache, which is restored instead of building
+    the data from records.
+    """
+
+    def refresh(self):
+        state = self.loader()
+        self.restore(state)
+        return state["data"]
+
+
+class RemoteServiceCatalog(RemoteCache, ServiceCatalog):
+    pass
+
+
+class RemoteBookingIndex(RemoteCache, BookingIndex):
+    pass
+
+
+class RemoteRecordCache(RemoteCache, RecordCache):
+    pass
+
+
+class CachedSpaSheet(SpaSheet):
+    """SpaSheet which gets its data from the cache daemon instead of
+    the spreadsheet. Reads are answered from the local copy of the
+    daemon's caches, writes are sent to the daemon.
+    """
+
+    def __init__(
+        self,
+        client: CacheClient,
+        catalog_ttl: float = CATALOG_TTL,
+        bookings_ttl: float = BOOKINGS_TTL,
+        availability: AvailabilityEngine | None = None,
+    ):
+        """
+        Args:
+            client (CacheClient): Connection to the daemon
+            catalog_ttl (float, optional): Seconds to keep the services.
+            bookings_ttl (float, optional): Seconds to keep the bookings.
+            The daemon pushes changes made by other sessions, the TTL
+            picks up changes made outside of the daemon.
+            availability (AvailabilityEngine | None, optional): Engine
+            to calculate free slots.
+        """
+        super().__init__(None, catalog_ttl, bookings_ttl, availability)
+        self.client = client
+        self.catalog = RemoteServiceCatalog(
+            partial(self.fetch, "catalog"), catalog_ttl
+        )
+        self.bookings = RemoteBookingIndex(
+            partial(self.fetch, "bookings"), bookings_ttl
+        )
+        self.booking_header = RemoteRecordCache(
+            partial(self.fetch, "header"), catalog_ttl
+        )
+        client.listeners.append(self.invalidate)
+
+    def fetch(self, name: str) -> dict:
+        return self.client.request("state", names=[name])[name]
+
+    def load(self, names: list[str], fresh: bool = False) -> None:
+        """Load the state of several caches with one request"""
+        if not names:
+            return
+        caches = spa_caches(self)
+        states = self.client.request("state", names=names, fresh=fresh)
+        for name, state in states.items():
+            caches[name].restore(state)
+
+    def reload(self) -> None:
+        self.load(["catalog", "bookings"])
+
+    def refresh_bookings(self) -> None:
+        self.load(["bookings"], fresh=True)
+
+    def invalidate(self, names: list[str]) -> None:
+        """Drop caches changed by another session"""
+        caches = spa_caches(self)
+        for name in names:
+            caches[name].invalidate()
+
+    def save_booking(self, info: dict) -> None:
+        self.client.request("save_booking", info=info)
+        self.bookings.invalidate()
+
+    def delete_bookings(self, bookings: list[tuple[int, Booking]]) -> None:
+        self.client.request("delete_bookings", bookings=bookings)
+        self.bookings.invalidate()
@@ -0,0 +1,442 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import Counter, deque
+from itertools import count
+from typing import Callable
+
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import a1_range_to_grid_range, numericise_all
+from requests import Response
+
+# Google Sheets API limits requests per minute per user
+DEFAULT_QUOTA_WINDOW = 60.0
+
+
+def api_error(code: int, status: str, message: str) -> APIError:
+    """Create an error in the format of the Sheets API
+
+    Args:
+        code (int): HTTP status code
+        status (str): Status name, e.g. INVALID_ARGUMENT
+        message (str): Description of the error
+
+    Returns:
+        APIError: The error
+    """
+    response = Response()
+    response.status_code = code
+    response._content = json.dumps(
+        {"error": {"code": code, "message": message, "status": status}}
+    ).encode()
+    return APIError(response)
+
+
+def quota_error(kind: str) -> APIError:
+    """Create the error which the Sheets API returns when the quota
+    is exhausted
+
+    Args:
+        kind (str): Kind of the requests, "read" or "write"
+
+    Returns:
+        APIError: The error with status code 429
+    """
+    return api_error(
+        429,
+        "RESOURCE_EXHAUSTED",
+        f"Quota exceeded for quota metric '{kind.title()} requests' and "
+        f"limit '{kind.title()} requests per minute per user'.",
+    )
+
+
+class RequestLimiter:
+    """Artificial latency and per minute quota of the fake API.
+    Every request sleeps for the latency and is counted in a sliding
+    window separately for reads and writes.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        read_quota: int | None = None,
+        write_quota: int | None = None,
+        window: float = DEFAULT_QUOTA_WINDOW,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """
+        Args:
+            latency (float, optional): Seconds each request takes.
+            Defaults to 0.
+            read_quota (int | None, optional): Read requests allowed
+            in the window. Defaults to no limit.
+            write_quota (int | None, optional): Write requests allowed
+            in the window. Defaults to no limit.
+            window (float, optional): Length of the quota window
+            in seconds. Defaults to 60.
+            clock (Callable[[], float], optional): Source of the time.
+            sleep (Callable[[float], None], optional): Function used
+            to wait for the latency.
+        """
+        self.latency = latency
+        self.quotas = {"read": read_quota, "write": write_quota}
+        self.window = window
+        self.clock = clock
+        self.sleep = sleep
+        self.history = {"read": deque(), "write": deque()}
+        self.counts = Counter()
+        self.rejected = Counter()
+        self.lock = threading.Lock()
+
+    def __call__(self, kind: str, method: str) -> None:
+        """Account one request
+
+        Args:
+            kind (str): Kind of the request, "read" or "write"
+            method (str): Name of the called method
+
+        Raises:
+            APIError: If the quota of the kind is exhausted
+        """
+        with self.lock:
+            now = self.clock()
+            history = self.history[kind]
+            while history and history[0] <= now - self.window:
+                history.popleft()
+
+            quota = self.quotas[kind]
+            if quota is not None and len(history) >= quota:
+                self.rejected[method] += 1
+                raise quota_error(kind)
+
+            history.append(now)
+            self.counts[method] += 1
+
+        if self.latency:
+            self.sleep(self.latency)
+
+    @property
+    def total(self) -> int:
+        """Number of accepted requests"""
+        return sum(self.counts.values())
+
+    def reset(self) -> None:
+        """Forget the counted requests"""
+        with self.lock:
+            for history in self.history.values():
+                history.clear()
+            self.counts.clear()
+            self.rejected.clear()
+
+
+def grid_range(range_name: str) -> tuple[int, int | None, int, int | None]:
+    """Convert A1 notation without the sheet name to zero based
+    start and end indexes of rows and columns. Missing ends are None.
+
+    Args:
+        range_name (str): Range in A1 notation, e.g. A2:G
+
+    Returns:
+        tuple[int, int | None, int, int | None]: Start row, end row,
+        start column and end column
+    """
+    grid = a1_range_to_grid_range(range_name)
+    return (
+        grid.get("startRowIndex", 0),
+        grid.get("endRowIndex"),
+        grid.get("startColumnIndex", 0),
+        grid.get("endColumnIndex"),
+    )
+
+
+class FakeWorksheet:
+    """In memory stand-in for gspread.Worksheet. The values are kept
+    as a list of rows and every method call is one API request.
+    """
+
+    def __init__(
+        self,
+        spreadsheet: FakeSpreadsheet,
+        title: str,
+        sheet_id: int,
+        rows: list[list] | None = None,
+    ):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = sheet_id
+        self.rows = [list(row) for row in rows or []]
+
+    def __repr__(self) -> str:
+        return f"<FakeWorksheet {self.title!r} id:{self.id}>"
+
+    @property
+    def row_count(self) -> int:
+        return len(self.rows)
+
+    def request(self, kind: str, method: str) -> None:
+        self.spreadsheet.limiter(kind, method)
+
+    def read_range(self, range_name: str | None) -> list[list]:
+        """Get values of the range without accounting a request"""
+        if not range_name:
+            return [list(row) for row in self.rows]
+
+        if "!" in range_name:
+            range_name = range_name.split("!", 1)[1].strip("'")
+        start_row, end_row, start_col, end_col = grid_range(range_name)
+        values = [
+            row[start_col:end_col] for row in self.rows[start_row:end_row]
+        ]
+        # The API does not return trailing empty rows
+        while values and not any(cell != "" for cell in values[-1]):
+            values.pop()
+        return values
+
+    def get_all_values(self) -> list[list]:
+        self.request("read", "get_all_values")
+        return self.read_range(None)
+
+    def get_all_records(self, head: int = 1) -> list[dict]:
+        """Get all rows below the header as dicts. Numeric strings
+        are converted to numbers like gspread does.
+        """
+        self.request("read", "get_all_records")
+        if len(self.rows) < head:
+            return []
+
+        keys = self.rows[head - 1]
+        records = []
+        for row in self.rows[head:]:
+            values = numericise_all(list(row) + [""] * (len(keys) - len(row)))
+            records.append(dict(zip(keys, values)))
+        return records
+
+    def row_values(self, row: int) -> list:
+        self.request("read", "row_values")
+        if row > len(self.rows):
+            return []
+        values = list(self.rows[row - 1])
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def col_values(self, col: int) -> list:
+        self.request("read", "col_values")
+        values = [row[col - 1] if col <= len(row) else "" for row in self.rows]
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def get(self, range_name: str | None = None) -> list[list]:
+        self.request("read", "get")
+        return self.read_range(range_name)
+
+    def batch_get(self, ranges: list[str]) -> list[list[list]]:
+        self.request("read", "batch_get")
+        return [self.read_range(range_name) for range_name in ranges]
+
+    def append_row(self, values: list, **kwargs) -> dict:
+        return self.append_rows([values], **kwargs)
+
+    def append_rows(self, values: list[list], **kwargs) -> dict:
+        self.request("write", "append_rows")
+        first_row = len(self.rows) + 1
+        self.rows.extend(list(row) for row in values)
+        return {
+            "updates": {
+                "updatedRange": (
+                    f"{self.title}!A{first_row}:{len(self.rows)}"
+                ),
+                "updatedRows": len(values),
+            }
+        }
+
+    def delete_rows(self, start_index: int, end_index: int | None = None):
+        self.request("write", "delete_rows")
+        self.delete_dimension(start_index - 1, end_index or start_index)
+        return {}
+
+    def delete_dimension(self, start: int, end: int) -> None:
+        """Delete rows with zero based indexes start <= index < end
+        without accounting a request
+        """
+        del self.rows[start:end]
+
+
+class FakeSpreadsheet:
+    """In memory stand-in for gspread.Spreadsheet to run SpaSheet and
+    the flows without network, e.g. for benchmarks and load tests.
+
+    Usage:
+        sheet = FakeSpreadsheet(
+            {"spa_info": [header, *rows], "booking_data": [header]},
+            latency=0.2,
+            read_quota=60,
+        )
+        SpaSheet(sheet)
+    """
+
+    def __init__(
+        self,
+        worksheets: dict[str, list[list]] | None = None,
+        latency: float = 0.0,
+        read_quota: int | None = None,
+        write_quota: int | None = None,
+        limiter: RequestLimiter | None = None,
+        title: str = "spa_booking",
+    ):
+        """
+        Args:
+            worksheets (dict[str, list[list]] | None, optional): Rows
+            of each worksheet by its title, the first row is the header.
+            latency (float, optional): Seconds each request takes.
+            read_quota (int | None, optional): Read requests allowed
+            per minute. Defaults to no limit.
+            write_quota (int | None, optional): Write requests allowed
+            per minute. Defaults to no limit.
+            limiter (RequestLimiter | None, optional): Limiter to use
+            instead of the one created from latency and quotas.
+            title (str, optional): Title of the spreadsheet.
+        """
+        self.title = title
+        self.id = f"fake-{title}"
+        self.limiter = limiter or RequestLimiter(
+            latency, read_quota, write_quota
+        )
+        self.sheet_ids = count()
+        self.sheets: dict[str, FakeWorksheet] = {}
+        for sheet_title, rows in (worksheets or {}).items():
+            self.add_rows(sheet_title, rows)
+
+    @classmethod
+    def from_records(
+        cls, worksheets: dict[str, list[dict]], **kwargs
+    ) -> FakeSpreadsheet:
+        """Create a spreadsheet from records in the get_all_records
+        format, the keys of the first record are the header
+
+        Args:
+            worksheets (dict[str, list[dict]]): Records of each
+            worksheet by its title
+            **kwargs: Other arguments of FakeSpreadsheet
+
+        Returns:
+            FakeSpreadsheet: The spreadsheet
+        """
+        tables = {}
+        for sheet_title, records in worksheets.items():
+            header = list(records[0]) if records else []
+            tables[sheet_title] = [header] + [
+                [record.get(key, "") for key in header] for record in records
+            ]
+        return cls(tables, **kwargs)
+
+    def add_rows(self, title: str, rows: list[list]) -> FakeWorksheet:
+        """Add a worksheet with the rows without accounting a request"""
+        worksheet = FakeWorksheet(self, title, next(self.sheet_ids), rows)
+        self.sheets[title] = worksheet
+        return worksheet
+
+    def worksheets(self) -> list[FakeWorksheet]:
+        self.limiter("read", "worksheets")
+        return list(self.sheets.values())
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        self.limiter("read", "worksheet")
+        try:
+            return self.sheets[title]
+        except KeyError:
+            raise WorksheetNotFound(title) from None
+
+    def add_worksheet(self, title: str, rows: int = 0, cols: int = 0):
+        self.limiter("write", "add_worksheet")
+        return self.add_rows(title, [])
+
+    def values_batch_get(self, ranges: list[str], params=None) -> dict:
+        """Read ranges of several worksheets in one request
+
+        Args:
+            ranges (list[str]): Ranges in A1 notation with sheet names
+
+        Returns:
+            dict: Response in the Sheets API format
+        """
+        self.limiter("read", "values_batch_get")
+        value_ranges = []
+        for range_name in ranges:
+            sheet_title, _, cells = range_name.partition("!")
+            worksheet = self.sheets[sheet_title.strip("'")]
+            value_ranges.append(
+                {
+                    "range": range_name,
+                    "majorDimension": "ROWS",
+                    "values": worksheet.read_range(cells),
+                }
+            )
+        return {"spreadsheetId": self.id, "valueRanges": value_ranges}
+
+    def batch_update(self, body: dict) -> dict:
+        """Apply several requests in one call. Only deleteDimension
+        requests of rows are supported. Like the real API, either all
+        requests are applied or none of them.
+
+        Args:
+            body (dict): Request body in the Sheets API format
+
+        Raises:
+            APIError: With status code 400 if a request is not supported
+            or its range is invalid
+
+        Returns:
+            dict: Response in the Sheets API format
+        """
+        self.limiter("write", "batch_update")
+        requests = body.get("requests", [])
+        deletions = self.check_deletions(requests)
+        for worksheet, start, end in deletions:
+            worksheet.delete_dimension(start, end)
+        return {"spreadsheetId": self.id, "replies": [{} for _ in requests]}
+
+    def check_deletions(
+        self, requests: list[dict]
+    ) -> list[tuple[FakeWorksheet, int, int]]:
+        """Validate the requests of a batch_update before any of them
+        is applied. Each request sees the rows left by the previous ones.
+
+        Args:
+            requests (list[dict]): The requests
+
+        Raises:
+            APIError: With status code 400 if a request is invalid
+
+        Returns:
+            list[tuple[FakeWorksheet, int, int]]: Worksheet, start and
+            end index of each deletion
+        """
+        sheets_by_id = {sheet.id: sheet for sheet in self.sheets.values()}
+        row_counts = {}
+        deletions = []
+        for number, request in enumerate(requests):
+            grid = request.get("deleteDimension", {}).get("range", {})
+            worksheet = sheets_by_id.get(grid.get("sheetId"))
+            if grid.get("dimension") != "ROWS" or worksheet is None:
+                message = (
+                    f"Invalid requests[{number}]: only deleteDimension"
+                    f" of rows in an existing sheet is supported."
+                )
+                raise api_error(400, "INVALID_ARGUMENT", message)
+
+            row_count = row_counts.get(worksheet.id, worksheet.row_count)
+            start, end = grid.get("startIndex", 0), grid.get("endIndex")
+            if not 0 <= start < end <= row_count:
+                message = (
+                    f"Invalid requests[{number}].deleteDimension: "
+                    f"range {start}:{end} is outside of the grid."
+                )
+                raise api_error(400, "INVALID_ARGUMENT", message)
+            row_counts[worksheet.id] = row_count - (end - start)
+            deletions.append((worksheet, start, end))
+        return deletions
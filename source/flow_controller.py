@@ -4,8 +4,6 @@ from datetime import date, datetime, time, timedelta
 from time import sleep
 from typing import TYPE_CHECKING
 
-import phonenumbers
-from rich import print
 from rich.align import Align
 from rich.padding import Padding
 from rich.panel import Panel
@@ -25,7 +23,8 @@ from source.validators import (
 if TYPE_CHECKING:
     from datetime import datetime
 
-    from source.sheet_manager import SpaSheet
+    from source.availability import SlotMask
+    from source.storage import StorageBackend
 
 
 def input_handler(prompt: str, validator: callable, *args, **kwargs) -> str:
@@ -67,6 +66,8 @@ def formatted_phone_number(phone_number: str) -> str:
     Returns:
         str: The phone number in E.164 format
     """
+    import phonenumbers
+
     phone_number = phonenumbers.parse(phone_number, None)
     formatted_phone_number = phonenumbers.format_number(
         phone_number, phonenumbers.PhoneNumberFormat.E164
@@ -77,7 +78,7 @@ def formatted_phone_number(phone_number: str) -> str:
 class BasicFlow(PrintMixin):
     """Class to manage basic flow"""
 
-    def __init__(self, sheet: SpaSheet, controller: FlowController):
+    def __init__(self, sheet: StorageBackend, controller: FlowController):
         self.sheet = sheet
         self.controller = controller
         self.info = {}
@@ -85,7 +86,9 @@ class BasicFlow(PrintMixin):
         self.run_flow()
 
     def run_flow(self):
-        print(f"run_flow method not implemented for {self.__class__.__name__}")
+        console.print(
+            f"run_flow method not implemented for {self.__class__.__name__}"
+        )
 
     def choose_date(self):
         date_visit = input_handler(
@@ -93,23 +96,22 @@ class BasicFlow(PrintMixin):
         )
         self.info["date"] = date_visit
 
-    def choose_time(self, time_ranges: list[list[datetime]]) -> None:
+    def choose_time(self, slot_mask: SlotMask) -> None:
         """Suggest the user to choose the time for the visit based on the
-        available time ranges. To use this method, the date, and service must
-        be already chosen
+        available start times. To use this method, the date, and service
+        must be already chosen
         """
+        # Each input is checked with one bit test
         time_visit = input_handler(
             "Enter the time in format HH:MM:",
             validate_time,
-            time_ranges=time_ranges,
+            time_ranges=slot_mask,
         )
 
         self.info["start_time"] = time_visit
         # Calculate the end time based on the start time and
         # the duration of the service
-        duration = float(
-            self.sheet.get_service_info(self.info["service"], "duration")
-        )
+        duration = self.sheet.get_service(self.info["service"]).duration
         end_time = datetime.combine(
             date.fromisoformat(self.info["date"]),
             time.fromisoformat(time_visit),
@@ -190,7 +192,11 @@ class BookingFlow(BasicFlow):
         self.print_suggestion("Choose the time when you want to visit us.")
         self.print_time_info(time_ranges)
 
-        self.choose_time(time_ranges)
+        self.choose_time(
+            self.sheet.get_slot_mask_for_date_and_service(
+                self.info["date"], self.info["service"]
+            )
+        )
 
     def input_credentials(self):
         self.print_suggestion("Please enter your name")
@@ -241,13 +247,7 @@ class BookingFlow(BasicFlow):
                 break
 
     def save_booking(self):
-        booking_data = []
-
-        bookings = self.sheet.booking_data
-        for key in bookings.row_values(1):
-            booking_data.append(self.info.get(key, ""))
-
-        bookings.append_row(booking_data)
+        self.sheet.save_booking(self.info)
 
 
 class CancelFlow(BasicFlow):
@@ -282,7 +282,8 @@ class CancelFlow(BasicFlow):
             )
 
             self.info["name"] = name
-            self.info["phone_number"] = phone_number
+            # Bookings are saved with the number in E.164 format
+            self.info["phone_number"] = formatted_phone_number(phone_number)
             user_bookings = self.look_for_booking()
 
             if not user_bookings:
@@ -299,46 +300,129 @@ class CancelFlow(BasicFlow):
         self.info["user_bookings"] = user_bookings
 
     def look_for_booking(self):
-        all_bookings = self.sheet.booking_data.get_all_records()
-        user_bookings = []
-        user_phone = int(self.info["phone_number"].strip("+").replace(" ", ""))
-        for row_numb, booking in enumerate(all_bookings):
-            if (
-                booking["name"] == self.info["name"]
-                and booking["phone_number"] == user_phone
-            ):
-                user_bookings.append(
-                    {"booking": booking, "row_number": row_numb + 2}
-                )
-        return user_bookings
+        bookings = self.sheet.find_bookings(
+            self.info["name"], self.info["phone_number"]
+        )
+        return [
+            {"booking": booking, "row_number": row_number}
+            for row_number, booking in bookings
+        ]
 
     def cancel_booking(self):
-        self.print_suggestion("Your bookings:")
         user_bookings = self.info["user_bookings"]
-        self.print_user_bookings(user_bookings)
-
-        booking_indexes_str = input_handler(
-            "Enter the numbers of the bookings"
-            " you want to cancel separated by space:",
-            validate_space_separated_integers,
-            max_numb=len(user_bookings) - 1,
-        )
-        booking_indexes = [int(index) for index in booking_indexes_str.split()]
-
-        for index_offset, index in enumerate(booking_indexes):
-            self.sheet.booking_data.delete_rows(
-                user_bookings[index]["row_number"] - index_offset
+        while True:
+            self.print_suggestion("Your bookings:")
+            self.print_user_bookings(user_bookings)
+
+            booking_indexes_str = input_handler(
+                "Enter the numbers of the bookings"
+                " you want to cancel separated by space:",
+                validate_space_separated_integers,
+                max_numb=len(user_bookings) - 1,
             )
+            booking_indexes = [
+                int(index) for index in booking_indexes_str.split()
+            ]
+
+            try:
+                self.sheet.delete_bookings(
+                    [
+                        (
+                            user_bookings[index]["row_number"],
+                            user_bookings[index]["booking"],
+                        )
+                        for index in booking_indexes
+                    ]
+                )
+            except ValueError as e:
+                # The bookings were changed in another session, the rows
+                # are checked before the deletion, so the cached row
+                # numbers are only reloaded in this case
+                self.print_suggestion(str(e))
+                self.sheet.refresh_bookings()
+                user_bookings = self.look_for_booking()
+                self.info["user_bookings"] = user_bookings
+                if user_bookings:
+                    continue
+                self.controller.manage_options()
+            return
 
 
 class AvailabilityFlow(BasicFlow):
     """Class to manage availability"""
 
+    DAYS_AHEAD = 7
+
     def run_flow(self):
+        check_options = [
+            {"name": "Check a date", "method": self.check_date},
+            {
+                "name": f"Check the next {self.DAYS_AHEAD} days",
+                "method": self.check_days_ahead,
+            },
+            {
+                "name": "Check any service on a date",
+                "method": self.check_any_service,
+            },
+        ]
+        self.print_suggestion("How do you want to check availability?")
+        self.print_options(check_options)
+        option = input_handler(
+            "Enter option number:",
+            validate_integer_option,
+            min_numb=0,
+            max_numb=len(check_options) - 1,
+        )
+        check_options[int(option)]["method"]()
+
+    def check_date(self):
         self.choose_service()
         self.choose_date()
         self.show_result()
 
+    def check_days_ahead(self):
+        self.choose_service()
+        self.show_days_ahead()
+
+    def check_any_service(self):
+        self.choose_date()
+        self.show_all_services()
+
+    def show_days_ahead(self):
+        start_date = date.today()
+        end_date = start_date + timedelta(days=self.DAYS_AHEAD - 1)
+        availability = self.sheet.get_availability(
+            self.info["service"], start_date.isoformat(), end_date.isoformat()
+        )
+        self.print_suggestion(
+            f"Available times for {self.info['service']}"
+            f" for the next {self.DAYS_AHEAD} days:"
+        )
+        self.print_availability(availability)
+        self.print_suggestion("Do you want to check a particular date?")
+        yes_no = input_handler("Enter 'yes' or 'no':", validate_yes_no)
+        if yes_no == "yes":
+            self.choose_date()
+            self.show_result()
+
+    def show_all_services(self):
+        while True:
+            availability = self.sheet.get_availability_for_date(
+                self.info["date"]
+            )
+            self.print_suggestion(
+                f"Available times for all services on {self.info['date']}:"
+            )
+            self.print_availability(availability, title="Service")
+            self.print_suggestion(
+                "Do you want to check availability for another date?"
+            )
+            yes_no = input_handler("Enter 'yes' or 'no':", validate_yes_no)
+            if yes_no == "yes":
+                self.choose_date()
+                continue
+            break
+
     def choose_date(self):
         self.print_suggestion("Enter the date when you want to visit us.")
         super().choose_date()
@@ -371,10 +455,9 @@ class ServiceInfoFlow(BasicFlow):
         self.show_result()
 
     def show_result(self):
-        for service in self.sheet.spa_info.get_all_records():
-            if service["name"] == self.info["service"]:
-                self.print_service_info(service)
-                break
+        service = self.sheet.get_service(self.info["service"])
+        if service is not None:
+            self.print_service_info(service)
         self.print_suggestion(
             "Do you want to check information for another service?"
         )
@@ -393,7 +476,7 @@ class FlowController(PrintMixin):
         {"name": "Service information", "object": ServiceInfoFlow},
     )
 
-    def __init__(self, sheet: SpaSheet):
+    def __init__(self, sheet: StorageBackend):
         self.sheet = sheet
 
         self.print_suggestion("Welcome to the Spa Booking System")
@@ -419,5 +502,15 @@ class FlowController(PrintMixin):
         Args:
             option (str): index of a flow in the FLOW_OPTIONS list
         """
+        # Imported here to keep gspread out of the startup
+        from gspread.exceptions import APIError
 
-        self.FLOW_OPTIONS[int(option)]["object"](self.sheet, self)
+        try:
+            self.FLOW_OPTIONS[int(option)]["object"](self.sheet, self)
+        except (APIError, ConnectionError):
+            # The request failed even after the retries of the client,
+            # or the cache daemon is restarting
+            self.print_suggestion(
+                "The booking system is busy at the moment. "
+                "Please try again in a minute."
+            )
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from contextvars import ContextVar
 from typing import TYPE_CHECKING
 
 from rich.console import Console
@@ -12,6 +13,8 @@ from rich.theme import Theme
 if TYPE_CHECKING:
     from datetime import datetime
 
+    from source.sheet_manager import Service
+
 
 print_theme = Theme(
     {
@@ -22,7 +25,23 @@ print_theme = Theme(
     }
 )
 
-console = Console(theme=print_theme)
+# Console of the current session. The session server runs many
+# sessions in one process and sets a console for each of them.
+current_console: ContextVar[Console] = ContextVar(
+    "current_console", default=Console(theme=print_theme)
+)
+
+
+class ConsoleProxy:
+    """Console which passes all calls to the console of the current
+    session
+    """
+
+    def __getattr__(self, name: str):
+        return getattr(current_console.get(), name)
+
+
+console = ConsoleProxy()
 
 
 class PrintMixin:
@@ -64,6 +83,36 @@ class PrintMixin:
             table.add_row(start_time, end_time, end_section=True)
         console.print(Padding(table, (1, 0)))
 
+    def print_availability(
+        self,
+        availability: dict[str, list[list[datetime]]],
+        title: str = "Date",
+    ) -> None:
+        """Prints available start times for several dates or services.
+
+        Args:
+            availability (dict[str, list[list[datetime]]]): Available
+            times for each date or service
+            title (str, optional): Title of the first column.
+            Defaults to "Date".
+        """
+
+        table = Table(
+            title,
+            "Start times",
+            title=Text("Available times", style="info"),
+        )
+        for name, time_ranges in availability.items():
+            start_times = ", ".join(
+                time_range[0].strftime("%H:%M") for time_range in time_ranges
+            )
+            table.add_row(
+                Text(name, style="info"),
+                Text(start_times or "No available times", style="options"),
+                end_section=True,
+            )
+        console.print(Padding(table, (1, 0)))
+
     def print_suggestion(self, suggestion: str) -> None:
         """Prints the suggestion message.
 
@@ -106,11 +155,11 @@ class PrintMixin:
         messages = Padding(Text("\n").join(messages), (0, 2, 0, 2))
         console.print(messages)
 
-    def print_service_info(self, service: dict):
+    def print_service_info(self, service: Service):
         """Prints the service information.
 
         Args:
-            service (dict): The service information
+            service (Service): The service information
         """
         name = Padding(
             Panel(
@@ -123,7 +172,7 @@ class PrintMixin:
         duration = Padding(
             Panel(
                 Text(
-                    f"{service['duration']} hours",
+                    f"{service['duration']:g} hours",
                     justify="center",
                     style="info",
                 ),
@@ -135,7 +184,9 @@ class PrintMixin:
         price = Padding(
             Panel(
                 Text(
-                    f"{service['price']} euro", justify="center", style="info"
+                    f"{service['price']:g} euro",
+                    justify="center",
+                    style="info",
                 ),
                 title="Price",
             ),
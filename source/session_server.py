@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import asyncio
+import codecs
+import contextvars
+import os
+import queue
+import stat
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from typing import TYPE_CHECKING, Any, Callable
+
+from rich.console import Console
+
+from source.mixins import current_console, print_theme
+from source.sockets import MAX_SESSIONS, SOCKET_PATH
+
+if TYPE_CHECKING:
+    from source.storage import StorageBackend
+
+# Size of the web terminal
+TERMINAL_WIDTH = 80
+TERMINAL_HEIGHT = 24
+READ_SIZE = 4096
+BUSY_MESSAGE = (
+    "The booking system is busy at the moment. Please try again in a minute."
+)
+ERASE = frozenset({"\x7f", "\b"})
+# Ctrl-C and Ctrl-D end the session
+END_OF_SESSION = frozenset({"\x03", "\x04"})
+
+
+class SessionOutput:
+    """File for the console of a session which sends the text to its
+    connection. Newlines are sent as CRLF like a terminal does.
+    """
+
+    encoding = "utf-8"
+
+    def __init__(
+        self, loop: asyncio.AbstractEventLoop, writer: asyncio.StreamWriter
+    ):
+        self.loop = loop
+        self.writer = writer
+        self.closed = False
+
+    def write(self, text: str) -> int:
+        if not self.closed:
+            data = text.replace("\n", "\r\n").encode()
+            self.loop.call_soon_threadsafe(self.send, data)
+        return len(text)
+
+    def send(self, data: bytes) -> None:
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+    def flush(self) -> None:
+        pass
+
+    def isatty(self) -> bool:
+        return True
+
+
+class LineReader:
+    """Line discipline of a session terminal. Keystrokes received from
+    the connection are echoed and collected into lines, which the
+    console of the session reads with readline.
+    """
+
+    def __init__(self, echo: Callable[[str], Any]):
+        """
+        Args:
+            echo (Callable[[str], Any]): Function which shows the typed
+            text in the terminal
+        """
+        self.echo = echo
+        self.decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self.buffer: list[str] = []
+        self.lines: queue.Queue[str | None] = queue.Queue()
+        # 1 after ESC, 2 inside the escape sequence of a special key
+        self.escape = 0
+        self.previous = ""
+
+    def feed(self, data: bytes) -> bool:
+        """Process keystrokes from the connection
+
+        Args:
+            data (bytes): The received bytes
+
+        Returns:
+            bool: False if the user ended the session
+        """
+        for char in self.decoder.decode(data):
+            previous, self.previous = self.previous, char
+            if self.escape == 1:
+                self.escape = 2 if char in "[O" else 0
+            elif self.escape == 2:
+                # Arrow and function keys are not supported
+                if "@" <= char <= "~":
+                    self.escape = 0
+            elif char == "\x1b":
+                self.escape = 1
+            elif char == "\r" or (char == "\n" and previous != "\r"):
+                self.echo("\n")
+                self.lines.put("".join(self.buffer) + "\n")
+                self.buffer.clear()
+            elif char in ERASE:
+                if self.buffer:
+                    self.buffer.pop()
+                    self.echo("\b \b")
+            elif char in END_OF_SESSION:
+                self.close()
+                return False
+            elif char.isprintable():
+                self.buffer.append(char)
+                self.echo(char)
+        return True
+
+    def readline(self) -> str:
+        """Wait for the next line
+
+        Raises:
+            EOFError: If the session has ended
+
+        Returns:
+            str: The line with the newline character
+        """
+        line = self.lines.get()
+        if line is None:
+            # Keep the end for the next reads
+            self.lines.put(None)
+            raise EOFError
+        return line
+
+    def close(self) -> None:
+        """End the input, readline raises EOFError from now on"""
+        self.lines.put(None)
+
+
+class SessionConsole(Console):
+    """Console of a session which reads the input from its LineReader"""
+
+    def __init__(self, reader: LineReader, **kwargs):
+        super().__init__(**kwargs)
+        self.reader = reader
+
+    def input(self, prompt="", *, stream=None, **kwargs) -> str:
+        return super().input(prompt, stream=stream or self.reader, **kwargs)
+
+
+class SessionServer:
+    """Server which runs many terminal sessions in one process. Each
+    connection to the Unix socket is a session, the bytes received are
+    keystrokes and the bytes sent are terminal output. The sessions run
+    in threads with their own console and share one storage backend,
+    which must be thread-safe.
+    """
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        session: Callable[[StorageBackend], Any],
+        max_sessions: int = MAX_SESSIONS,
+    ):
+        """
+        Args:
+            storage (StorageBackend): The storage shared by the sessions
+            session (Callable[[StorageBackend], Any]): Function which
+            runs a session, e.g. FlowController
+            max_sessions (int, optional): Maximum number of sessions at
+            the same time. Defaults to 50.
+        """
+        self.storage = storage
+        self.session = session
+        self.max_sessions = max_sessions
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_sessions, thread_name_prefix="session"
+        )
+        self.readers: set[LineReader] = set()
+
+    async def serve(self, path: str = SOCKET_PATH) -> None:
+        """Accept sessions on the Unix socket until cancelled
+
+        Args:
+            path (str, optional): Path of the socket.
+            Defaults to "spa_sessions.sock".
+        """
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            # Left by a server which didn't stop cleanly
+            os.remove(path)
+        server = await asyncio.start_unix_server(self.handle, path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """End all sessions"""
+        for reader in list(self.readers):
+            reader.close()
+        self.executor.shutdown(wait=False)
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Run a session for a connection"""
+        if len(self.readers) >= self.max_sessions:
+            writer.write(f"{BUSY_MESSAGE}\r\n".encode())
+            await writer.drain()
+            writer.close()
+            return
+
+        loop = asyncio.get_running_loop()
+        output = SessionOutput(loop, writer)
+        lines = LineReader(output.write)
+        self.readers.add(lines)
+        console = SessionConsole(
+            lines,
+            file=output,
+            theme=print_theme,
+            force_terminal=True,
+            color_system="standard",
+            width=TERMINAL_WIDTH,
+            height=TERMINAL_HEIGHT,
+        )
+        context = contextvars.copy_context()
+        context.run(current_console.set, console)
+        session = loop.run_in_executor(
+            self.executor, context.run, self.session, self.storage
+        )
+        session.add_done_callback(self.session_done)
+
+        try:
+            while True:
+                read = asyncio.ensure_future(reader.read(READ_SIZE))
+                await asyncio.wait(
+                    {read, session}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not read.done():
+                    # The session has ended
+                    read.cancel()
+                    break
+                data = read.result()
+                if not data or not lines.feed(data):
+                    break
+        finally:
+            # The session thread gets EOFError on its next input
+            lines.close()
+            self.readers.discard(lines)
+            output.closed = True
+            if session.done():
+                # Send the last output of the session
+                with suppress(ConnectionError):
+                    await writer.drain()
+            writer.close()
+
+    @staticmethod
+    def session_done(session: asyncio.Future) -> None:
+        if session.cancelled():
+            return
+        error = session.exception()
+        if error is not None and not isinstance(error, EOFError):
+            traceback.print_exception(type(error), error, error.__traceback__)
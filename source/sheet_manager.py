@@ -1,132 +1,1349 @@
 from __future__ import annotations
 
-from datetime import date, datetime, time, timedelta
-from typing import Literal
+import logging
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor, wait
+from copy import deepcopy
+from dataclasses import dataclass, field
+from datetime import date
+from sys import intern
+from time import monotonic
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator
+from zlib import crc32
 
-from gspread import Spreadsheet
+from source.availability import AvailabilityEngine, time_to_minutes
+from source.storage import StorageBackend
 
+# gspread is slow to import and not needed when the data comes from
+# a snapshot, so its utilities are imported where they are used
+if TYPE_CHECKING:
+    from gspread import Spreadsheet, Worksheet
 
-class SpaSheet:
-    """Class to manage sheet data"""
+    from source.sheets_client import SheetConnection
+    from source.write_behind import BookingQueue
+
+logger = logging.getLogger(__name__)
+
+# Services rarely change, so they can be kept in memory for a long time
+CATALOG_TTL = 60 * 60
+# Bookings are written by other sessions too, so reload them more often
+BOOKINGS_TTL = 60
+# Delta sync compares this number of the last synced booking rows
+SYNC_SAMPLE_SIZE = 5
+# Edits which don't change the sampled rows are picked up by full reloads
+FULL_SYNC_INTERVAL = 10 * 60
+
+
+class RecordCache:
+    """Class to keep worksheet records in memory for a limited time"""
+
+    def __init__(self, loader: Callable[[], list[dict]], ttl: float):
+        """
+        Args:
+            loader (Callable[[], list[dict]]): Function which returns
+            fresh records, e.g. worksheet.get_all_records
+            ttl (float): Number of seconds the records are considered fresh
+        """
+        self.loader = loader
+        self.ttl = ttl
+        self._data = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_stale(self) -> bool:
+        """Check if the records were never loaded or expired"""
+        return self.expired(self._data)
 
-    def __init__(self, sheet: Spreadsheet):
-        self.sheet = sheet
+    def get(self):
+        """Return cached data. Load it from the sheet if it is stale.
+        Concurrent callers wait for one load instead of starting their own.
+        The data checked or loaded is returned, even if another thread
+        invalidates the cache meanwhile.
+        """
+        data = self._data
+        if self.expired(data):
+            with self._lock:
+                data = self._data
+                if self.expired(data):
+                    data = self.refresh()
+        return data
+
+    def expired(self, data) -> bool:
+        """Check if the data read from the cache has to be loaded again"""
+        return data is None or monotonic() - self._loaded_at >= self.ttl
+
+    @property
+    def is_loaded(self) -> bool:
+        """Check if the data was loaded, it may be expired"""
+        return self._data is not None
 
-        # Loop through all the worksheets and set them as properties
-        for work_sheet in self.sheet.worksheets():
-            setattr(self, work_sheet.title, work_sheet)
+    def refresh(self):
+        """Load records from the sheet regardless of their age
+
+        Returns:
+            The data built from the fresh records
+        """
+        return self.update(self.loader())
 
-    def get_services(
-        self, service_type: Literal[None, "main", "sub"] = None
-    ) -> list[dict]:
-        """Get services from the sheet based on the service_type provided.
-        If the service_type is None, it will return all services.
-        If the service_type is 'main' or 'sub' it will return
-        services with respective type.
+    def update(self, records: list[dict]):
+        """Replace cached data with records loaded by the caller,
+        e.g. together with other worksheets
 
         Args:
-            service_type (Literal[None, "main", "sub"], optional): type of
-            service. Defaults to None.
+            records (list[dict]): Fresh records
 
         Returns:
-            list[dict]: List of services
+            The data built from the records
         """
+        data = self.build(records)
+        self._data = data
+        self._loaded_at = monotonic()
+        return data
+
+    def invalidate(self) -> None:
+        """Drop cached data so the next access reloads it"""
+        self._data = None
+
+    def dump(self) -> dict:
+        """Get the state of the cache to keep in a snapshot
+
+        Returns:
+            dict: The state with the data and its age in seconds
+        """
+        return {"data": self._data, "age": monotonic() - self._loaded_at}
+
+    def restore(self, state: dict) -> None:
+        """Restore the state saved with dump. The data keeps the age it
+        had when it was dumped, so it expires together with the source.
+        It should be revalidated with refresh.
+
+        Args:
+            state (dict): The state
+        """
+        self._data = state["data"]
+        self._loaded_at = monotonic() - state.get("age", 0.0)
+
+    def build(self, records: list[dict]):
+        """Convert loaded records to the data which is kept in the cache.
+
+        Args:
+            records (list[dict]): Records loaded from the sheet
+
+        Returns:
+            The data to keep in the cache
+        """
+        return records
 
-        if service_type:
-            result = [
-                service
-                for service in self.spa_info.get_all_records()
-                if service["type"] == service_type
-            ]
-        else:
-            result = self.spa_info.get_all_records()
 
-        return result
+@dataclass(frozen=True)
+class Service:
+    """Typed record of a service from the spa_info worksheet"""
 
-    def get_service_info(self, service: str, field_name: str) -> str:
-        """Get the information for a particular service field
+    name: str
+    type: str
+    description: str
+    duration: float
+    price: float
+
+    @classmethod
+    def from_record(cls, record: dict) -> Service:
+        """Create a service from a worksheet record. Numeric fields are
+        parsed once here, so the callers don't need to convert them.
 
+        Args:
+            record (dict): Record from the spa_info worksheet
+
+        Returns:
+            Service: The service object
+        """
+        return cls(
+            name=record["name"],
+            type=record["type"],
+            description=record["description"],
+            duration=float(record["duration"]),
+            price=float(record["price"]),
+        )
+
+    def __getitem__(self, key: str):
+        # Allow dict-like access used by PrintMixin methods
+        return getattr(self, key)
+
+
+@dataclass
+class ServiceIndex:
+    """Services indexed by name and split by type"""
+
+    services: list[Service] = field(default_factory=list)
+    by_name: dict[str, Service] = field(default_factory=dict)
+    by_type: dict[str, list[Service]] = field(default_factory=dict)
+
+    @classmethod
+    def from_records(cls, records: list[dict]) -> ServiceIndex:
+        """Build the index from the spa_info worksheet records
+
+        Args:
+            records (list[dict]): Records from the spa_info worksheet
+
+        Returns:
+            ServiceIndex: The index of services
+        """
+        index = cls()
+        for record in records:
+            service = Service.from_record(record)
+            index.services.append(service)
+            index.by_name[service.name] = service
+            index.by_type.setdefault(service.type, []).append(service)
+        return index
+
+
+class ServiceCatalog(RecordCache):
+    """Cache of spa_info records kept as a ServiceIndex"""
+
+    def build(self, records: list[dict]) -> ServiceIndex:
+        return ServiceIndex.from_records(records)
+
+
+def normalize_phone_number(phone_number: str | int) -> str:
+    """Normalize a phone number from the sheet to E.164 format. The sheet
+    may keep the number as text or convert it to an integer.
+
+    Args:
+        phone_number (str | int): The phone number
+
+    Returns:
+        str: The phone number in format +CCCNNNNNNNNN
+    """
+    digits = "".join(char for char in str(phone_number) if char.isdigit())
+    return f"+{digits}" if digits else ""
+
+
+def values_to_records(values: list[list]) -> list[dict]:
+    """Convert worksheet values with the header in the first row
+    to records like Worksheet.get_all_records does
+
+    Args:
+        values (list[list]): Values of the worksheet
+
+    Returns:
+        list[dict]: Records of the rows below the header
+    """
+    from gspread.utils import numericise_all
+
+    if not values:
+        return []
+    keys, *rows = values
+    return [
+        dict(zip(keys, numericise_all(row + [""] * (len(keys) - len(row)))))
+        for row in rows
+    ]
+
+
+class Booking:
+    """Compact record of a booking from the booking_data worksheet.
+    Date and times are parsed once when the record is created.
+    """
+
+    __slots__ = (
+        "service",
+        "additional_service",
+        "name",
+        "phone_number",
+        "day",
+        "start",
+        "end",
+    )
+
+    def __init__(
+        self,
+        service: str,
+        additional_service: str,
+        name: str,
+        phone_number: str,
+        day: int,
+        start: int,
+        end: int,
+    ):
+        """
         Args:
             service (str): Service name
-            field_name (str): Service field to get information from
+            additional_service (str): Additional service name
+            name (str): Name of the customer
+            phone_number (str): Phone number in E.164 format
+            day (int): Proleptic Gregorian ordinal of the date
+            start (int): Start time in minutes since midnight
+            end (int): End time in minutes since midnight
+        """
+        self.service = service
+        self.additional_service = additional_service
+        self.name = name
+        self.phone_number = phone_number
+        self.day = day
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def from_record(cls, record: dict) -> Booking:
+        """Create a booking from a worksheet record
+
+        Args:
+            record (dict): Record from the booking_data worksheet
 
         Returns:
-            str: The service information which is contained in the field_name
+            Booking: The booking object
         """
-        services = self.spa_info.get_all_records()
+        return cls(
+            service=intern(str(record["service"])),
+            additional_service=intern(
+                str(record.get("additional_service", ""))
+            ),
+            name=str(record.get("name", "")),
+            phone_number=normalize_phone_number(
+                record.get("phone_number", "")
+            ),
+            day=date.fromisoformat(record["date"]).toordinal(),
+            start=time_to_minutes(record["start_time"]),
+            end=time_to_minutes(record["end_time"]),
+        )
+
+    @property
+    def date(self) -> str:
+        return date.fromordinal(self.day).isoformat()
+
+    @property
+    def start_time(self) -> str:
+        return f"{self.start // 60:02d}:{self.start % 60:02d}"
+
+    @property
+    def end_time(self) -> str:
+        return f"{self.end // 60:02d}:{self.end % 60:02d}"
+
+    def __getitem__(self, key: str):
+        # Allow dict-like access used by PrintMixin methods
+        return getattr(self, key)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Booking):
+            return NotImplemented
+        return all(
+            getattr(self, slot) == getattr(other, slot)
+            for slot in self.__slots__
+        )
+
+    def __hash__(self) -> int:
+        return hash(tuple(getattr(self, slot) for slot in self.__slots__))
+
+    def __repr__(self) -> str:
+        return (
+            f"Booking({self.service!r}, {self.date}, "
+            f"{self.start_time}-{self.end_time})"
+        )
+
+
+# Kept in place of a malformed worksheet row, so the next rows keep
+# their row numbers. It matches no service or customer.
+EMPTY_BOOKING = Booking("", "", "", "", 1, 0, 0)
+
+
+def parse_booking(record: dict, row_number: int) -> Booking:
+    """Create a booking from a worksheet record. A malformed record,
+    e.g. with a date typed by hand in another format, is logged and
+    replaced with EMPTY_BOOKING instead of failing the whole load.
+
+    Args:
+        record (dict): Record from the booking_data worksheet
+        row_number (int): Row number of the record for the log
+
+    Returns:
+        Booking: The booking or EMPTY_BOOKING
+    """
+    try:
+        return Booking.from_record(record)
+    except (KeyError, TypeError, ValueError) as error:
+        logger.warning(
+            "Skipping malformed booking in row %d: %r", row_number, error
+        )
+        return EMPTY_BOOKING
+
+
+def interval_position(
+    starts: array, ends: array, start: int, end: int, left: bool = False
+) -> int:
+    """Find the position of an interval in arrays of start and end
+    minutes sorted by (start, end)
 
-        for service_data in services:
-            if service_data["name"] == service:
-                return service_data[field_name]
+    Args:
+        starts (array): Sorted start minutes
+        ends (array): End minutes, sorted for equal starts
+        start (int): Start minute of the interval
+        end (int): End minute of the interval
+        left (bool, optional): Find the first equal interval instead of
+        the position after the equal intervals. Defaults to False.
 
-        return "Service not found"
+    Returns:
+        int: The position to insert or look up the interval
+    """
+    low = bisect_left(starts, start)
+    high = bisect_right(starts, start, low)
+    if left:
+        return bisect_left(ends, end, low, high)
+    return bisect_right(ends, end, low, high)
 
-    def get_available_times_for_date_and_service(
-        self, date_str: str, service: str
-    ) -> list[list[datetime]]:
-        """Calculates available ranges for booking and returns them.
+
+class BookingStore:
+    """Column-oriented table of bookings in worksheet order. Each column
+    is an integer array; strings are kept once in a shared table and the
+    columns hold their codes. For availability lookups the start and end
+    minutes are also partitioned by service and date ordinal into arrays
+    sorted by (start, end), and row ids are indexed by phone number for
+    customer lookups.
+    """
+
+    COLUMNS = (
+        "services",
+        "additional_services",
+        "names",
+        "phone_numbers",
+        "days",
+        "starts",
+        "ends",
+    )
+
+    def __init__(self):
+        for column in self.COLUMNS:
+            setattr(self, column, array("i"))
+        self.strings: list[str] = []
+        self.codes: dict[str, int] = {}
+        self.partitions: dict[tuple[int, int], tuple[array, array]] = {}
+        # Row ids don't change when other rows are deleted. They grow with
+        # each appended booking, so the ids column is always sorted.
+        self.ids = array("q")
+        self.next_id = 0
+        self.customers: dict[int, list[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def code(self, value: str) -> int:
+        """Get the code of a string. New strings are added to the table.
 
         Args:
-            date_str (str): The date to check for available time
-            service (str): The service to check for available time
+            value (str): The string
 
         Returns:
-            list[list[datetime]: List of available time
+            int: The code of the string
         """
-        # Define the open and close time for the spa
-        open_time = time.fromisoformat("08:00")
-        close_time = time.fromisoformat("21:00")
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.strings)
+            self.strings.append(value)
+        return code
 
-        # Convert the date string to date object
-        date_obj = date.fromisoformat(date_str)
+    def append(self, booking: Booking) -> int:
+        """Append a booking to the end of the table
 
-        # Get all bookings and the duration of the service
-        all_bookings = self.booking_data.get_all_records()
+        Args:
+            booking (Booking): The booking
 
-        # Define timedelta object for duration of selected service
-        service_duration = timedelta(
-            hours=self.get_service_info(service, "duration")
+        Returns:
+            int: Position of the booking in the table
+        """
+        service = self.code(booking.service)
+        self.services.append(service)
+        self.additional_services.append(self.code(booking.additional_service))
+        self.names.append(self.code(booking.name))
+        self.phone_numbers.append(self.code(booking.phone_number))
+        self.days.append(booking.day)
+        self.starts.append(booking.start)
+        self.ends.append(booking.end)
+
+        starts, ends = self.partitions.setdefault(
+            (service, booking.day), (array("i"), array("i"))
         )
+        position = interval_position(starts, ends, booking.start, booking.end)
+        starts.insert(position, booking.start)
+        ends.insert(position, booking.end)
+
+        row_id = self.next_id
+        self.next_id += 1
+        self.ids.append(row_id)
+        self.customers.setdefault(self.phone_numbers[-1], []).append(row_id)
+        return len(self) - 1
 
-        service_date_bookings = []
+    def delete(self, position: int) -> None:
+        """Delete a booking. Positions of the next bookings are shifted
+        like the rows of the worksheet.
 
-        # Loop through all bookings and get the bookings
-        # for the service and date
-        for booking in all_bookings:
-            booking_date_obj = date.fromisoformat(booking["date"])
-            if booking["service"] == service and booking_date_obj == date_obj:
-                service_date_bookings.append(booking)
+        Args:
+            position (int): Position of the booking in the table
+        """
+        key = (self.services[position], self.days[position])
+        if key in self.partitions:
+            starts, ends = self.partitions[key]
+            start, end = self.starts[position], self.ends[position]
+            index = interval_position(starts, ends, start, end, left=True)
+            found = index < len(starts) and starts[index] == start
+            if found and ends[index] == end:
+                del starts[index]
+                del ends[index]
+
+        self.customers[self.phone_numbers[position]].remove(self.ids[position])
+
+        for column in self.COLUMNS:
+            del getattr(self, column)[position]
+        del self.ids[position]
+
+    def booking(self, position: int) -> Booking:
+        """Get a booking record at the position
 
-        # Sort the bookings by start time
-        service_date_bookings.sort(
-            key=lambda x: time().fromisoformat(x["start_time"])
+        Args:
+            position (int): Position of the booking in the table
+
+        Returns:
+            Booking: The booking
+        """
+        strings = self.strings
+        return Booking(
+            service=strings[self.services[position]],
+            additional_service=strings[self.additional_services[position]],
+            name=strings[self.names[position]],
+            phone_number=strings[self.phone_numbers[position]],
+            day=self.days[position],
+            start=self.starts[position],
+            end=self.ends[position],
         )
 
-        available_times = []
-        for index in range(len(service_date_bookings) + 1):
-            if index == 0:
-                start_time = open_time
+    def intervals(self, service: str, day: int) -> list[tuple[int, int]]:
+        """Get sorted booked intervals for the service on the day
+
+        Args:
+            service (str): Service name
+            day (int): Date ordinal
+
+        Returns:
+            list[tuple[int, int]]: Sorted (start, end) intervals in minutes
+        """
+        partition = self.partitions.get((self.codes.get(service), day))
+        if partition is None:
+            return []
+        return list(zip(*partition))
+
+    def position(self, row_id: int) -> int | None:
+        """Get the current position of a row id
+
+        Args:
+            row_id (int): The row id
+
+        Returns:
+            int | None: Position of the booking or None if it was deleted
+        """
+        position = bisect_left(self.ids, row_id)
+        if position < len(self.ids) and self.ids[position] == row_id:
+            return position
+        return None
+
+    def find_customer(
+        self, phone_number: str, name: str | None = None
+    ) -> list[int]:
+        """Find positions of customer bookings with the phone number index
+
+        Args:
+            phone_number (str): Phone number in E.164 format
+            name (str | None, optional): Name of the customer.
+            Defaults to None which matches any name.
+
+        Returns:
+            list[int]: Sorted positions of the customer bookings
+        """
+        phone_code = self.codes.get(phone_number)
+        if phone_code is None:
+            return []
+
+        positions = [
+            self.position(row_id)
+            for row_id in self.customers.get(phone_code, [])
+        ]
+        if name is None:
+            return positions
+
+        name_code = self.codes.get(name)
+        return [
+            position
+            for position in positions
+            if self.names[position] == name_code
+        ]
+
+    def filter(self, **values: str | int) -> list[int]:
+        """Find positions of bookings which have all the given values.
+        String values are matched by their codes, so a value which
+        is not in the table matches nothing.
+
+        Args:
+            **values: Column names with the values, e.g. names="Joe"
+
+        Returns:
+            list[int]: Sorted positions of matching bookings
+        """
+        criteria = []
+        for column, value in values.items():
+            if isinstance(value, str):
+                value = self.codes.get(value)
+                if value is None:
+                    return []
+            criteria.append((getattr(self, column), value))
+
+        if not criteria:
+            return list(range(len(self)))
+
+        (first_column, first_value), *other = criteria
+        return [
+            position
+            for position, value in enumerate(first_column)
+            if value == first_value
+            and all(column[position] == value for column, value in other)
+        ]
+
+    def columns(
+        self, service: str, first_day: int, days: int
+    ) -> tuple[array, array, array]:
+        """Get the day, start and end columns of the bookings of a service
+        in a range of days, e.g. for BitmapAvailability.range_slot_starts
+
+        Args:
+            service (str): Service name
+            first_day (int): Date ordinal of the first day of the range
+            days (int): Number of days in the range
+
+        Returns:
+            tuple[array, array, array]: Days counted from the first day,
+            start and end minutes of the bookings
+        """
+        booked_days, starts, ends = array("i"), array("i"), array("i")
+        for position in self.filter(services=service):
+            day = self.days[position] - first_day
+            if 0 <= day < days:
+                booked_days.append(day)
+                starts.append(self.starts[position])
+                ends.append(self.ends[position])
+        return booked_days, starts, ends
+
+    def scan(self, positions: Iterable[int]) -> Iterator[Booking]:
+        """Get booking records at the positions
+
+        Args:
+            positions (Iterable[int]): Positions of the bookings
+
+        Yields:
+            Booking: The booking at each position
+        """
+        for position in positions:
+            yield self.booking(position)
+
+
+class BookingIndex(RecordCache):
+    """Cache of booking_data records kept as a BookingStore. The store
+    is changed in place when bookings are saved or deleted, so it is
+    read and changed under a lock. The lock is not held while bookings
+    are loaded, new stores are swapped in at once.
+    """
+
+    def __init__(self, loader: Callable[[], list[dict]], ttl: float):
+        super().__init__(loader, ttl)
+        self._store_lock = threading.RLock()
+
+    def build(self, records: list[dict]) -> BookingStore:
+        store = BookingStore()
+        # The first row of the worksheet is the header
+        for row_number, record in enumerate(records, start=2):
+            store.append(parse_booking(record, row_number))
+        return store
+
+    def intervals(self, service: str, date_obj: date) -> list[tuple[int, int]]:
+        """Get sorted booked intervals for the service on the date
+
+        Args:
+            service (str): Service name
+            date_obj (date): The date
+
+        Returns:
+            list[tuple[int, int]]: Sorted (start, end) intervals in minutes
+        """
+        store = self.get()
+        with self._store_lock:
+            return list(store.intervals(service, date_obj.toordinal()))
+
+    def columns(
+        self, service: str, first_day: date, days: int
+    ) -> tuple[array, array, array]:
+        """Get the bookings of a service in a range of days as columns
+
+        Args:
+            service (str): Service name
+            first_day (date): The first date of the range
+            days (int): Number of days in the range
+
+        Returns:
+            tuple[array, array, array]: Days counted from the first day,
+            start and end minutes of the bookings
+        """
+        store = self.get()
+        with self._store_lock:
+            return store.columns(service, first_day.toordinal(), days)
+
+    def find(self, name: str, phone_number: str) -> list[tuple[int, Booking]]:
+        """Find bookings of a customer
+
+        Args:
+            name (str): Name of the customer
+            phone_number (str): Phone number of the customer
+
+        Returns:
+            list[tuple[int, Booking]]: Row numbers and bookings
+        """
+        store = self.get()
+        with self._store_lock:
+            positions = store.find_customer(
+                normalize_phone_number(phone_number), name
+            )
+            # The first row of the worksheet is the header
+            return [
+                (position + 2, booking)
+                for position, booking in zip(positions, store.scan(positions))
+            ]
+
+    def dump(self) -> dict:
+        # The store is copied, so it can be pickled while it is changed
+        with self._store_lock:
+            return {**super().dump(), "data": deepcopy(self._data)}
+
+    def add(self, record: dict) -> None:
+        """Add a new booking appended to the worksheet to the loaded index
+
+        Args:
+            record (dict): Booking record
+        """
+        booking = Booking.from_record(record)
+        with self._store_lock:
+            if self._data is not None:
+                self._data.append(booking)
+
+    def remove(self, row_number: int, booking: Booking) -> None:
+        """Remove a booking deleted from the worksheet from the loaded index
+
+        Args:
+            row_number (int): Row number of the booking in the worksheet
+            booking (Booking): The booking
+        """
+        with self._store_lock:
+            if self._data is None:
+                return
+            position = row_number - 2
+            if 0 <= position < len(self._data):
+                if self._data.booking(position) == booking:
+                    self._data.delete(position)
+                    return
+            # The index is out of sync with the worksheet, reload it later
+            self.invalidate()
+
+
+def row_fingerprint(row: list) -> int:
+    """Checksum of worksheet row values. Trailing empty cells are
+    ignored, because the API does not always return them.
+
+    Args:
+        row (list): Values of the row
+
+    Returns:
+        int: The checksum
+    """
+    values = [str(value) for value in row]
+    while values and values[-1] == "":
+        values.pop()
+    return crc32("\x1f".join(values).encode())
+
+
+class SyncedBookingIndex(BookingIndex):
+    """Booking index which is refreshed with the rows appended to the
+    worksheet since the last sync. The header, a sample of the last
+    synced rows and the new rows are read in one request. The index is
+    fully reloaded if the header or the sample changed, which means
+    that rows were edited or deleted, and every FULL_SYNC_INTERVAL.
+    """
+
+    def __init__(
+        self,
+        worksheet: Worksheet | Callable[[], Worksheet],
+        ttl: float,
+        pending: Callable[[], list[dict]] | None = None,
+        sample_size: int = SYNC_SAMPLE_SIZE,
+        full_sync_interval: float = FULL_SYNC_INTERVAL,
+    ):
+        """
+        Args:
+            worksheet (Worksheet | Callable[[], Worksheet]): The
+            booking_data worksheet or a function which looks it up
+            on first use
+            ttl (float): Number of seconds the bookings are considered
+            fresh
+            pending (Callable[[], list[dict]] | None, optional): Function
+            which returns bookings not written to the worksheet yet,
+            e.g. the write-behind queue records. Defaults to None.
+            sample_size (int, optional): Number of the last synced rows
+            compared on refresh. Defaults to SYNC_SAMPLE_SIZE.
+            full_sync_interval (float, optional): Seconds between full
+            reloads. Defaults to FULL_SYNC_INTERVAL.
+        """
+        super().__init__(lambda: self.worksheet.get_all_values(), ttl)
+        self._worksheet = worksheet
+        self.pending = pending
+        self.sample_size = sample_size
+        self.full_sync_interval = full_sync_interval
+        self.header: list = []
+        # Checksums of the worksheet rows in the index. Bookings after
+        # them were added locally and are not seen in the worksheet yet.
+        self.fingerprints: list[int] = []
+        self._synced_at = 0.0
+
+    @property
+    def worksheet(self) -> Worksheet:
+        if callable(self._worksheet):
+            self._worksheet = self._worksheet()
+        return self._worksheet
+
+    def record(self, row: list, header: list | None = None) -> dict:
+        if header is None:
+            header = self.header
+        return dict(zip(header, row + [""] * (len(header) - len(row))))
+
+    def refresh(self) -> BookingStore:
+        """Sync the index with the worksheet
+
+        Returns:
+            BookingStore: The synced bookings
+        """
+        store = None
+        if (
+            self._data is not None
+            and monotonic() - self._synced_at < self.full_sync_interval
+        ):
+            store = self.sync()
+        if store is None:
+            store = self.full_sync()
+        self._loaded_at = monotonic()
+        return store
+
+    def update(self, rows: list[list]) -> BookingStore:
+        """Replace the index with all rows of the worksheet loaded
+        by the caller
+
+        Args:
+            rows (list[list]): Values of the worksheet with the header
+
+        Returns:
+            BookingStore: The bookings
+        """
+        store = self.full_sync(rows)
+        self._loaded_at = monotonic()
+        return store
+
+    def full_sync(self, rows: list[list] | None = None) -> BookingStore:
+        """Reload all rows of the worksheet
+
+        Args:
+            rows (list[list] | None, optional): Values of the worksheet
+            if they are already loaded. Defaults to None.
+
+        Returns:
+            BookingStore: The new bookings
+        """
+        if rows is None:
+            rows = self.loader()
+        header = rows[0] if rows else []
+        fingerprints = [row_fingerprint(row) for row in rows[1:]]
+        records = [self.record(row, header) for row in rows[1:]]
+        if self.pending is not None:
+            records.extend(self.pending())
+        store = self.build(records)
+        with self._store_lock:
+            self.header = header
+            self.fingerprints = fingerprints
+            self._data = store
+            self._synced_at = monotonic()
+        return store
+
+    def sync(self) -> BookingStore | None:
+        """Append the new rows of the worksheet to the index
+
+        Returns:
+            BookingStore | None: The synced bookings, None if the index
+            or the worksheet was changed in another way and needs a full
+            reload
+        """
+        from gspread.utils import rowcol_to_a1
+
+        with self._store_lock:
+            store = self._data
+            synced = len(self.fingerprints)
+        sample_start = max(0, synced - self.sample_size)
+        last_column = rowcol_to_a1(1, max(len(self.header), 1))[:-1]
+        ranges = ["1:1", f"A{synced + 2}:{last_column}"]
+        if synced:
+            ranges.append(f"A{sample_start + 2}:{last_column}{synced + 1}")
+
+        header, tail, *sample = self.worksheet.batch_get(ranges)
+        with self._store_lock:
+            if (
+                store is None
+                or self._data is not store
+                or len(self.fingerprints) != synced
+            ):
+                # Changed by another refresh during the request
+                return None
+            if (header[0] if header else []) != self.header:
+                return None
+            sample_rows = sample[0] if sample else []
+            if [row_fingerprint(row) for row in sample_rows] != (
+                self.fingerprints[sample_start:]
+            ):
+                return None
+
+            local = [
+                store.booking(position)
+                for position in range(synced, len(store))
+            ]
+            new = []
+            for offset, row in enumerate(tail):
+                booking = parse_booking(self.record(row), synced + 2 + offset)
+                if offset < len(local):
+                    # Bookings added locally are appended in the same order
+                    if booking != local[offset]:
+                        return None
+                else:
+                    new.append(booking)
+            # Nothing is changed until all rows are checked
+            for booking in new:
+                store.append(booking)
+            self.fingerprints.extend(row_fingerprint(row) for row in tail)
+        return store
+
+    def dump(self) -> dict:
+        with self._store_lock:
+            return {
+                **super().dump(),
+                "header": self.header,
+                "fingerprints": list(self.fingerprints),
+            }
+
+    def restore(self, state: dict) -> None:
+        super().restore(state)
+        # Without the checksums the next sync reloads all rows
+        self.header = state.get("header", [])
+        self.fingerprints = state.get("fingerprints", [])
+        self._synced_at = monotonic()
+
+    def remove(self, row_number: int, booking: Booking) -> None:
+        with self._store_lock:
+            super().remove(row_number, booking)
+            position = row_number - 2
+            if self._data is not None and position < len(self.fingerprints):
+                del self.fingerprints[position]
+
+
+def row_ranges(row_numbers: list[int]) -> list[tuple[int, int]]:
+    """Merge descending row numbers into ranges of adjacent rows
+
+    Args:
+        row_numbers (list[int]): Row numbers sorted in descending order
+
+    Returns:
+        list[tuple[int, int]]: First and last row of each range
+        in descending order
+    """
+    ranges = []
+    for row_number in row_numbers:
+        if ranges and ranges[-1][0] == row_number + 1:
+            ranges[-1] = (row_number, ranges[-1][1])
+        else:
+            ranges.append((row_number, row_number))
+    return ranges
+
+
+class LazyWorksheet:
+    """Worksheet attribute which is looked up by its title on first
+    access and kept by the instance afterwards
+    """
+
+    def __init__(self, title: str):
+        self.title = title
+
+    def __get__(self, instance, owner=None) -> Worksheet | LazyWorksheet:
+        if instance is None:
+            return self
+        worksheet = instance.sheet.worksheet(self.title)
+        # The instance attribute hides this descriptor from now on
+        instance.__dict__[self.title] = worksheet
+        return worksheet
+
+
+class SpaSheet(StorageBackend):
+    """Class to manage sheet data"""
+
+    spa_info = LazyWorksheet("spa_info")
+    booking_data = LazyWorksheet("booking_data")
+
+    def __init__(
+        self,
+        sheet: Spreadsheet | None,
+        catalog_ttl: float = CATALOG_TTL,
+        bookings_ttl: float = BOOKINGS_TTL,
+        availability: AvailabilityEngine | None = None,
+        queue: BookingQueue | None = None,
+        delta_sync: bool = False,
+        connection: SheetConnection | None = None,
+    ):
+        """
+        Args:
+            sheet (Spreadsheet | None): The spreadsheet, None to open it
+            with the connection
+            catalog_ttl (float, optional): Seconds to keep the services.
+            bookings_ttl (float, optional): Seconds to keep the bookings.
+            availability (AvailabilityEngine | None, optional): Engine
+            to calculate free slots.
+            queue (BookingQueue | None, optional): Queue for write-behind
+            mode. New bookings are put into the queue and written
+            to the worksheet later by a BookingFlusher. Defaults to None,
+            which writes bookings immediately.
+            delta_sync (bool, optional): Refresh the bookings by reading
+            only the rows appended since the last refresh.
+            Defaults to False.
+            connection (SheetConnection | None, optional): Connection
+            which opens the spreadsheet when it is first used, so the
+            cached data can be read before that. Defaults to None.
+        """
+        super().__init__(availability)
+        self._sheet = sheet
+        self.connection = connection
+        self.queue = queue
+
+        self.catalog = ServiceCatalog(
+            lambda: self.spa_info.get_all_records(), catalog_ttl
+        )
+        self.booking_header = RecordCache(
+            lambda: self.booking_data.row_values(1), catalog_ttl
+        )
+        self._load_lock = threading.Lock()
+        # Keeps the row numbers of the index in step with the worksheet
+        self._write_lock = threading.Lock()
+        if delta_sync:
+            self.bookings = SyncedBookingIndex(
+                lambda: self.booking_data,
+                bookings_ttl,
+                pending=self.queue.records if self.queue else None,
+            )
+        else:
+            self.bookings = BookingIndex(self.load_bookings, bookings_ttl)
+
+    @property
+    def sheet(self) -> Spreadsheet | None:
+        """The spreadsheet, opened on first use if it was not given"""
+        if self._sheet is None and self.connection is not None:
+            self._sheet = self.connection.open()
+        return self._sheet
+
+    def prefetch(self, timeout: float | None = None) -> bool:
+        """Load the services, the bookings and the booking_data header
+        in a background thread. If the load doesn't finish in time it
+        continues in the background and callers of the data wait for it.
+
+        Args:
+            timeout (float | None, optional): Seconds to wait for the
+            load. Defaults to None, which waits until it finishes.
+
+        Returns:
+            bool: Whether the load finished in time
+        """
+        executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="prefetch"
+        )
+        future = executor.submit(self.load_stale, header=True)
+        executor.shutdown(wait=False)
+
+        done, _ = wait([future], timeout=timeout)
+        # A failed load is repeated when the data is needed
+        return bool(done) and future.exception() is None
+
+    def load_stale(self, header: bool = False) -> None:
+        """Load all expired sheet data with one values_batch_get request.
+        Bookings which are synced with new rows only are refreshed by
+        their index.
+
+        Args:
+            header (bool, optional): Load the booking_data header even
+            if nothing else has to be loaded. Defaults to False.
+        """
+        # Fresh data is read without waiting for a load of other callers
+        if not self.stale_names(header):
+            return
+        with self._load_lock:
+            self.load(self.stale_names(header))
+
+    def stale_names(self, header: bool = False) -> list[str]:
+        """Find the sheet data which load_stale has to load
+
+        Args:
+            header (bool, optional): Include the booking_data header
+            if nothing else is stale. Defaults to False.
+
+        Returns:
+            list[str]: Names for load
+        """
+        names = []
+        if self.catalog.is_stale:
+            names.append("catalog")
+        if self.bookings.is_stale and not (
+            isinstance(self.bookings, SyncedBookingIndex)
+            and self.bookings.is_loaded
+        ):
+            names.append("bookings")
+        elif self.booking_header.is_stale and (names or header):
+            names.append("header")
+        return names
+
+    def reload(self) -> None:
+        """Load the catalog and the bookings regardless of their age.
+        The cached data is used until the new data arrives.
+        """
+        names = ["catalog", "bookings"]
+        if (
+            isinstance(self.bookings, SyncedBookingIndex)
+            and self.bookings.is_loaded
+        ):
+            names.remove("bookings")
+            self.bookings.refresh()
+        self.load(names)
+
+    def refresh_bookings(self) -> None:
+        """Load the bookings regardless of their age, so the row numbers
+        found afterwards include the changes of other sessions
+        """
+        with self._load_lock:
+            if (
+                isinstance(self.bookings, SyncedBookingIndex)
+                and self.bookings.is_loaded
+            ):
+                self.bookings.refresh()
             else:
-                start_time = time.fromisoformat(
-                    service_date_bookings[index - 1]["end_time"]
-                )
+                self.load(["bookings"])
+
+    def load(self, names: list[str]) -> None:
+        """Load sheet data with one values_batch_get request
 
-            if index == len(service_date_bookings):
-                end_time = close_time
+        Args:
+            names (list[str]): "catalog", "bookings" or "header"
+        """
+        from gspread.utils import absolute_range_name
+
+        ranges = {}
+        if "catalog" in names:
+            ranges["catalog"] = absolute_range_name(SpaSheet.spa_info.title)
+        if "bookings" in names:
+            ranges["bookings"] = absolute_range_name(
+                SpaSheet.booking_data.title
+            )
+        elif "header" in names:
+            ranges["header"] = absolute_range_name(
+                SpaSheet.booking_data.title, "1:1"
+            )
+        if not ranges:
+            return
+
+        response = self.sheet.values_batch_get(list(ranges.values()))
+        values = {
+            name: value_range.get("values", [])
+            for name, value_range in zip(ranges, response["valueRanges"])
+        }
+
+        if "catalog" in values:
+            self.catalog.update(values_to_records(values["catalog"]))
+        if "bookings" in values:
+            rows = values["bookings"]
+            if isinstance(self.bookings, SyncedBookingIndex):
+                self.bookings.update(rows)
             else:
-                end_time = time.fromisoformat(
-                    service_date_bookings[index]["start_time"]
+                self.bookings.update(
+                    self.with_pending(values_to_records(rows))
                 )
+            self.booking_header.update(rows[0] if rows else [])
+        if "header" in values:
+            rows = values["header"]
+            self.booking_header.update(rows[0] if rows else [])
 
-            # Convert to datetime object to add the service duration
-            start_time = datetime.combine(date_obj, start_time)
-            end_time = datetime.combine(date_obj, end_time)
+    def load_bookings(self) -> list[dict]:
+        """Read the booking_data records followed by the queued bookings,
+        which will be appended to the worksheet in the same order
 
-            # Create a ranges of available booking times
-            while service_duration + start_time <= end_time:
-                available_times.append(
-                    [start_time, start_time + service_duration]
-                )
-                start_time += timedelta(hours=1)
+        Returns:
+            list[dict]: Booking records
+        """
+        return self.with_pending(self.booking_data.get_all_records())
+
+    def with_pending(self, records: list[dict]) -> list[dict]:
+        """Add the queued bookings to the booking_data records"""
+        if self.queue is not None:
+            records = records + self.queue.records()
+        return records
 
-        return available_times
+    def service_index(self) -> ServiceIndex:
+        self.load_stale()
+        return self.catalog.get()
+
+    def booked_intervals(
+        self, service: str, date_obj: date
+    ) -> list[tuple[int, int]]:
+        self.load_stale()
+        return self.bookings.intervals(service, date_obj)
+
+    def booked_columns(
+        self, service: str, first_day: date, days: int
+    ) -> tuple[array, array, array]:
+        self.load_stale()
+        return self.bookings.columns(service, first_day, days)
+
+    def save_booking(self, info: dict) -> None:
+        """Append a booking to the booking_data worksheet or put it into
+        the write-behind queue
+
+        Args:
+            info (dict): Booking information
+        """
+        with self._write_lock:
+            if self.queue is not None:
+                self.queue.put(info)
+            else:
+                self.append_bookings([info])
+            self.bookings.add(info)
+
+    def append_bookings(self, records: list[dict]) -> None:
+        """Append bookings to the booking_data worksheet in one request.
+        The values are ordered by the worksheet header.
+
+        Args:
+            records (list[dict]): Booking records
+        """
+        self.load_stale(header=True)
+        header = self.booking_header.get()
+        self.booking_data.append_rows(
+            [[record.get(key, "") for key in header] for record in records]
+        )
+
+    def find_bookings(
+        self, name: str, phone_number: str
+    ) -> list[tuple[int, Booking]]:
+        """Find bookings of a customer
+
+        Args:
+            name (str): Name of the customer
+            phone_number (str): Phone number of the customer
+
+        Returns:
+            list[tuple[int, Booking]]: Row numbers and bookings. Bookings
+            in the write-behind queue have no row yet and are left out,
+            they can be found once they are written.
+        """
+        self.load_stale()
+        bookings = self.bookings.find(name, phone_number)
+        if self.queue is not None and len(self.queue):
+            # Queued bookings are kept at the end of the index
+            last_row = len(self.bookings.get()) - len(self.queue) + 1
+            bookings = [
+                (row_number, booking)
+                for row_number, booking in bookings
+                if row_number <= last_row
+            ]
+        return bookings
+
+    def delete_bookings(self, bookings: list[tuple[int, Booking]]) -> None:
+        """Delete bookings from the booking_data worksheet with one read
+        to check the rows and one batch update. The deletions are sent
+        from the bottom, so the next row numbers are not shifted.
+
+        The check and the update are separate requests, and the Sheets
+        API can't make the deletion conditional on the row values. A row
+        which another session inserts, deletes or edits between them is
+        not detected, so the window is kept as short as possible: nothing
+        is done between the two requests.
+
+        Args:
+            bookings (list[tuple[int, Booking]]): Row numbers and bookings
+
+        Raises:
+            ValueError: If a row does not contain its booking anymore,
+            e.g. it was changed by another session. Nothing is deleted
+            in this case.
+        """
+        rows = dict(bookings)
+        if not rows:
+            return
+
+        with self._write_lock:
+            self.delete_rows(rows)
+
+    def delete_rows(self, rows: dict[int, Booking]) -> None:
+        """Check and delete the rows of delete_bookings
+
+        Args:
+            rows (dict[int, Booking]): Bookings by row number
+        """
+        row_numbers = sorted(rows, reverse=True)
+        self.check_rows(rows)
+
+        requests = []
+        for first_row, last_row in row_ranges(row_numbers):
+            requests.append(
+                {
+                    "deleteDimension": {
+                        "range": {
+                            "sheetId": self.booking_data.id,
+                            "dimension": "ROWS",
+                            "startIndex": first_row - 1,
+                            "endIndex": last_row,
+                        }
+                    }
+                }
+            )
+        self.sheet.batch_update({"requests": requests})
+
+        for row_number in row_numbers:
+            self.bookings.remove(row_number, rows[row_number])
+
+    def check_rows(self, rows: dict[int, Booking]) -> None:
+        """Check that the worksheet rows still contain the bookings.
+        The result is only valid until the next change of the worksheet,
+        see delete_bookings.
+
+        Args:
+            rows (dict[int, Booking]): Bookings by row number
+
+        Raises:
+            ValueError: If a row contains another booking
+        """
+        ranges = ["1:1"] + [f"{row}:{row}" for row in rows]
+        header, *values = self.booking_data.batch_get(ranges)
+        keys = header[0] if header else []
+
+        for (row_number, booking), row_values in zip(rows.items(), values):
+            row = row_values[0] if row_values else []
+            record = dict(zip(keys, row + [""] * (len(keys) - len(row))))
+            try:
+                current = Booking.from_record(record)
+            except (KeyError, ValueError):
+                current = None
+            if current != booking:
+                self.bookings.invalidate()
+                message = (
+                    f"The booking in row {row_number} has been changed. "
+                    f"Please look for your bookings again."
+                )
+                raise ValueError(message)
@@ -0,0 +1,395 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Hashable
+
+import gspread
+from google.oauth2.service_account import Credentials
+from gspread import Spreadsheet, Worksheet
+from gspread.exceptions import APIError
+
+SCOPES = (
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive.file",
+    "https://www.googleapis.com/auth/drive",
+)
+CREDENTIALS_PATH = "creds.json"
+# Default Google Sheets API quota per minute per user
+READ_QUOTA = 60
+WRITE_QUOTA = 60
+MAX_RETRIES = 5
+BASE_DELAY = 1.0
+MAX_DELAY = 32.0
+# Too many requests and server errors which are worth another attempt
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class TokenBucket:
+    """Rate limiter which allows bursts up to the capacity and refills
+    the tokens at a constant rate
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """
+        Args:
+            rate (float): Tokens added per second
+            capacity (float): Maximum number of tokens
+            clock (Callable[[], float], optional): Source of the time.
+            sleep (Callable[[float], None], optional): Function used
+            to wait for a token.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = capacity
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take a token, waiting until one is available
+
+        Returns:
+            float: Number of seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated) * self.rate,
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            self.sleep(delay)
+            waited += delay
+
+
+class SingleFlight:
+    """Run only one call for each key at a time. Callers which ask for
+    a key while its call is in flight wait for it and share the result.
+    """
+
+    class Call:
+        __slots__ = ("done", "result", "error")
+
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: dict[Hashable, SingleFlight.Call] = {}
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> tuple[Any, bool]:
+        """Call the function or join the call in flight for the key
+
+        Args:
+            key (Hashable): Key of identical calls
+            func (Callable[[], Any]): The function
+
+        Returns:
+            tuple[Any, bool]: The result and whether it was shared
+            with another caller
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = self.Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class SheetsClient:
+    """Quota-aware way to call the Sheets API. Calls are rate limited
+    with a token bucket for reads and one for writes, rejected calls are
+    retried with exponential backoff and jitter, and identical reads
+    in flight are coalesced.
+
+    Writes are retried only on 429, because a write which failed with
+    a server error may have been applied.
+    """
+
+    def __init__(
+        self,
+        read_quota: int = READ_QUOTA,
+        write_quota: int = WRITE_QUOTA,
+        max_retries: int = MAX_RETRIES,
+        base_delay: float = BASE_DELAY,
+        max_delay: float = MAX_DELAY,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """
+        Args:
+            read_quota (int, optional): Read requests per minute.
+            Defaults to 60.
+            write_quota (int, optional): Write requests per minute.
+            Defaults to 60.
+            max_retries (int, optional): Retries of a failed request.
+            Defaults to 5.
+            base_delay (float, optional): Maximum delay before the first
+            retry in seconds, it is doubled for every next retry.
+            Defaults to 1.
+            max_delay (float, optional): Upper limit of the delay
+            in seconds. Defaults to 32.
+            clock (Callable[[], float], optional): Source of the time.
+            sleep (Callable[[float], None], optional): Function used
+            to wait.
+        """
+        self.buckets = {
+            "read": TokenBucket(read_quota / 60, read_quota, clock, sleep),
+            "write": TokenBucket(write_quota / 60, write_quota, clock, sleep),
+        }
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.single_flight = SingleFlight()
+        self.counters = Counter()
+        self.counters_lock = threading.Lock()
+
+    def count(self, name: str) -> None:
+        with self.counters_lock:
+            self.counters[name] += 1
+
+    def stats(self) -> dict[str, int]:
+        """Get the counters of requests, throttled, retried, coalesced
+        and failed calls
+        """
+        with self.counters_lock:
+            return dict(self.counters)
+
+    def read(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        """Call a read method. Concurrent calls with the same key share
+        one request and its result, which must not be modified.
+
+        Args:
+            key (Hashable): Key of identical reads
+            func (Callable): The gspread method
+
+        Returns:
+            Any: The result of the method
+        """
+        result, shared = self.single_flight.do(
+            key, lambda: self.call("read", func, *args, **kwargs)
+        )
+        if shared:
+            self.count("coalesced")
+        return result
+
+    def write(self, func: Callable, *args, **kwargs) -> Any:
+        """Call a write method
+
+        Args:
+            func (Callable): The gspread method
+
+        Returns:
+            Any: The result of the method
+        """
+        return self.call("write", func, *args, **kwargs)
+
+    def call(self, kind: str, func: Callable, *args, **kwargs) -> Any:
+        """Call a method within the quota and retry it when it fails
+        with a temporary error
+
+        Args:
+            kind (str): Kind of the request, "read" or "write"
+            func (Callable): The gspread method
+
+        Raises:
+            APIError: If the request fails after all retries or
+            with an error which is not temporary
+
+        Returns:
+            Any: The result of the method
+        """
+        attempt = 0
+        while True:
+            if self.buckets[kind].acquire():
+                self.count("throttled")
+            self.count("requests")
+            try:
+                return func(*args, **kwargs)
+            except APIError as error:
+                status = error.response.status_code
+                retryable = status in RETRY_STATUSES and (
+                    kind == "read" or status == 429
+                )
+                if not retryable or attempt >= self.max_retries:
+                    self.count("failed")
+                    raise
+
+            self.count("retried")
+            # Full jitter spreads retries of concurrent sessions
+            limit = min(self.max_delay, self.base_delay * 2**attempt)
+            self.sleep(random.uniform(0, limit))
+            attempt += 1
+
+
+class QuotaWorksheet:
+    """Worksheet wrapper which calls the API through a SheetsClient.
+    Other attributes are taken from the wrapped worksheet.
+    """
+
+    READS = frozenset(
+        {
+            "get_all_records",
+            "get_all_values",
+            "row_values",
+            "col_values",
+            "get",
+            "batch_get",
+        }
+    )
+    WRITES = frozenset(
+        {
+            "append_row",
+            "append_rows",
+            "delete_rows",
+            "update",
+            "batch_update",
+        }
+    )
+
+    def __init__(self, worksheet: Worksheet, client: SheetsClient):
+        self.worksheet = worksheet
+        self.client = client
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.worksheet, name)
+        if name in self.READS:
+
+            def read(*args, **kwargs):
+                key = (self.worksheet.id, name, repr((args, kwargs)))
+                return self.client.read(key, attr, *args, **kwargs)
+
+            return read
+        if name in self.WRITES:
+            return lambda *args, **kwargs: self.client.write(
+                attr, *args, **kwargs
+            )
+        return attr
+
+    def __repr__(self) -> str:
+        return f"<QuotaWorksheet {self.worksheet!r}>"
+
+
+class QuotaSpreadsheet:
+    """Spreadsheet wrapper which calls the API through a SheetsClient
+    and wraps its worksheets. Use it in place of the spreadsheet:
+
+        SpaSheet(QuotaSpreadsheet(spreadsheet))
+    """
+
+    def __init__(
+        self, spreadsheet: Spreadsheet, client: SheetsClient | None = None
+    ):
+        self.spreadsheet = spreadsheet
+        self.client = client or SheetsClient()
+
+    def __getattr__(self, name: str):
+        return getattr(self.spreadsheet, name)
+
+    def worksheets(self) -> list[QuotaWorksheet]:
+        worksheets = self.client.read(
+            "worksheets", self.spreadsheet.worksheets
+        )
+        return [
+            QuotaWorksheet(worksheet, self.client) for worksheet in worksheets
+        ]
+
+    def worksheet(self, title: str) -> QuotaWorksheet:
+        worksheet = self.client.read(
+            ("worksheet", title), self.spreadsheet.worksheet, title
+        )
+        return QuotaWorksheet(worksheet, self.client)
+
+    def values_batch_get(self, ranges: list[str], params=None) -> dict:
+        return self.client.read(
+            ("values_batch_get", repr((ranges, params))),
+            self.spreadsheet.values_batch_get,
+            ranges,
+            params,
+        )
+
+    def batch_update(self, body: dict) -> dict:
+        return self.client.write(self.spreadsheet.batch_update, body)
+
+
+class SheetConnection:
+    """Connection to a spreadsheet which authorizes and opens it on first
+    use. Creating it has no side effects, and the opened spreadsheet is
+    reused by everything which asks for it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        credentials_path: str = CREDENTIALS_PATH,
+        scopes: tuple[str, ...] = SCOPES,
+        client: SheetsClient | None = None,
+    ):
+        """
+        Args:
+            name (str): Title of the spreadsheet
+            credentials_path (str, optional): Service account key file.
+            Defaults to "creds.json".
+            scopes (tuple[str, ...], optional): OAuth scopes.
+            client (SheetsClient | None, optional): Client for the API
+            calls. Defaults to None, which creates one.
+        """
+        self.name = name
+        self.credentials_path = credentials_path
+        self.scopes = scopes
+        self.client = client or SheetsClient()
+        self.spreadsheet: QuotaSpreadsheet | None = None
+        self.lock = threading.Lock()
+
+    def open(self) -> QuotaSpreadsheet:
+        """Get the spreadsheet, opening it if needed
+
+        Returns:
+            QuotaSpreadsheet: The spreadsheet wrapped in the quota-aware
+            client
+        """
+        with self.lock:
+            if self.spreadsheet is None:
+                credentials = Credentials.from_service_account_file(
+                    self.credentials_path, scopes=self.scopes
+                )
+                gspread_client = gspread.authorize(credentials)
+                self.spreadsheet = QuotaSpreadsheet(
+                    gspread_client.open(self.name), self.client
+                )
+            return self.spreadsheet
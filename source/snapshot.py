@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import os
+import pickle
+import threading
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from source.sheet_manager import SpaSheet
+
+SNAPSHOT_PATH = "spa_snapshot.pickle"
+# Increase when the pickled classes change, old snapshots are ignored
+SCHEMA_VERSION = 4
+
+
+class Snapshot:
+    """Local copy of the service catalog and the booking index of
+    a SpaSheet. A new session loads it instead of downloading the
+    worksheets and revalidates it in the background.
+
+    The file is a pickle written by this application, don't load
+    snapshots from untrusted sources.
+    """
+
+    def __init__(self, spreadsheet: str, path: str = SNAPSHOT_PATH):
+        """
+        Args:
+            spreadsheet (str): Title of the spreadsheet. The snapshot
+            is kept for it, so it is loaded without opening the
+            spreadsheet.
+            path (str, optional): Path of the snapshot file.
+            Defaults to "spa_snapshot.pickle".
+        """
+        self.spreadsheet = spreadsheet
+        self.path = path
+
+    def load(self, sheet: SpaSheet) -> bool:
+        """Fill the caches of the sheet from the snapshot file
+
+        Args:
+            sheet (SpaSheet): The sheet
+
+        Returns:
+            bool: Whether the snapshot was loaded. A missing, damaged
+            or outdated snapshot is ignored. The time the file was kept
+            is added to the age of the data.
+        """
+        try:
+            with open(self.path, "rb") as file:
+                payload = pickle.load(file)
+        except Exception:
+            # Besides a missing file, a damaged pickle can raise almost
+            # anything and a renamed class raises ImportError
+            return False
+
+        if (
+            not isinstance(payload, dict)
+            or payload.get("version") != SCHEMA_VERSION
+            or payload.get("spreadsheet") != self.spreadsheet
+        ):
+            return False
+
+        stored = max(0.0, time.time() - payload["saved_at"])
+        for cache, name in (
+            (sheet.catalog, "catalog"),
+            (sheet.bookings, "bookings"),
+            (sheet.booking_header, "booking_header"),
+        ):
+            state = payload[name]
+            cache.restore({**state, "age": state.get("age", 0.0) + stored})
+        return True
+
+    def save(self, sheet: SpaSheet) -> bool:
+        """Write the loaded caches of the sheet to the snapshot file.
+        The file is replaced at once, so readers never see a partial one.
+
+        Args:
+            sheet (SpaSheet): The sheet
+
+        Returns:
+            bool: Whether the snapshot was written
+        """
+        if sheet.catalog.is_stale and sheet.bookings.is_stale:
+            return False
+
+        payload = {
+            "version": SCHEMA_VERSION,
+            "spreadsheet": self.spreadsheet,
+            "saved_at": time.time(),
+            "catalog": sheet.catalog.dump(),
+            "bookings": sheet.bookings.dump(),
+            "booking_header": sheet.booking_header.dump(),
+        }
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "wb") as file:
+                pickle.dump(payload, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.path)
+        except (OSError, RuntimeError, pickle.PicklingError):
+            # The snapshot is only an optimization, e.g. the disk may
+            # be full
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+        return True
+
+    def revalidate(self, sheet: SpaSheet) -> threading.Thread:
+        """Refresh the caches of the sheet in a background thread and
+        save the fresh snapshot
+
+        Args:
+            sheet (SpaSheet): The sheet
+
+        Returns:
+            threading.Thread: The started thread
+        """
+
+        def run():
+            from gspread.exceptions import GSpreadException
+            from requests import RequestException
+
+            try:
+                sheet.reload()
+            except (GSpreadException, RequestException):
+                # Keep the snapshot data until the caches expire
+                return
+            self.save(sheet)
+
+        thread = threading.Thread(
+            target=run, name="snapshot-revalidation", daemon=True
+        )
+        thread.start()
+        return thread
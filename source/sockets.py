@@ -0,0 +1,6 @@
+# Defaults of the Unix socket servers, kept apart from the servers so
+# the command line is parsed without importing asyncio and pickle
+
+SOCKET_PATH = "spa_sessions.sock"
+MAX_SESSIONS = 50
+CACHE_SOCKET = "spa_cache.sock"
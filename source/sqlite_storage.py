@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from datetime import date
+from typing import Iterable
+
+from source.availability import AvailabilityEngine
+from source.sheet_manager import (
+    CATALOG_TTL,
+    EMPTY_BOOKING,
+    Booking,
+    ServiceCatalog,
+    ServiceIndex,
+    normalize_phone_number,
+    parse_booking,
+)
+from source.storage import StorageBackend
+
+DATABASE_PATH = "spa_booking.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS services (
+    name TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    duration REAL NOT NULL,
+    price REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bookings (
+    id INTEGER PRIMARY KEY,
+    service TEXT NOT NULL,
+    additional_service TEXT NOT NULL DEFAULT '',
+    name TEXT NOT NULL,
+    phone_number TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    start_minute INTEGER NOT NULL,
+    end_minute INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bookings_service_day
+    ON bookings (service, day, start_minute);
+CREATE INDEX IF NOT EXISTS bookings_phone_number
+    ON bookings (phone_number);
+"""
+
+BOOKING_COLUMNS = (
+    "service",
+    "additional_service",
+    "name",
+    "phone_number",
+    "day",
+    "start_minute",
+    "end_minute",
+)
+
+
+def booking_rows(bookings: Iterable[Booking]) -> list[tuple]:
+    """Convert bookings to rows of the bookings table
+
+    Args:
+        bookings (Iterable[Booking]): The bookings
+
+    Returns:
+        list[tuple]: Values in the order of BOOKING_COLUMNS
+    """
+    return [
+        (
+            booking.service,
+            booking.additional_service,
+            booking.name,
+            booking.phone_number,
+            booking.day,
+            booking.start,
+            booking.end,
+        )
+        for booking in bookings
+    ]
+
+
+class SQLiteStorage(StorageBackend):
+    """Spa data storage in a local SQLite database with indexes
+    on (service, day) and phone number. The connection is shared by
+    the threads of the process and used by one of them at a time.
+    """
+
+    def __init__(
+        self,
+        path: str = DATABASE_PATH,
+        catalog_ttl: float = CATALOG_TTL,
+        availability: AvailabilityEngine | None = None,
+    ):
+        super().__init__(availability)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock:
+            self.connection.executescript(SCHEMA)
+        self.catalog = ServiceCatalog(self.load_services, catalog_ttl)
+
+    def load_services(self) -> list[dict]:
+        """Read all services in the spa_info worksheet record format
+
+        Returns:
+            list[dict]: List of service records
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT name, type, description, duration, price"
+                " FROM services ORDER BY rowid"
+            )
+            return [dict(row) for row in rows]
+
+    def service_index(self) -> ServiceIndex:
+        return self.catalog.get()
+
+    def booked_intervals(
+        self, service: str, date_obj: date
+    ) -> list[tuple[int, int]]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT start_minute, end_minute FROM bookings"
+                " WHERE service = ? AND day = ?"
+                " ORDER BY start_minute, end_minute",
+                (service, date_obj.toordinal()),
+            )
+            return [tuple(row) for row in rows]
+
+    def booked_columns(
+        self, service: str, first_day: date, days: int
+    ) -> tuple[list[int], list[int], list[int]]:
+        first = first_day.toordinal()
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT day, start_minute, end_minute FROM bookings"
+                " WHERE service = ? AND day BETWEEN ? AND ?",
+                (service, first, first + days - 1),
+            ).fetchall()
+        return (
+            [day - first for day, _, _ in rows],
+            [start for _, start, _ in rows],
+            [end for _, _, end in rows],
+        )
+
+    def find_bookings(
+        self, name: str, phone_number: str
+    ) -> list[tuple[int, Booking]]:
+        """Find bookings of a customer
+
+        Args:
+            name (str): Name of the customer
+            phone_number (str): Phone number of the customer
+
+        Returns:
+            list[tuple[int, Booking]]: Booking ids and bookings
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT id, {', '.join(BOOKING_COLUMNS)} FROM bookings"
+                " WHERE phone_number = ? AND name = ? ORDER BY id",
+                (normalize_phone_number(phone_number), name),
+            )
+            return [(row[0], Booking(*row[1:])) for row in rows]
+
+    def save_booking(self, info: dict) -> None:
+        """Insert a booking into the database
+
+        Args:
+            info (dict): Booking information
+        """
+        self.insert_bookings([info])
+
+    def delete_bookings(self, bookings: list[tuple[int, Booking]]) -> None:
+        """Delete bookings from the database in one transaction
+
+        Args:
+            bookings (list[tuple[int, Booking]]): Booking ids and bookings
+        """
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "DELETE FROM bookings WHERE id = ?",
+                [(booking_id,) for booking_id, _ in bookings],
+            )
+
+    def insert_bookings(self, records: list[dict]) -> None:
+        """Insert bookings in the booking_data worksheet record format
+
+        Args:
+            records (list[dict]): Booking records
+        """
+        rows = booking_rows(Booking.from_record(record) for record in records)
+        with self.lock, self.connection:
+            self.execute_insert_bookings(rows)
+
+    def execute_insert_bookings(self, rows: list[tuple]) -> None:
+        """Insert rows made by booking_rows. The caller holds the lock
+        and the transaction.
+        """
+        self.connection.executemany(
+            f"INSERT INTO bookings ({', '.join(BOOKING_COLUMNS)})"
+            f" VALUES ({', '.join('?' * len(BOOKING_COLUMNS))})",
+            rows,
+        )
+
+    def import_records(
+        self, services: list[dict], bookings: list[dict]
+    ) -> None:
+        """Replace all data with records from the worksheets, e.g. to copy
+        the Google spreadsheet into the database. Malformed booking rows
+        are skipped. The data is replaced in one transaction, so it is
+        kept if the import fails.
+
+        Args:
+            services (list[dict]): Records of the spa_info worksheet
+            bookings (list[dict]): Records of the booking_data worksheet
+        """
+        # The first row of the worksheet is the header
+        parsed = (
+            parse_booking(record, row_number)
+            for row_number, record in enumerate(bookings, start=2)
+        )
+        rows = booking_rows(
+            booking for booking in parsed if booking is not EMPTY_BOOKING
+        )
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM services")
+            self.connection.execute("DELETE FROM bookings")
+            self.connection.executemany(
+                "INSERT INTO services"
+                " (name, type, description, duration, price)"
+                " VALUES (:name, :type, :description, :duration, :price)",
+                services,
+            )
+            self.execute_insert_bookings(rows)
+        self.catalog.invalidate()
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import builtins
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+# Modules which are not needed for the main menu, imported in the
+# background while the user reads it
+WARM_UP_MODULES = ("phonenumbers", "gspread", "source.sheets_client")
+# Imports faster than this or nested deeper are left out of the report
+REPORT_THRESHOLD = 0.001
+REPORT_DEPTH = 2
+
+
+class StartupProfile:
+    """Timings of the startup phases and of the modules imported
+    during them. A disabled profile only runs the phases.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.phases: list[tuple[str, float]] = []
+        # Nesting depth, name, thread and seconds of the imports
+        # in the order they started
+        self.imports: list[list] = []
+        self.local = threading.local()
+        self.original_import = None
+
+    def install(self) -> None:
+        """Start timing the imports"""
+        if not self.enabled or self.original_import is not None:
+            return
+        self.original_import = builtins.__import__
+        builtins.__import__ = self.timed_import
+
+    def uninstall(self) -> None:
+        """Stop timing the imports"""
+        if self.original_import is not None:
+            builtins.__import__ = self.original_import
+            self.original_import = None
+
+    def timed_import(
+        self, name, globals=None, locals=None, fromlist=(), level=0
+    ):
+        """Replacement of the built-in __import__ which times imports
+        of modules which are not loaded yet. The time of an import
+        includes the imports nested in it.
+        """
+        original_import = self.original_import or builtins.__import__
+        if level or name in sys.modules:
+            # Loaded modules and relative imports are not timed
+            return original_import(name, globals, locals, fromlist, level)
+
+        depth = getattr(self.local, "depth", 0)
+        entry = [depth, name, threading.current_thread().name, 0.0]
+        self.imports.append(entry)
+        self.local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            return original_import(name, globals, locals, fromlist, level)
+        finally:
+            entry[3] = time.perf_counter() - start
+            self.local.depth = depth
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a startup phase
+
+        Args:
+            name (str): Name of the phase shown in the report
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def report(self) -> list[str]:
+        """Build the lines of the timing breakdown. Imports are listed
+        in the order they started and indented under the import which
+        caused them, background imports are marked with their thread.
+
+        Returns:
+            list[str]: The report lines
+        """
+        lines = ["Startup phases:"]
+        for name, seconds in self.phases:
+            lines.append(f"  {seconds * 1000:8.1f} ms  {name}")
+        total = time.perf_counter() - self.started
+        lines.append(f"  {total * 1000:8.1f} ms  total")
+
+        lines.append("Imports:")
+        for depth, name, thread, seconds in list(self.imports):
+            if depth > REPORT_DEPTH or seconds < REPORT_THRESHOLD:
+                continue
+            where = "" if thread == "MainThread" else f" ({thread})"
+            indent = "  " * depth
+            lines.append(f"  {seconds * 1000:8.1f} ms  {indent}{name}{where}")
+        return lines
+
+
+def warm_up(modules: tuple[str, ...] = WARM_UP_MODULES) -> threading.Thread:
+    """Import modules in a background thread, so the first code which
+    needs them doesn't wait for the import
+
+    Args:
+        modules (tuple[str, ...], optional): Names of the modules
+
+    Returns:
+        threading.Thread: The started thread
+    """
+
+    def run():
+        for module in modules:
+            try:
+                __import__(module)
+            except ImportError:
+                # The module is imported again where it is used
+                # and the error is raised there
+                pass
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,350 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING, Literal, Sequence
+
+from source.availability import AvailabilityEngine
+
+if TYPE_CHECKING:
+    from source.availability import SlotMask
+    from source.sheet_manager import Booking, Service, ServiceIndex
+
+
+class StorageBackend(ABC):
+    """Base class for the spa data storage. Subclasses implement reading
+    services and bookings and writing bookings, this class builds
+    the service lookups and availability on top of them.
+    """
+
+    def __init__(self, availability: AvailabilityEngine | None = None):
+        self.availability = availability or AvailabilityEngine()
+
+    @abstractmethod
+    def service_index(self) -> ServiceIndex:
+        """Get all services indexed by name and type
+
+        Returns:
+            ServiceIndex: The index of services
+        """
+
+    @abstractmethod
+    def booked_intervals(
+        self, service: str, date_obj: date
+    ) -> list[tuple[int, int]]:
+        """Get sorted booked intervals for the service on the date
+
+        Args:
+            service (str): Service name
+            date_obj (date): The date
+
+        Returns:
+            list[tuple[int, int]]: Sorted (start, end) intervals in minutes
+        """
+
+    def booked_columns(
+        self, service: str, first_day: date, days: int
+    ) -> tuple[Sequence[int], Sequence[int], Sequence[int]]:
+        """Get the bookings of a service in a range of days as columns
+        for AvailabilityEngine.range_slot_starts. Backends which keep the
+        bookings in columns or read a range at once should override it.
+
+        Args:
+            service (str): Service name
+            first_day (date): The first date of the range
+            days (int): Number of days in the range
+
+        Returns:
+            tuple[Sequence[int], Sequence[int], Sequence[int]]: Days
+            counted from the first day, start and end minutes
+            of the bookings
+        """
+        booked_days, starts, ends = [], [], []
+        for day in range(days):
+            date_obj = first_day + timedelta(days=day)
+            for start, end in self.booked_intervals(service, date_obj):
+                booked_days.append(day)
+                starts.append(start)
+                ends.append(end)
+        return booked_days, starts, ends
+
+    @abstractmethod
+    def find_bookings(
+        self, name: str, phone_number: str
+    ) -> list[tuple[int, Booking]]:
+        """Find bookings of a customer
+
+        Args:
+            name (str): Name of the customer
+            phone_number (str): Phone number of the customer
+
+        Returns:
+            list[tuple[int, Booking]]: Row ids and bookings
+        """
+
+    @abstractmethod
+    def save_booking(self, info: dict) -> None:
+        """Save a new booking
+
+        Args:
+            info (dict): Booking information
+        """
+
+    @abstractmethod
+    def delete_bookings(self, bookings: list[tuple[int, Booking]]) -> None:
+        """Delete bookings found with find_bookings
+
+        Args:
+            bookings (list[tuple[int, Booking]]): Row ids and bookings
+
+        Raises:
+            ValueError: If the bookings were changed since they were found
+        """
+
+    def refresh_bookings(self) -> None:
+        """Reload the bookings regardless of their age, e.g. after their
+        row ids failed the check of delete_bookings. Backends which read
+        the bookings on every call don't need to override it.
+        """
+
+    def get_services(
+        self, service_type: Literal[None, "main", "sub"] = None
+    ) -> list[Service]:
+        """Get services based on the service_type provided.
+        If the service_type is None, it will return all services.
+        If the service_type is 'main' or 'sub' it will return
+        services with respective type.
+
+        Args:
+            service_type (Literal[None, "main", "sub"], optional): type of
+            service. Defaults to None.
+
+        Returns:
+            list[Service]: List of services
+        """
+
+        index = self.service_index()
+
+        if service_type:
+            result = index.by_type.get(service_type, [])
+        else:
+            result = index.services
+
+        return list(result)
+
+    def get_service(self, service: str) -> Service | None:
+        """Get a service by its name
+
+        Args:
+            service (str): Service name
+
+        Returns:
+            Service | None: The service or None if it is not found
+        """
+        return self.service_index().by_name.get(service)
+
+    def service_duration(self, service: str) -> int:
+        """Get the duration of a service in minutes
+
+        Args:
+            service (str): Service name
+
+        Raises:
+            ValueError: If the service is not found
+
+        Returns:
+            int: The duration in minutes
+        """
+        service_obj = self.get_service(service)
+        if service_obj is None:
+            message = f"Service not found: {service}."
+            raise ValueError(message)
+        return round(service_obj.duration * 60)
+
+    def get_service_info(self, service: str, field_name: str) -> str | float:
+        """Get the information for a particular service field
+
+        Args:
+            service (str): Service name
+            field_name (str): Service field to get information from
+
+        Returns:
+            str | float: The service information which is contained
+            in the field_name
+        """
+        service_obj = self.get_service(service)
+
+        if service_obj is None:
+            return "Service not found"
+
+        return service_obj[field_name]
+
+    def get_available_times_for_date_and_service(
+        self, date_str: str, service: str
+    ) -> list[list[datetime]]:
+        """Calculates available ranges for booking and returns them.
+
+        Args:
+            date_str (str): The date to check for available time
+            service (str): The service to check for available time
+
+        Raises:
+            ValueError: If the service is not found
+
+        Returns:
+            list[list[datetime]: List of available time
+        """
+        date_obj = date.fromisoformat(date_str)
+        duration = self.service_duration(service)
+        booked = self.booked_intervals(service, date_obj)
+
+        return self.availability.available_times(date_obj, duration, booked)
+
+    def get_slot_mask_for_date_and_service(
+        self, date_str: str, service: str
+    ) -> SlotMask:
+        """Calculates available start times for booking as a SlotMask,
+        e.g. to validate the time chosen by the user.
+
+        Args:
+            date_str (str): The date to check for available time
+            service (str): The service to check for available time
+
+        Raises:
+            ValueError: If the service is not found
+
+        Returns:
+            SlotMask: The mask of the available start times
+        """
+        date_obj = date.fromisoformat(date_str)
+        duration = self.service_duration(service)
+        booked = self.booked_intervals(service, date_obj)
+
+        return self.availability.slot_mask(date_obj, duration, booked)
+
+    def get_availability(
+        self, service: str, start_date: str, end_date: str
+    ) -> dict[str, list[list[datetime]]]:
+        """Calculates available ranges for booking for each date
+        in the range. The bookings of each date are taken from
+        booked_intervals, SpaSheet answers them from its cached index.
+
+        Args:
+            service (str): The service to check for available time
+            start_date (str): The first date of the range
+            end_date (str): The last date of the range inclusive
+
+        Raises:
+            ValueError: If the end date is before the start date
+            or the service is not found
+
+        Returns:
+            dict[str, list[list[datetime]]]: Available times
+            for each date in format YYYY-MM-DD
+        """
+        first_day = date.fromisoformat(start_date).toordinal()
+        last_day = date.fromisoformat(end_date).toordinal()
+        if last_day < first_day:
+            message = "The end date must not be before the start date."
+            raise ValueError(message)
+
+        duration = self.service_duration(service)
+
+        availability = {}
+        for ordinal in range(first_day, last_day + 1):
+            date_obj = date.fromordinal(ordinal)
+            booked = self.booked_intervals(service, date_obj)
+            availability[date_obj.isoformat()] = (
+                self.availability.available_times(date_obj, duration, booked)
+            )
+        return availability
+
+    def get_availability_for_date(
+        self, date_str: str, services: list[str] | None = None
+    ) -> dict[str, list[list[datetime]]]:
+        """Calculates available ranges for booking of several services
+        on the date. The bookings of each service are taken from
+        booked_intervals, SpaSheet answers them from its cached index.
+
+        Args:
+            date_str (str): The date to check for available time
+            services (list[str] | None, optional): Names of the services
+            to check. Defaults to all main services, because additional
+            services are booked together with a main one.
+
+        Raises:
+            ValueError: If a service is not found
+
+        Returns:
+            dict[str, list[list[datetime]]]: Available times
+            for each service
+        """
+        date_obj = date.fromisoformat(date_str)
+        if services is None:
+            services = [service.name for service in self.get_services("main")]
+
+        index = self.service_index()
+        unknown = [name for name in services if name not in index.by_name]
+        if unknown:
+            message = f"Service not found: {', '.join(unknown)}."
+            raise ValueError(message)
+
+        availability = {}
+        for service in services:
+            duration = round(index.by_name[service].duration * 60)
+            booked = self.booked_intervals(service, date_obj)
+            availability[service] = self.availability.available_times(
+                date_obj, duration, booked
+            )
+        return availability
+
+    def get_availability_bulk(
+        self, services: list[str], start_date: str, end_date: str
+    ) -> dict[str, dict[str, list[list[datetime]]]]:
+        """Calculates available ranges for booking of several services
+        for each date in the range. The bookings of each service are
+        read once as columns with booked_columns and all days are
+        calculated together, which BitmapAvailability vectorizes.
+
+        Args:
+            services (list[str]): Names of the services to check
+            start_date (str): The first date of the range
+            end_date (str): The last date of the range inclusive
+
+        Raises:
+            ValueError: If the end date is before the start date
+            or a service is not found
+
+        Returns:
+            dict[str, dict[str, list[list[datetime]]]]: Available times
+            for each service and date in format YYYY-MM-DD
+        """
+        first_day = date.fromisoformat(start_date)
+        days = date.fromisoformat(end_date).toordinal() - first_day.toordinal()
+        if days < 0:
+            message = "The end date must not be before the start date."
+            raise ValueError(message)
+        days += 1
+
+        index = self.service_index()
+        unknown = [name for name in services if name not in index.by_name]
+        if unknown:
+            message = f"Service not found: {', '.join(unknown)}."
+            raise ValueError(message)
+
+        availability = {}
+        for service in services:
+            duration = round(index.by_name[service].duration * 60)
+            slot_starts = self.availability.range_slot_starts(
+                first_day,
+                days,
+                duration,
+                *self.booked_columns(service, first_day, days),
+            )
+            availability[service] = {
+                date_obj.isoformat(): self.availability.time_ranges(
+                    date_obj, duration, starts
+                )
+                for date_obj, starts in slot_starts.items()
+            }
+        return availability
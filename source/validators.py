@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from datetime import date, datetime, time
 
-import phonenumbers
+from source.availability import SlotMask
 
 
 def validate_integer_option(
@@ -61,24 +61,27 @@ def validate_yes_no(option: str):
         raise ValueError(message)
 
 
-def validate_time(option: str, time_ranges: list[list[datetime]]) -> None:
-    """Check if the option is a time in format HH:MM and  in time_ranges list
+def validate_time(
+    option: str, time_ranges: SlotMask | list[list[datetime]]
+) -> None:
+    """Check if the option is a time in format HH:MM and if it is one
+    of the available start times
 
     Args:
         option (str): The option to check
-        time_ranges (list[list[datetime]]): List of available times
+        time_ranges (SlotMask | list[list[datetime]]): Available start
+        times or list of available times
 
     Raises:
-        ValueError: If the option is not a number between 0
-        and the length of time_ranges list
+        ValueError: If the option is not an available start time
     """
 
     time_obj = time.fromisoformat(option)
 
-    for time_range in time_ranges:
-        if time_range[0].time() <= time_obj <= time_range[-1].time():
-            break
-    else:
+    if not isinstance(time_ranges, SlotMask):
+        time_ranges = SlotMask.from_time_ranges(time_ranges)
+
+    if time_obj.hour * 60 + time_obj.minute not in time_ranges:
         message = "Your time is not in the available time ranges."
         raise ValueError(message)
 
@@ -110,6 +113,9 @@ def validate_phone_number(phone_number: str) -> None:
     Raises:
         ValueError: If the phone number is not valid
     """
+    # The metadata of phonenumbers is large, import it on first use
+    import phonenumbers
+
     try:
         phone_obj = phonenumbers.parse(phone_number, None)
     except phonenumbers.phonenumberutil.NumberParseException as ex:
@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import glob
+import json
+import logging
+import os
+import threading
+from typing import IO, TYPE_CHECKING
+from uuid import uuid4
+
+from source.sheet_manager import Booking, parse_booking
+
+try:
+    import fcntl
+except ImportError:
+    # Windows, where run.py rejects --write-behind
+    fcntl = None
+
+if TYPE_CHECKING:
+    from source.sheet_manager import SpaSheet
+
+logger = logging.getLogger(__name__)
+
+QUEUE_PATH = "booking_queue.jsonl"
+FLUSH_INTERVAL = 2.0
+BATCH_SIZE = 100
+
+
+def queue_files(path: str) -> list[str]:
+    """Find the queue files of all processes which use the path
+
+    Args:
+        path (str): Path given to BookingQueue
+
+    Returns:
+        list[str]: Paths of the files
+    """
+    stem, suffix = os.path.splitext(path)
+    paths = glob.glob(f"{glob.escape(stem)}.*{glob.escape(suffix)}")
+    if os.path.exists(path):
+        # Left by a version which shared one file between processes
+        paths.append(path)
+    return paths
+
+
+def read_entries(file: IO[str]) -> dict[str, dict]:
+    """Read the bookings of a queue file which are not acknowledged
+
+    Args:
+        file (IO[str]): The open file
+
+    Returns:
+        dict[str, dict]: Records by their ids in queue order
+    """
+    entries = {}
+    for line in file:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            # The last line may be cut if the process was killed
+            continue
+        if "ack" in entry:
+            for entry_id in entry["ack"]:
+                entries.pop(entry_id, None)
+        else:
+            entries[entry["id"]] = entry["record"]
+    return entries
+
+
+class BookingQueue:
+    """Durable queue of bookings waiting to be appended to the
+    booking_data worksheet. Each booking is written to an append-only
+    JSON lines file before put returns, written bookings are recorded
+    with acknowledgement lines.
+
+    Every process has its own file next to the given path, e.g.
+    booking_queue.1f0c9a2b.jsonl, and holds an exclusive lock on it
+    while it runs. Bookings left in the file of a stopped process are
+    taken over by the next process which starts, so every booking is
+    written at least once and by one process only.
+    """
+
+    def __init__(self, path: str = QUEUE_PATH):
+        """
+        Args:
+            path (str, optional): Path the names of the queue files are
+            made from. Defaults to "booking_queue.jsonl".
+        """
+        stem, suffix = os.path.splitext(path)
+        self.base_path = path
+        self.path = f"{stem}.{uuid4().hex[:8]}{suffix}"
+        self.lock = threading.Lock()
+        self.entries: dict[str, dict] = {}
+        # Ids of the bookings taken over from stopped processes, they
+        # may have been written to the worksheet before the stop
+        self.replayed: set[str] = set()
+        self.file = open(self.path, "a", encoding="utf-8")
+        # The lock is released by the system when the process stops
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        self.adopt()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def adopt(self) -> None:
+        """Take over the pending bookings of stopped processes. Files
+        of running processes are locked and skipped.
+        """
+        for path in queue_files(self.base_path):
+            if path == self.path:
+                continue
+            try:
+                file = open(path, encoding="utf-8")
+            except OSError:
+                # Taken over by another process
+                continue
+            with file:
+                try:
+                    fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                if os.fstat(file.fileno()).st_nlink == 0:
+                    # Removed by a process which took it over first
+                    continue
+                entries = read_entries(file)
+                # Written to our file before the other one is removed
+                self.write(
+                    [
+                        {"id": entry_id, "record": record}
+                        for entry_id, record in entries.items()
+                    ]
+                )
+                self.entries.update(entries)
+                self.replayed.update(entries)
+                os.remove(path)
+
+    def write(self, entries: list[dict]) -> None:
+        if not entries:
+            return
+        for entry in entries:
+            self.file.write(json.dumps(entry, default=str) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def clear(self) -> None:
+        """Empty the file when all bookings are written"""
+        self.file.truncate(0)
+        os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        """Release the file. It is removed if all bookings were written,
+        otherwise the next process takes them over.
+        """
+        with self.lock:
+            if self.file.closed:
+                return
+            if not self.entries:
+                os.remove(self.path)
+            self.file.close()
+
+    def put(self, record: dict) -> str:
+        """Add a booking to the queue
+
+        Args:
+            record (dict): Booking information
+
+        Returns:
+            str: Id of the queued booking
+        """
+        entry_id = uuid4().hex
+        with self.lock:
+            self.write([{"id": entry_id, "record": record}])
+            self.entries[entry_id] = dict(record)
+        return entry_id
+
+    def pending(self, limit: int | None = None) -> list[tuple[str, dict]]:
+        """Get the oldest queued bookings
+
+        Args:
+            limit (int | None, optional): Maximum number of bookings.
+            Defaults to all of them.
+
+        Returns:
+            list[tuple[str, dict]]: Ids and records of the bookings
+        """
+        with self.lock:
+            return list(self.entries.items())[:limit]
+
+    def records(self) -> list[dict]:
+        """Get records of all queued bookings in queue order"""
+        with self.lock:
+            return list(self.entries.values())
+
+    def ack(self, entry_ids: list[str]) -> None:
+        """Remove bookings written to the worksheet from the queue
+
+        Args:
+            entry_ids (list[str]): Ids of the written bookings
+        """
+        with self.lock:
+            for entry_id in entry_ids:
+                self.entries.pop(entry_id, None)
+                self.replayed.discard(entry_id)
+            if self.entries:
+                self.write([{"ack": entry_ids}])
+            else:
+                self.clear()
+
+
+class BookingFlusher(threading.Thread):
+    """Background thread which appends queued bookings to the
+    booking_data worksheet in batches
+    """
+
+    def __init__(
+        self,
+        sheet: SpaSheet,
+        interval: float = FLUSH_INTERVAL,
+        batch_size: int = BATCH_SIZE,
+    ):
+        """
+        Args:
+            sheet (SpaSheet): The sheet with a write-behind queue
+            interval (float, optional): Seconds between flushes.
+            Defaults to 2.
+            batch_size (int, optional): Maximum number of rows appended
+            in one request. Defaults to 100.
+        """
+        super().__init__(name="booking-flusher", daemon=True)
+        self.sheet = sheet
+        self.queue = sheet.queue
+        self.interval = interval
+        self.batch_size = batch_size
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        from gspread.exceptions import GSpreadException
+        from requests import RequestException
+
+        while not self.stopped.wait(self.interval):
+            try:
+                self.flush()
+            except (GSpreadException, RequestException):
+                # The bookings stay in the queue until the next flush
+                continue
+            except Exception:
+                # The thread must keep running, new bookings are only
+                # written by it
+                logger.exception("Failed to write the queued bookings")
+
+    def stop(self) -> None:
+        """Stop the thread and flush the remaining bookings"""
+        self.stopped.set()
+        if self.is_alive():
+            self.join()
+        self.flush()
+
+    def flush(self) -> int:
+        """Append all queued bookings to the worksheet
+
+        Returns:
+            int: Number of appended rows
+        """
+        appended = 0
+        while True:
+            batch = self.queue.pending(self.batch_size)
+            if not batch:
+                return appended
+
+            records = self.drop_written(batch)
+            if records:
+                self.sheet.append_bookings(records)
+                appended += len(records)
+            self.queue.ack([entry_id for entry_id, _ in batch])
+
+    def drop_written(self, batch: list[tuple[str, dict]]) -> list[dict]:
+        """Remove replayed bookings which are already in the worksheet
+
+        Args:
+            batch (list[tuple[str, dict]]): Ids and records of bookings
+
+        Returns:
+            list[dict]: Records to append
+        """
+        if not any(entry_id in self.queue.replayed for entry_id, _ in batch):
+            return [record for _, record in batch]
+
+        written = {
+            parse_booking(record, row_number)
+            for row_number, record in enumerate(
+                self.sheet.booking_data.get_all_records(), start=2
+            )
+        }
+        return [
+            record
+            for entry_id, record in batch
+            if entry_id not in self.queue.replayed
+            or Booking.from_record(record) not in written
+        ]
@@ -0,0 +1,126 @@
+from datetime import date, datetime
+from unittest import TestCase
+
+from source.availability import (
+    AvailabilityEngine,
+    SlotMask,
+    minutes_to_datetime,
+    time_to_minutes,
+)
+
+# 2024-02-26 is Monday
+MONDAY = date(2024, 2, 26)
+SUNDAY = date(2024, 3, 3)
+
+
+class TimeConversion(TestCase):
+    def test_time_to_minutes(self):
+        self.assertEqual(time_to_minutes("08:30"), 510)
+
+    def test_minutes_to_datetime(self):
+        result = minutes_to_datetime(MONDAY, 510)
+
+        self.assertEqual(result, datetime(2024, 2, 26, 8, 30))
+
+
+class TestSlotMask(TestCase):
+    def setUp(self):
+        self.slot_mask = SlotMask.from_minutes([480, 495, 1260])
+
+    def test_contains(self):
+        self.assertIn(480, self.slot_mask)
+        self.assertIn(1260, self.slot_mask)
+        self.assertNotIn(510, self.slot_mask)
+        self.assertNotIn(481, self.slot_mask)
+        self.assertNotIn(-15, self.slot_mask)
+
+    def test_iter_and_len(self):
+        self.assertEqual(list(self.slot_mask), [480, 495, 1260])
+        self.assertEqual(len(self.slot_mask), 3)
+
+    def test_not_aligned_start(self):
+        with self.assertRaises(ValueError):
+            SlotMask.from_minutes([490])
+
+    def test_from_time_ranges(self):
+        time_ranges = [
+            [datetime(2024, 2, 26, 8), datetime(2024, 2, 26, 9)],
+            [datetime(2024, 2, 26, 8, 15), datetime(2024, 2, 26, 9, 15)],
+            [datetime(2024, 2, 26, 21), datetime(2024, 2, 26, 22)],
+        ]
+
+        self.assertEqual(
+            SlotMask.from_time_ranges(time_ranges), self.slot_mask
+        )
+
+
+class TestAvailabilityEngine(TestCase):
+    def setUp(self):
+        self.engine = AvailabilityEngine()
+
+    def test_invalid_slot_step(self):
+        with self.assertRaises(ValueError):
+            AvailabilityEngine(slot_step=20)
+
+    def test_invalid_opening_hours(self):
+        with self.assertRaises(ValueError):
+            AvailabilityEngine(opening_hours={0: ("08:10", "21:00")})
+
+    def test_negative_buffer(self):
+        with self.assertRaises(ValueError):
+            AvailabilityEngine(buffer=-15)
+
+    def test_free_intervals(self):
+        booked = [(480, 600), (600, 720), (1140, 1260)]
+        result = self.engine.free_intervals(MONDAY, booked)
+
+        self.assertEqual(result, [(720, 1140)])
+
+    def test_free_intervals_with_buffer(self):
+        engine = AvailabilityEngine(buffer=15)
+        booked = [(480, 600), (720, 780)]
+        result = engine.free_intervals(MONDAY, booked)
+
+        self.assertEqual(result, [(615, 705), (795, 1260)])
+
+    def test_closed_day(self):
+        engine = AvailabilityEngine(opening_hours={0: ("08:00", "21:00")})
+
+        self.assertEqual(engine.free_intervals(SUNDAY, []), [])
+        self.assertEqual(engine.slot_starts(SUNDAY, 60, []), [])
+
+    def test_weekday_opening_hours(self):
+        engine = AvailabilityEngine(
+            opening_hours={0: ("10:00", "13:00"), 6: None}
+        )
+        result = engine.slot_starts(MONDAY, 60, [])
+
+        self.assertEqual(result, [600, 660, 720])
+
+    def test_slot_starts_aligned_to_step(self):
+        engine = AvailabilityEngine(slot_step=30)
+        booked = [(480, 610)]
+        result = engine.slot_starts(MONDAY, 90, booked)
+
+        self.assertEqual(result[0], 630)
+        self.assertEqual(result[-1], 1170)
+        self.assertEqual(len(result), 19)
+
+    def test_slot_mask(self):
+        engine = AvailabilityEngine(slot_step=15)
+        booked = [(480, 1200)]
+        result = engine.slot_mask(MONDAY, 30, booked)
+
+        self.assertEqual(list(result), [1200, 1215, 1230])
+
+    def test_available_times(self):
+        booked = [(480, 1080)]
+        result = self.engine.available_times(MONDAY, 120, booked)
+
+        self.assertEqual(
+            result,
+            [
+                [datetime(2024, 2, 26, 18), datetime(2024, 2, 26, 20)],
+                [datetime(2024, 2, 26, 19), datetime(2024, 2, 26, 21)],
+            ],
+        )
@@ -0,0 +1,144 @@
+from datetime import date
+from unittest import TestCase, skipIf
+
+from source.availability import AvailabilityEngine
+from source.bitmap_availability import BitmapAvailability, np
+from source.fake_spreadsheet import FakeSpreadsheet
+from source.sheet_manager import SpaSheet
+from source.sqlite_storage import SQLiteStorage
+from source.storage import StorageBackend
+from tests.test_sheet_manager import BOOKING_DATA, SPA_INFO
+
+# 2024-02-26 is Monday
+MONDAY = date(2024, 2, 26)
+OPENING_HOURS = {
+    0: ("08:00", "21:00"),
+    1: ("09:30", "18:00"),
+    2: ("10:15", "22:45"),
+    5: ("07:00", "12:00"),
+}
+BOOKED = [
+    [],
+    [(480, 600), (600, 720), (1140, 1260)],
+    [(500, 610), (550, 700), (900, 915)],
+    [(300, 500), (1200, 1400)],
+    [(585, 645), (705, 840), (1000, 1015)],
+]
+
+
+@skipIf(np is None, "numpy is not installed")
+class TestBitmapAvailability(TestCase):
+    def test_same_results_as_engine(self):
+        for slot_step in (15, 30, 60):
+            for buffer in (0, 15, 45):
+                engine = AvailabilityEngine(OPENING_HOURS, slot_step, buffer)
+                bitmap = BitmapAvailability(OPENING_HOURS, slot_step, buffer)
+                for day in range(7):
+                    date_obj = date.fromordinal(MONDAY.toordinal() + day)
+                    for booked in BOOKED:
+                        for duration in (30, 60, 90, 120):
+                            with self.subTest(
+                                slot_step=slot_step,
+                                buffer=buffer,
+                                date=date_obj,
+                                booked=booked,
+                                duration=duration,
+                            ):
+                                self.assertEqual(
+                                    bitmap.available_times(
+                                        date_obj, duration, booked
+                                    ),
+                                    engine.available_times(
+                                        date_obj, duration, booked
+                                    ),
+                                )
+
+    def test_range_slot_starts(self):
+        engine = AvailabilityEngine(OPENING_HOURS)
+        bitmap = BitmapAvailability(OPENING_HOURS)
+        booked_days = [0, 0, 1, 5]
+        starts = [480, 720, 600, 420]
+        ends = [600, 780, 660, 720]
+
+        result = bitmap.range_slot_starts(
+            MONDAY, 7, 60, booked_days, starts, ends
+        )
+
+        self.assertEqual(len(result), 7)
+        self.assertEqual(
+            result[MONDAY],
+            engine.slot_starts(MONDAY, 60, [(480, 600), (720, 780)]),
+        )
+        self.assertEqual(result[date(2024, 3, 2)], [])
+        self.assertEqual(result[date(2024, 3, 3)], [])
+
+    def test_bookings_out_of_range_ignored(self):
+        bitmap = BitmapAvailability()
+
+        mask = bitmap.start_mask(
+            MONDAY, 1, 60, [-1, 1], [480, 480], [600, 600]
+        )
+
+        self.assertEqual(mask.sum(), 13)
+
+    def test_duration_longer_than_day(self):
+        bitmap = BitmapAvailability()
+
+        self.assertEqual(bitmap.slot_starts(MONDAY, 24 * 60 + 1, []), [])
+
+
+@skipIf(np is None, "numpy is not installed")
+class TestAvailabilityBulk(TestCase):
+    def setUp(self):
+        self.spreadsheet = FakeSpreadsheet.from_records(
+            {"spa_info": SPA_INFO, "booking_data": BOOKING_DATA[:5]}
+        )
+        self.services = [record["name"] for record in SPA_INFO]
+
+    def assertSameAsAvailability(self, storage, expected_storage):
+        result = storage.get_availability_bulk(
+            self.services, "2024-02-20", "2024-03-10"
+        )
+
+        self.assertEqual(list(result), self.services)
+        for service in self.services:
+            with self.subTest(service=service):
+                self.assertEqual(
+                    result[service],
+                    expected_storage.get_availability(
+                        service, "2024-02-20", "2024-03-10"
+                    ),
+                )
+
+    def test_sheet_bitmap(self):
+        storage = SpaSheet(
+            self.spreadsheet, availability=BitmapAvailability(buffer=15)
+        )
+        expected = SpaSheet(
+            self.spreadsheet, availability=AvailabilityEngine(buffer=15)
+        )
+
+        self.assertSameAsAvailability(storage, expected)
+
+    def test_sheet_engine(self):
+        storage = SpaSheet(self.spreadsheet)
+
+        self.assertSameAsAvailability(storage, storage)
+
+    def test_sqlite_bitmap(self):
+        storage = SQLiteStorage(":memory:", availability=BitmapAvailability())
+        storage.import_records(SPA_INFO, BOOKING_DATA[:5])
+
+        self.assertSameAsAvailability(storage, storage)
+        self.assertEqual(
+            StorageBackend.booked_columns(storage, "service1", MONDAY, 2),
+            storage.booked_columns("service1", MONDAY, 2),
+        )
+
+    def test_unknown_service(self):
+        storage = SpaSheet(self.spreadsheet)
+
+        with self.assertRaises(ValueError):
+            storage.get_availability_bulk(
+                ["service9"], "2024-02-20", "2024-03-10"
+            )
@@ -0,0 +1,149 @@
+import asyncio
+import os
+import stat
+import threading
+import time
+from contextlib import suppress
+from datetime import date
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from gspread.exceptions import APIError
+
+from source.cache_daemon import CacheClient, CacheDaemon, CachedSpaSheet
+from source.fake_spreadsheet import FakeSpreadsheet
+from source.sheet_manager import SpaSheet
+from tests.test_sheet_manager import BOOKING_DATA, SPA_INFO
+
+MONDAY = date(2024, 2, 26)
+
+
+class TestCacheDaemon(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache.sock")
+        self.spreadsheet = FakeSpreadsheet.from_records(
+            {"spa_info": SPA_INFO, "booking_data": BOOKING_DATA[:3]}
+        )
+        self.daemon = CacheDaemon(SpaSheet(self.spreadsheet))
+        self.thread = threading.Thread(
+            target=asyncio.run, args=(self.serve(),)
+        )
+        self.thread.start()
+        while not os.path.exists(self.path):
+            time.sleep(0.01)
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.loop.call_soon_threadsafe(self.serving.cancel)
+        self.thread.join()
+        self.directory.cleanup()
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.serving = asyncio.current_task()
+        with suppress(asyncio.CancelledError):
+            await self.daemon.serve(self.path)
+
+    def session(self) -> CachedSpaSheet:
+        client = CacheClient(self.path)
+        self.clients.append(client)
+        return CachedSpaSheet(client)
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    def test_sessions_share_one_load(self):
+        first = self.session()
+        second = self.session()
+
+        self.assertEqual(len(first.get_services()), len(SPA_INFO))
+        self.assertEqual(
+            first.booked_intervals("service1", MONDAY),
+            second.booked_intervals("service1", MONDAY),
+        )
+        self.assertEqual(
+            self.spreadsheet.limiter.counts, {"values_batch_get": 1}
+        )
+
+    def test_socket_private(self):
+        umask = os.umask(0)
+        os.umask(umask)
+
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+        self.assertNotEqual(umask, 0o177)
+
+    def test_copy_keeps_age_of_daemon_data(self):
+        self.session().get_services()
+        self.daemon.sheet.catalog._loaded_at -= 100
+
+        session = self.session()
+        session.get_services()
+
+        self.assertAlmostEqual(
+            session.catalog._loaded_at,
+            self.daemon.sheet.catalog._loaded_at,
+            delta=1,
+        )
+
+    def test_slow_request_not_blocking(self):
+        started = threading.Event()
+        released = threading.Event()
+
+        def refresh_bookings():
+            started.set()
+            released.wait(5)
+
+        self.daemon.sheet.refresh_bookings = refresh_bookings
+        first = self.session()
+        second = self.session()
+        second.get_services()
+        refreshing = threading.Thread(target=first.refresh_bookings)
+        refreshing.start()
+        self.assertTrue(started.wait(5))
+
+        second.save_booking(dict(BOOKING_DATA[0], name="Ann"))
+
+        self.assertTrue(refreshing.is_alive())
+        released.set()
+        refreshing.join()
+
+        self.assertEqual(self.spreadsheet.sheets["booking_data"].row_count, 5)
+
+    def test_write_invalidates_other_sessions(self):
+        first = self.session()
+        second = self.session()
+        self.assertEqual(len(second.find_bookings("Ann", "+353111111111")), 0)
+
+        first.save_booking(dict(BOOKING_DATA[0], name="Ann"))
+
+        self.wait_for(lambda: not second.bookings.is_loaded)
+        self.assertEqual(len(second.find_bookings("Ann", "+353111111111")), 1)
+        self.assertEqual(self.spreadsheet.sheets["booking_data"].row_count, 5)
+
+    def test_delete_changed_booking(self):
+        session = self.session()
+        bookings = session.find_bookings("Den", "+353111111111")
+        self.spreadsheet.sheets["booking_data"].delete_rows(2)
+
+        with self.assertRaises(ValueError):
+            session.delete_bookings(bookings)
+
+    def test_api_error(self):
+        self.spreadsheet.limiter.quotas["read"] = 0
+
+        with self.assertRaises(APIError) as context:
+            self.session().get_services()
+
+        self.assertEqual(context.exception.response.status_code, 429)
+
+    def test_daemon_not_running(self):
+        client = CacheClient(os.path.join(self.directory.name, "missing"))
+
+        with self.assertRaises(ConnectionError):
+            CachedSpaSheet(client).get_services()
@@ -0,0 +1,252 @@
+from datetime import date
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from gspread.exceptions import APIError, WorksheetNotFound
+
+from source.fake_spreadsheet import FakeSpreadsheet, RequestLimiter
+from source.sheet_manager import SpaSheet
+from tests.test_sheet_manager import BOOKING_DATA, SPA_INFO
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRequestLimiter(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.sleep = MagicMock()
+        self.limiter = RequestLimiter(
+            latency=0.5,
+            read_quota=2,
+            clock=self.clock,
+            sleep=self.sleep,
+        )
+
+    def test_latency(self):
+        self.limiter("read", "get")
+
+        self.sleep.assert_called_once_with(0.5)
+        self.assertEqual(self.limiter.counts["get"], 1)
+
+    def test_quota_exhausted(self):
+        self.limiter("read", "get")
+        self.limiter("read", "get")
+
+        with self.assertRaises(APIError) as error:
+            self.limiter("read", "get")
+
+        self.assertEqual(error.exception.response.status_code, 429)
+        self.assertEqual(self.limiter.rejected["get"], 1)
+        self.assertEqual(self.limiter.total, 2)
+
+    def test_quota_window(self):
+        self.limiter("read", "get")
+        self.limiter("read", "get")
+        self.clock.now = 60
+
+        self.limiter("read", "get")
+
+        self.assertEqual(self.limiter.total, 3)
+
+    def test_writes_have_own_quota(self):
+        self.limiter("read", "get")
+        self.limiter("read", "get")
+
+        self.limiter("write", "append_rows")
+
+        self.assertEqual(self.limiter.counts["append_rows"], 1)
+
+
+class TestFakeSpreadsheet(TestCase):
+    def setUp(self):
+        self.spreadsheet = FakeSpreadsheet.from_records(
+            {"spa_info": SPA_INFO, "booking_data": BOOKING_DATA[:3]}
+        )
+        self.booking_data = self.spreadsheet.sheets["booking_data"]
+
+    def test_get_all_records(self):
+        records = self.spreadsheet.worksheet("spa_info").get_all_records()
+
+        self.assertEqual(records[0]["name"], "service1")
+        # Numeric strings are converted like in gspread
+        self.assertEqual(records[0]["price"], 10)
+        self.assertEqual(len(records), len(SPA_INFO))
+
+    def test_worksheet_not_found(self):
+        with self.assertRaises(WorksheetNotFound):
+            self.spreadsheet.worksheet("missing")
+
+    def test_row_and_col_values(self):
+        self.assertEqual(
+            self.booking_data.row_values(1), list(BOOKING_DATA[0])
+        )
+        self.assertEqual(
+            self.booking_data.col_values(2), ["name", "Den", "John", "Jane"]
+        )
+
+    def test_get_range(self):
+        values = self.booking_data.get("B2:C")
+
+        self.assertEqual(
+            values,
+            [
+                ["Den", 353111111111],
+                ["John", 353222222222],
+                ["Jane", 353333333333],
+            ],
+        )
+
+    def test_append_and_delete_rows(self):
+        self.booking_data.append_rows([["service1", "Ann"], ["service3"]])
+        self.booking_data.delete_rows(2, 3)
+
+        self.assertEqual(
+            self.booking_data.col_values(2), ["name", "Jane", "Ann"]
+        )
+
+    def test_values_batch_get(self):
+        response = self.spreadsheet.values_batch_get(
+            ["spa_info!A2:A3", "booking_data!B4"]
+        )
+
+        self.assertEqual(
+            [value_range["values"] for value_range in response["valueRanges"]],
+            [[["service1"], ["service2"]], [["Jane"]]],
+        )
+
+    def test_batch_update_delete_rows(self):
+        rows = {
+            "sheetId": self.booking_data.id,
+            "dimension": "ROWS",
+            "startIndex": 1,
+            "endIndex": 2,
+        }
+        self.spreadsheet.batch_update(
+            {
+                "requests": [
+                    {
+                        "deleteDimension": {
+                            "range": {**rows, "startIndex": 3, "endIndex": 4}
+                        }
+                    },
+                    {"deleteDimension": {"range": rows}},
+                ]
+            }
+        )
+
+        self.assertEqual(self.booking_data.col_values(2), ["name", "John"])
+        self.assertEqual(self.spreadsheet.limiter.counts["batch_update"], 1)
+
+    def test_unsupported_batch_update(self):
+        with self.assertRaises(APIError) as context:
+            self.spreadsheet.batch_update({"requests": [{"addSheet": {}}]})
+
+        self.assertEqual(context.exception.response.status_code, 400)
+
+    def test_invalid_batch_update_changes_nothing(self):
+        rows = {
+            "sheetId": self.booking_data.id,
+            "dimension": "ROWS",
+            "startIndex": 1,
+            "endIndex": 2,
+        }
+        row_count = self.booking_data.row_count
+
+        with self.assertRaises(APIError):
+            self.spreadsheet.batch_update(
+                {
+                    "requests": [
+                        {"deleteDimension": {"range": rows}},
+                        {
+                            "deleteDimension": {
+                                "range": {**rows, "endIndex": row_count}
+                            }
+                        },
+                    ]
+                }
+            )
+
+        self.assertEqual(self.booking_data.row_count, row_count)
+
+
+class TestSpaSheetOnFakeSpreadsheet(TestCase):
+    def setUp(self):
+        self.spreadsheet = FakeSpreadsheet.from_records(
+            {"spa_info": SPA_INFO, "booking_data": BOOKING_DATA[:3]}
+        )
+        self.spa_sheet = SpaSheet(self.spreadsheet)
+
+    def test_save_find_and_delete_booking(self):
+        info = dict(
+            BOOKING_DATA[0], name="Ann", start_time="16:00", end_time="18:00"
+        )
+        self.spa_sheet.save_booking(info)
+
+        bookings = self.spa_sheet.find_bookings("Ann", "+353111111111")
+        self.assertEqual([row for row, _ in bookings], [5])
+
+        self.spa_sheet.delete_bookings(bookings)
+        self.assertEqual(
+            self.spreadsheet.sheets["booking_data"].col_values(2),
+            ["name", "Den", "John", "Jane"],
+        )
+
+    def test_cancel_series_in_one_request(self):
+        spreadsheet = FakeSpreadsheet.from_records(
+            {
+                "spa_info": SPA_INFO,
+                "booking_data": [
+                    dict(BOOKING_DATA[0], date=f"2024-03-{day:02}")
+                    for day in range(1, 11)
+                ],
+            }
+        )
+        spa_sheet = SpaSheet(spreadsheet)
+        bookings = spa_sheet.find_bookings("Den", "+353111111111")
+        spreadsheet.limiter.reset()
+
+        spa_sheet.delete_bookings(bookings)
+
+        # The booking_data worksheet is looked up on its first use
+        self.assertEqual(
+            spreadsheet.limiter.counts,
+            {"worksheet": 1, "batch_get": 1, "batch_update": 1},
+        )
+        self.assertEqual(spreadsheet.sheets["booking_data"].row_count, 1)
+
+    def test_delete_booking_changed_by_another_session(self):
+        bookings = self.spa_sheet.find_bookings("Den", "+353111111111")
+        self.spreadsheet.sheets["booking_data"].delete_rows(2)
+
+        with self.assertRaises(ValueError):
+            self.spa_sheet.delete_bookings(bookings)
+
+        self.assertEqual(
+            self.spreadsheet.sheets["booking_data"].col_values(2),
+            ["name", "John", "Jane"],
+        )
+
+    def test_bookings_are_cached(self):
+        self.spa_sheet.booked_intervals("service1", date(2024, 2, 26))
+        self.spa_sheet.booked_intervals("service3", date(2024, 2, 26))
+
+        self.assertEqual(
+            self.spreadsheet.limiter.counts["values_batch_get"], 1
+        )
+        self.assertNotIn("get_all_records", self.spreadsheet.limiter.counts)
+
+    def test_quota_exhausted(self):
+        spreadsheet = FakeSpreadsheet.from_records(
+            {"spa_info": SPA_INFO, "booking_data": BOOKING_DATA},
+            read_quota=0,
+        )
+        spa_sheet = SpaSheet(spreadsheet)
+
+        with self.assertRaises(APIError):
+            spa_sheet.get_services()
@@ -2,7 +2,10 @@ from unittest import TestCase
 from unittest.mock import MagicMock, call, patch
 
 import phonenumbers
+from freezegun import freeze_time
 
+from source.availability import SlotMask
+from source.fake_spreadsheet import quota_error
 from source.flow_controller import (
     AvailabilityFlow,
     BasicFlow,
@@ -113,6 +116,17 @@ class TestFlowController(TestCase):
             self.flow_controller.sheet, self.flow_controller
         )
 
+    @patch.object(FlowController, "print_suggestion")
+    def test_create_flow_api_error(self, mock_print_suggestion):
+        flow = MagicMock(side_effect=quota_error("read"))
+
+        with patch.object(
+            FlowController, "FLOW_OPTIONS", new=[{"object": flow}]
+        ):
+            self.flow_controller.create_flow("0")
+
+        mock_print_suggestion.assert_called_once()
+
 
 class TestBasicFlow(TestCase):
     @patch.object(BasicFlow, "run_flow")
@@ -148,13 +162,17 @@ class TestBasicFlow(TestCase):
         end_time = "13:00"
         self.basic_flow.info["date"] = "2024-05-05"
         self.basic_flow.info["service"] = "Test service"
-        mock_time_ranges = [[start_time, end_time]]
+        slot_mask = SlotMask.from_minutes([720])
         mock_input_handler.return_value = start_time
-        self.sheet.get_service_info.return_value = duration
+        self.sheet.get_service.return_value.duration = duration
 
-        self.basic_flow.choose_time(mock_time_ranges)
+        self.basic_flow.choose_time(slot_mask)
 
         mock_input_handler.assert_called_once()
+        self.assertEqual(
+            mock_input_handler.call_args.kwargs["time_ranges"], slot_mask
+        )
+        self.sheet.get_service.assert_called_once_with("Test service")
         self.assertEqual(self.basic_flow.info["start_time"], start_time)
         self.assertEqual(self.basic_flow.info["end_time"], end_time)
 
@@ -270,7 +288,9 @@ class TestBookingFlow(TestCase):
 
         self.assertEqual(mock_print_suggestion.call_count, 2)
         mock_choose_date.assert_called_once()
-        mock_choose_time.assert_called_once()
+        mock_choose_time.assert_called_once_with(
+            self.sheet.get_slot_mask_for_date_and_service.return_value
+        )
         mock_print_time_info.assert_called_once()
 
     def test_input_credentials(self):
@@ -333,14 +353,10 @@ class TestBookingFlow(TestCase):
             "name": "Joe",
             "phone_number": "+353 123456789",
         }
-        booking_keys = MagicMock(return_value=self.booking_flow.info.keys())
-        self.booking_flow.sheet.booking_data.row_values.return_value = (
-            booking_keys
-        )
 
         self.booking_flow.save_booking()
 
-        self.booking_flow.sheet.booking_data.row_values.assert_called_once()
+        self.sheet.save_booking.assert_called_once_with(self.booking_flow.info)
 
 
 class TestCancelFlow(TestCase):
@@ -398,12 +414,30 @@ class TestCancelFlow(TestCase):
             self.cancel_flow.input_credentials()
 
         self.assertEqual(self.cancel_flow.info["name"], name)
-        self.assertEqual(self.cancel_flow.info["phone_number"], phone_number)
+        self.assertEqual(
+            self.cancel_flow.info["phone_number"], "+353123456789"
+        )
         self.assertEqual(self.cancel_flow.info["user_bookings"], user_bookings)
         self.assertEqual(mock_input_handler.call_count, 2)
         self.assertEqual(mock_print_suggestion.call_count, 2)
         mock_look_for_booking.assert_called_once()
 
+    def test_input_credentials_national_prefix(self):
+        with patch(
+            "source.flow_controller.input_handler"
+        ) as mock_input_handler, patch.object(
+            CancelFlow, "print_suggestion"
+        ), patch.object(
+            CancelFlow, "look_for_booking"
+        ) as mock_look_for_booking:
+            mock_input_handler.side_effect = ["Joe", "+353 087 123 4567"]
+            mock_look_for_booking.return_value = [{}]
+            self.cancel_flow.input_credentials()
+
+        self.assertEqual(
+            self.cancel_flow.info["phone_number"], "+353871234567"
+        )
+
     def test_bookings_not_found(self):
         name = "Joe"
         phone_number = "+353 123456789"
@@ -428,7 +462,9 @@ class TestCancelFlow(TestCase):
             self.cancel_flow.input_credentials()
 
         self.assertEqual(self.cancel_flow.info["name"], name)
-        self.assertEqual(self.cancel_flow.info["phone_number"], phone_number)
+        self.assertEqual(
+            self.cancel_flow.info["phone_number"], "+353123456789"
+        )
         self.assertEqual(self.cancel_flow.info["user_bookings"], user_bookings)
         self.assertEqual(mock_input_handler.call_count, 6)
         self.assertEqual(mock_print_suggestion.call_count, 8)
@@ -443,16 +479,20 @@ class TestCancelFlow(TestCase):
             "phone_number": phone_number,
         }
 
-        self.sheet.booking_data.get_all_records.return_value = [
-            {"name": name, "phone_number": 353123456789},
-            {"name": name, "phone_number": 353123456789},
-            {"name": "test_name", "phone_number": 353111111111},
-        ]
+        bookings = [(2, MagicMock()), (4, MagicMock())]
+        self.sheet.find_bookings.return_value = bookings
 
         result = self.cancel_flow.look_for_booking()
 
-        self.sheet.booking_data.get_all_records.assert_called_once()
-        self.assertEqual(len(result), 2)
+        self.sheet.refresh_bookings.assert_not_called()
+        self.sheet.find_bookings.assert_called_once_with(name, phone_number)
+        self.assertEqual(
+            result,
+            [
+                {"booking": bookings[0][1], "row_number": 2},
+                {"booking": bookings[1][1], "row_number": 4},
+            ],
+        )
 
     def test_cancel_booking(self):
         user_bookings = [
@@ -467,14 +507,42 @@ class TestCancelFlow(TestCase):
         ) as mock_print_user_bookings, patch(
             "source.flow_controller.input_handler"
         ) as mock_input_handler:
-            mock_input_handler.return_value = "0"
+            mock_input_handler.return_value = "1 0"
 
             self.cancel_flow.cancel_booking()
 
         self.assertEqual(mock_input_handler.call_count, 1)
         self.assertEqual(mock_print_suggestion.call_count, 1)
         self.assertEqual(mock_print_user_bookings.call_count, 1)
-        self.sheet.booking_data.delete_rows.assert_called()
+        self.sheet.delete_bookings.assert_called_once_with(
+            [
+                (5, user_bookings[1]["booking"]),
+                (3, user_bookings[0]["booking"]),
+            ]
+        )
+
+    def test_cancel_changed_booking(self):
+        user_bookings = [{"booking": {"name": "Joe"}, "row_number": 3}]
+        self.cancel_flow.info["user_bookings"] = user_bookings
+        self.sheet.delete_bookings.side_effect = [
+            ValueError("changed"),
+            None,
+        ]
+        with patch.object(
+            CancelFlow, "print_suggestion"
+        ) as mock_print_suggestion, patch.object(
+            CancelFlow, "print_user_bookings"
+        ), patch.object(
+            CancelFlow, "look_for_booking", return_value=user_bookings
+        ) as mock_look_for_booking, patch(
+            "source.flow_controller.input_handler", return_value="0"
+        ):
+            self.cancel_flow.cancel_booking()
+
+        mock_print_suggestion.assert_any_call("changed")
+        self.sheet.refresh_bookings.assert_called_once()
+        mock_look_for_booking.assert_called_once()
+        self.assertEqual(self.sheet.delete_bookings.call_count, 2)
 
 
 class TestAvailabilityFlow(TestCase):
@@ -485,6 +553,22 @@ class TestAvailabilityFlow(TestCase):
         self.availability_flow = AvailabilityFlow(self.sheet, self.controller)
 
     def test_run_flow(self):
+        with patch.object(
+            AvailabilityFlow, "check_date"
+        ) as mock_check_date, patch.object(
+            AvailabilityFlow, "print_suggestion"
+        ), patch.object(
+            AvailabilityFlow, "print_options"
+        ) as mock_print_options, patch(
+            "source.flow_controller.input_handler"
+        ) as mock_input_handler:
+            mock_input_handler.return_value = "0"
+            self.availability_flow.run_flow()
+
+        mock_print_options.assert_called_once()
+        mock_check_date.assert_called_once()
+
+    def test_check_date(self):
         with patch.object(
             AvailabilityFlow, "choose_service"
         ) as mock_choose_service, patch.object(
@@ -492,12 +576,84 @@ class TestAvailabilityFlow(TestCase):
         ) as mock_choose_date, patch.object(
             AvailabilityFlow, "show_result"
         ) as mock_show_result:
-            self.availability_flow.run_flow()
+            self.availability_flow.check_date()
 
         mock_choose_service.assert_called_once()
         mock_choose_date.assert_called_once()
         mock_show_result.assert_called_once()
 
+    def test_check_days_ahead(self):
+        with patch.object(
+            AvailabilityFlow, "choose_service"
+        ) as mock_choose_service, patch.object(
+            AvailabilityFlow, "show_days_ahead"
+        ) as mock_show_days_ahead:
+            self.availability_flow.check_days_ahead()
+
+        mock_choose_service.assert_called_once()
+        mock_show_days_ahead.assert_called_once()
+
+    def test_check_any_service(self):
+        with patch.object(
+            AvailabilityFlow, "choose_service"
+        ) as mock_choose_service, patch.object(
+            AvailabilityFlow, "choose_date"
+        ) as mock_choose_date, patch.object(
+            AvailabilityFlow, "show_all_services"
+        ) as mock_show_all_services:
+            self.availability_flow.check_any_service()
+
+        mock_choose_service.assert_not_called()
+        mock_choose_date.assert_called_once()
+        mock_show_all_services.assert_called_once()
+
+    def test_show_all_services(self):
+        availability = {"Test service": []}
+        self.sheet.get_availability_for_date.return_value = availability
+        self.availability_flow.info = {"date": "2024-05-05"}
+        with patch.object(
+            AvailabilityFlow, "print_suggestion"
+        ) as mock_print_suggestion, patch.object(
+            AvailabilityFlow, "print_availability"
+        ) as mock_print_availability, patch.object(
+            AvailabilityFlow, "choose_date"
+        ) as mock_choose_date, patch(
+            "source.flow_controller.input_handler"
+        ) as mock_input_handler:
+            mock_input_handler.side_effect = ["yes", "no"]
+            self.availability_flow.show_all_services()
+
+        self.assertEqual(self.sheet.get_availability_for_date.call_count, 2)
+        mock_print_availability.assert_called_with(
+            availability, title="Service"
+        )
+        self.assertEqual(mock_print_suggestion.call_count, 4)
+        mock_choose_date.assert_called_once()
+
+    @freeze_time("2024-05-05")
+    def test_show_days_ahead(self):
+        availability = {"2024-05-05": []}
+        self.sheet.get_availability.return_value = availability
+        self.availability_flow.info = {"service": "Test service"}
+        with patch.object(
+            AvailabilityFlow, "print_suggestion"
+        ) as mock_print_suggestion, patch.object(
+            AvailabilityFlow, "print_availability"
+        ) as mock_print_availability, patch.object(
+            AvailabilityFlow, "show_result"
+        ) as mock_show_result, patch(
+            "source.flow_controller.input_handler"
+        ) as mock_input_handler:
+            mock_input_handler.return_value = "no"
+            self.availability_flow.show_days_ahead()
+
+        self.sheet.get_availability.assert_called_once_with(
+            "Test service", "2024-05-05", "2024-05-11"
+        )
+        mock_print_availability.assert_called_once_with(availability)
+        self.assertEqual(mock_print_suggestion.call_count, 2)
+        mock_show_result.assert_not_called()
+
     def test_choose_date(self):
         with patch.object(
             AvailabilityFlow, "print_suggestion"
@@ -556,10 +712,7 @@ class TestServiceInfoFlow(TestCase):
     def test_show_result(self):
         name = "Turkish bath"
         self.service_info_flow.info = {"service": name}
-        self.sheet.spa_info.get_all_records.return_value = [
-            {"name": "Test service"},
-            {"name": "Turkish bath"},
-        ]
+        self.sheet.get_service.return_value = {"name": name}
         with patch.object(
             ServiceInfoFlow, "print_service_info"
         ) as mock_print_service_info, patch.object(
@@ -572,7 +725,7 @@ class TestServiceInfoFlow(TestCase):
             mock_input_handler.return_value = "yes"
             self.service_info_flow.show_result()
 
-        self.sheet.spa_info.get_all_records.assert_called_once()
+        self.sheet.get_service.assert_called_once_with(name)
         mock_print_service_info.assert_called_once()
         mock_print_suggestion.assert_called_once()
         mock_run_flow.assert_called_once()
@@ -38,6 +38,26 @@ class TestPrintMixin(TestCase):
         self.assertTrue(mock_padding.called)
         self.assertTrue(mock_print.called)
 
+    @patch("source.mixins.Padding")
+    @patch("source.mixins.Text")
+    @patch("source.mixins.Table")
+    def test_print_availability(
+        self, mock_table, mock_text, mock_padding, mock_print
+    ):
+        availability = {
+            "2022-01-01": [
+                [datetime(2022, 1, 1, 8, 0), datetime(2022, 1, 1, 9, 0)],
+                [datetime(2022, 1, 1, 9, 0), datetime(2022, 1, 1, 10, 0)],
+            ],
+            "2022-01-02": [],
+        }
+        self.print_mixin.print_availability(availability)
+
+        mock_text.assert_any_call("08:00, 09:00", style="options")
+        mock_text.assert_any_call("No available times", style="options")
+        self.assertEqual(mock_table.return_value.add_row.call_count, 2)
+        mock_print.assert_called_once()
+
     @patch("source.mixins.Text")
     @patch("source.mixins.Panel")
     def test_print_suggestion(self, mock_panel, mock_text, mock_print):
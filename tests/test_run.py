@@ -0,0 +1,48 @@
+import subprocess
+import sys
+from contextlib import redirect_stderr
+from io import StringIO
+from unittest import TestCase
+
+from run import parse_args
+
+
+class TestParseArgs(TestCase):
+    def assertRejected(self, args):
+        with redirect_stderr(StringIO()), self.assertRaises(SystemExit):
+            parse_args(args)
+
+    def test_defaults(self):
+        args = parse_args([])
+
+        self.assertEqual(args.storage, "sheets")
+        self.assertFalse(args.cache_client)
+
+    def test_cache_client_conflicts(self):
+        self.assertRejected(["--cache-client", "--write-behind"])
+        self.assertRejected(["--cache-client", "--delta-sync"])
+
+    def test_cache_daemon_needs_sheets(self):
+        self.assertRejected(["--cache-daemon", "--storage", "sqlite"])
+
+    def test_cache_daemon_with_delta_sync(self):
+        args = parse_args(["--cache-daemon", "--delta-sync"])
+
+        self.assertTrue(args.delta_sync)
+
+
+class TestImports(TestCase):
+    def test_servers_imported_lazily(self):
+        code = (
+            "import sys, run; print(sorted(name for name in ("
+            "'asyncio', 'source.cache_daemon', 'source.session_server')"
+            " if name in sys.modules))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        self.assertEqual(result.stdout.strip(), "[]")
@@ -0,0 +1,139 @@
+import asyncio
+import os
+import threading
+from tempfile import TemporaryDirectory
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import MagicMock
+
+from source.mixins import console
+from source.session_server import BUSY_MESSAGE, LineReader, SessionServer
+
+
+def greeting_session(storage):
+    name = console.input("Name?\n").strip()
+    console.print(f"Hello {name}", highlight=False)
+    storage.save_booking({"name": name})
+
+
+class TestLineReader(TestCase):
+    def setUp(self):
+        self.echoed = []
+        self.reader = LineReader(self.echoed.append)
+
+    def test_lines_echoed(self):
+        self.reader.feed(b"Ann\rDen\r\n")
+
+        self.assertEqual(self.reader.readline(), "Ann\n")
+        self.assertEqual(self.reader.readline(), "Den\n")
+        self.assertEqual("".join(self.echoed), "Ann\nDen\n")
+
+    def test_erase(self):
+        self.reader.feed(b"Ax\x7fnn\r")
+
+        self.assertEqual(self.reader.readline(), "Ann\n")
+        self.assertIn("\b \b", self.echoed)
+
+    def test_special_keys_skipped(self):
+        self.reader.feed(b"A\x1b[Ann\x1bOB\r")
+
+        self.assertEqual(self.reader.readline(), "Ann\n")
+
+    def test_split_utf8(self):
+        data = "Zoë\r".encode()
+        self.reader.feed(data[:3])
+        self.reader.feed(data[3:])
+
+        self.assertEqual(self.reader.readline(), "Zoë\n")
+
+    def test_end_of_session(self):
+        self.assertFalse(self.reader.feed(b"\x04"))
+
+        with self.assertRaises(EOFError):
+            self.reader.readline()
+        with self.assertRaises(EOFError):
+            self.reader.readline()
+
+
+class TestSessionServer(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "sessions.sock")
+        self.storage = MagicMock()
+        self.server = SessionServer(
+            self.storage, greeting_session, max_sessions=2
+        )
+        self.serving = asyncio.create_task(self.server.serve(self.path))
+        while not os.path.exists(self.path):
+            await asyncio.sleep(0.01)
+
+    async def asyncTearDown(self):
+        self.serving.cancel()
+        await asyncio.gather(self.serving, return_exceptions=True)
+        self.directory.cleanup()
+
+    async def connect(self):
+        return await asyncio.open_unix_connection(self.path)
+
+    async def test_sessions_have_own_console(self):
+        first = await self.connect()
+        second = await self.connect()
+
+        for (reader, writer), name in ((first, "Ann"), (second, "Den")):
+            await reader.readuntil(b"Name?\r\n")
+            writer.write(f"{name}\r".encode())
+        outputs = [
+            (await reader.read()).decode() for reader, _ in (first, second)
+        ]
+
+        self.assertEqual(outputs[0], "Ann\r\nHello Ann\r\n")
+        self.assertEqual(outputs[1], "Den\r\nHello Den\r\n")
+        self.assertEqual(self.storage.save_booking.call_count, 2)
+
+    async def test_slow_storage_call_not_blocking(self):
+        released = threading.Event()
+
+        def save_booking(info):
+            if info["name"] == "Ann":
+                released.wait(5)
+
+        self.storage.save_booking.side_effect = save_booking
+        first = await self.connect()
+        second = await self.connect()
+        for (reader, writer), name in ((first, "Ann"), (second, "Den")):
+            await reader.readuntil(b"Name?\r\n")
+            writer.write(f"{name}\r".encode())
+
+        output = await asyncio.wait_for(second[0].read(), 5)
+        released.set()
+
+        self.assertEqual(output, b"Den\r\nHello Den\r\n")
+        self.assertFalse(first[0].at_eof())
+        await first[0].read()
+
+    async def test_disconnect_ends_session(self):
+        ended = threading.Event()
+
+        def session(storage):
+            try:
+                console.input("Name?\n")
+            except EOFError:
+                ended.set()
+
+        self.server.session = session
+        reader, writer = await self.connect()
+        await reader.readuntil(b"Name?\r\n")
+
+        writer.close()
+
+        self.assertTrue(await asyncio.to_thread(ended.wait, 5))
+
+    async def test_busy(self):
+        connections = [await self.connect() for _ in range(2)]
+        for reader, _ in connections:
+            await reader.readuntil(b"Name?\r\n")
+
+        reader, _ = await self.connect()
+
+        self.assertEqual(await reader.read(), f"{BUSY_MESSAGE}\r\n".encode())
+        for _, writer in connections:
+            writer.close()
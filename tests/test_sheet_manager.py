@@ -1,8 +1,24 @@
+import threading
 from datetime import date, datetime, time, timedelta
+from functools import partial
+from time import monotonic
 from unittest import TestCase
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
-from source.sheet_manager import SpaSheet
+from source.availability import SlotMask
+from source.fake_spreadsheet import FakeSpreadsheet
+from source.sheet_manager import (
+    Booking,
+    BookingIndex,
+    BookingStore,
+    RecordCache,
+    Service,
+    ServiceIndex,
+    SpaSheet,
+    SyncedBookingIndex,
+    normalize_phone_number,
+    values_to_records,
+)
 
 SPA_INFO = [
     {
@@ -85,14 +101,42 @@ WORKSHEET_NAMES_DATA = {"spa_info": SPA_INFO, "booking_data": BOOKING_DATA}
 
 
 class MockSpreadsheet(MagicMock):
-    def worksheets(self):
-        result = []
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.mock_worksheets = {}
         for name, data in WORKSHEET_NAMES_DATA.items():
             worksheet = MagicMock()
             worksheet.title = name
             worksheet.get_all_records.return_value = data
-            result.append(worksheet)
-        return result
+            self.mock_worksheets[name] = worksheet
+        self.values_batch_get.side_effect = partial(
+            mock_values_batch_get, self.mock_worksheets
+        )
+
+    def _get_child_mock(self, **kwargs):
+        return MagicMock(**kwargs)
+
+    def worksheets(self):
+        return list(self.mock_worksheets.values())
+
+    def worksheet(self, title):
+        return self.mock_worksheets[title]
+
+
+def mock_values_batch_get(worksheets: dict, ranges: list[str]) -> dict:
+    """Build a values_batch_get response from the worksheet records"""
+    value_ranges = []
+    for range_name in ranges:
+        title, _, cells = range_name.partition("!")
+        records = worksheets[title.strip("'")].get_all_records.return_value
+        header = list(records[0]) if records else []
+        values = [header] + [
+            [record.get(key, "") for key in header] for record in records
+        ]
+        if cells == "1:1":
+            values = values[:1]
+        value_ranges.append({"range": range_name, "values": values})
+    return {"valueRanges": value_ranges}
 
 
 class TestSpaSheet(TestCase):
@@ -103,13 +147,33 @@ class TestSpaSheet(TestCase):
         self.services = SPA_INFO
         self.bookings = BOOKING_DATA
 
+    def test_worksheets_looked_up_lazily(self):
+        spreadsheet = FakeSpreadsheet.from_records(
+            {"spa_info": SPA_INFO, "booking_data": BOOKING_DATA[:3]}
+        )
+        sheet = SpaSheet(spreadsheet)
+        sheet.get_services()
+
+        self.assertEqual(spreadsheet.limiter.counts, {"values_batch_get": 1})
+        self.assertIs(sheet.booking_data, sheet.booking_data)
+        self.assertEqual(spreadsheet.limiter.counts["worksheet"], 1)
+
     def test_init_(self):
         for worksheet_name in self.worksheet_names:
             self.assertTrue(hasattr(self.sheet, worksheet_name))
 
+    def test_catalog_loaded_once(self):
+        self.sheet.get_services()
+        self.sheet.get_services("main")
+        self.sheet.get_service_info("service1", "description")
+
+        self.mock_spreadsheet.values_batch_get.assert_called_once()
+
     def test_get_all_services(self):
         result = self.sheet.get_services()
-        self.assertEqual(result, self.services)
+        self.assertEqual(
+            result, [Service.from_record(record) for record in self.services]
+        )
 
     def test_get_main_services(self):
         _type = "main"
@@ -136,6 +200,44 @@ class TestSpaSheet(TestCase):
 
         self.assertEqual(result, "description1")
 
+    def test_get_numeric_service_info(self):
+        result = self.sheet.get_service_info("service1", "price")
+
+        self.assertEqual(result, 10.0)
+
+    def test_get_service(self):
+        result = self.sheet.get_service("service3")
+
+        self.assertEqual(result.name, "service3")
+        self.assertEqual(result.duration, 3.0)
+
+    def test_get_service_not_found(self):
+        self.assertIsNone(self.sheet.get_service("invalid_service"))
+
+    def test_availability_of_unknown_service(self):
+        calls = (
+            partial(
+                self.sheet.get_available_times_for_date_and_service,
+                "2024-02-26",
+                "sauna",
+            ),
+            partial(
+                self.sheet.get_slot_mask_for_date_and_service,
+                "2024-02-26",
+                "sauna",
+            ),
+            partial(
+                self.sheet.get_availability,
+                "sauna",
+                "2024-02-26",
+                "2024-02-27",
+            ),
+        )
+        for call in calls:
+            with self.subTest(method=call.func.__name__):
+                with self.assertRaisesRegex(ValueError, "Service not found"):
+                    call()
+
     def test_service_not_found(self):
         service = "invalid_service"
         field_name = "description"
@@ -161,6 +263,13 @@ class TestSpaSheet(TestCase):
 
         self.assertEqual(result, expected_result)
 
+    def test_get_slot_mask_for_date_and_service(self):
+        result = self.sheet.get_slot_mask_for_date_and_service(
+            "2024-02-26", "service1"
+        )
+
+        self.assertEqual(result, SlotMask.from_minutes(range(720, 1080, 60)))
+
     def test_no_available_times(self):
         # Fill up the day with bookings
         service_data = self.services[0]
@@ -209,3 +318,659 @@ class TestSpaSheet(TestCase):
         )
 
         self.assertEqual(len(result), available_amount_bookings_for_service)
+
+    def test_get_availability(self):
+        result = self.sheet.get_availability(
+            "service1", "2024-02-25", "2024-02-27"
+        )
+
+        self.assertEqual(
+            list(result), ["2024-02-25", "2024-02-26", "2024-02-27"]
+        )
+        self.assertEqual(
+            result["2024-02-26"],
+            self.sheet.get_available_times_for_date_and_service(
+                "2024-02-26", "service1"
+            ),
+        )
+        self.assertEqual(len(result["2024-02-25"]), 12)
+        self.mock_spreadsheet.values_batch_get.assert_called_once()
+
+    def test_get_availability_invalid_range(self):
+        with self.assertRaises(ValueError):
+            self.sheet.get_availability("service1", "2024-02-27", "2024-02-26")
+
+    def test_get_availability_for_date(self):
+        result = self.sheet.get_availability_for_date("2024-02-26")
+
+        self.assertEqual(list(result), ["service1", "service3"])
+        for service, time_ranges in result.items():
+            self.assertEqual(
+                time_ranges,
+                self.sheet.get_available_times_for_date_and_service(
+                    "2024-02-26", service
+                ),
+            )
+        self.mock_spreadsheet.values_batch_get.assert_called_once()
+
+    def test_get_availability_for_date_unknown_service(self):
+        with self.assertRaises(ValueError):
+            self.sheet.get_availability_for_date(
+                "2024-02-26", ["service3", "sauna"]
+            )
+
+    def test_get_availability_for_date_subset(self):
+        result = self.sheet.get_availability_for_date(
+            "2024-02-26", ["service3"]
+        )
+
+        self.assertEqual(list(result), ["service3"])
+
+    def test_bookings_loaded_once(self):
+        self.sheet.get_available_times_for_date_and_service(
+            "2024-02-26", "service1"
+        )
+        self.sheet.get_available_times_for_date_and_service(
+            "2024-02-27", "service3"
+        )
+
+        self.mock_spreadsheet.values_batch_get.assert_called_once()
+
+    def test_load_stale_in_one_request(self):
+        self.sheet.get_services()
+        self.sheet.find_bookings("Den", "+353111111111")
+
+        self.mock_spreadsheet.values_batch_get.assert_called_once_with(
+            ["'spa_info'", "'booking_data'"]
+        )
+        self.assertFalse(self.sheet.booking_header.is_stale)
+
+    def test_load_stale_header_only_when_needed(self):
+        self.sheet.get_services()
+        self.sheet.booking_header.invalidate()
+
+        self.sheet.get_services()
+        self.sheet.catalog.invalidate()
+        self.sheet.load_stale()
+
+        ranges = [
+            call.args[0]
+            for call in self.mock_spreadsheet.values_batch_get.call_args_list
+        ]
+        self.assertEqual(
+            ranges,
+            [
+                ["'spa_info'", "'booking_data'"],
+                ["'spa_info'", "'booking_data'!1:1"],
+            ],
+        )
+        self.sheet.load_stale(header=True)
+        self.assertEqual(self.mock_spreadsheet.values_batch_get.call_count, 2)
+
+    def test_save_booking(self):
+        info = {
+            "service": "service1",
+            "name": "Joe",
+            "date": "2024-02-26",
+            "start_time": "12:00",
+            "end_time": "14:00",
+        }
+        self.sheet.find_bookings("Joe", "+353111111111")
+
+        self.sheet.save_booking(info)
+
+        # The header was read together with the bookings
+        self.mock_spreadsheet.values_batch_get.assert_called_once()
+        self.sheet.booking_data.row_values.assert_not_called()
+        self.sheet.booking_data.append_rows.assert_called_once_with(
+            [[info.get(key, "") for key in self.bookings[0]]]
+        )
+        self.assertIn(
+            (720, 840),
+            self.sheet.bookings.intervals("service1", date(2024, 2, 26)),
+        )
+
+    def mock_rows(self, bookings: list[dict]) -> None:
+        """Make booking_data.batch_get return rows of the bookings"""
+        keys = list(bookings[0])
+
+        def batch_get(ranges):
+            result = [[keys]]
+            for range_name in ranges[1:]:
+                position = int(range_name.split(":")[0]) - 2
+                record = bookings[position]
+                result.append([[record[key] for key in keys]])
+            return result
+
+        self.sheet.booking_data.batch_get.side_effect = batch_get
+
+    def deleted_ranges(self) -> list[tuple[int, int]]:
+        body = self.mock_spreadsheet.batch_update.call_args.args[0]
+        return [
+            (
+                request["deleteDimension"]["range"]["startIndex"],
+                request["deleteDimension"]["range"]["endIndex"],
+            )
+            for request in body["requests"]
+        ]
+
+    def test_delete_bookings(self):
+        self.mock_rows(self.bookings)
+        store = self.sheet.bookings.get()
+        bookings = [(2, store.booking(0)), (5, store.booking(3))]
+
+        self.sheet.delete_bookings(bookings)
+
+        self.mock_spreadsheet.batch_update.assert_called_once()
+        self.sheet.booking_data.delete_rows.assert_not_called()
+        self.assertEqual(self.deleted_ranges(), [(4, 5), (1, 2)])
+        self.assertEqual(len(store), len(self.bookings) - 2)
+        self.assertNotIn(
+            (480, 600),
+            self.sheet.bookings.intervals("service1", date(2024, 2, 26)),
+        )
+
+    def test_delete_bookings_in_any_order(self):
+        self.mock_rows(self.bookings)
+        store = self.sheet.bookings.get()
+        bookings = [(3, store.booking(1)), (6, store.booking(4))]
+
+        self.sheet.delete_bookings(bookings[::-1])
+        self.sheet.delete_bookings([])
+
+        self.mock_spreadsheet.batch_update.assert_called_once()
+        self.assertEqual(self.deleted_ranges(), [(5, 6), (2, 3)])
+        self.assertFalse(self.sheet.bookings.is_stale)
+
+    def test_delete_adjacent_bookings(self):
+        self.mock_rows(self.bookings)
+        store = self.sheet.bookings.get()
+        bookings = [(row, store.booking(row - 2)) for row in (2, 3, 4, 6)]
+
+        self.sheet.delete_bookings(bookings)
+
+        self.assertEqual(self.deleted_ranges(), [(5, 6), (1, 4)])
+        self.assertEqual(len(store), len(self.bookings) - 4)
+
+    def test_delete_changed_booking(self):
+        self.mock_rows(self.bookings[1:])
+        booking = self.sheet.bookings.get().booking(0)
+
+        with self.assertRaises(ValueError):
+            self.sheet.delete_bookings([(2, booking)])
+
+        self.mock_spreadsheet.batch_update.assert_not_called()
+        self.assertTrue(self.sheet.bookings.is_stale)
+
+    def test_find_bookings(self):
+        result = self.sheet.find_bookings("Den", "+353 111111111")
+
+        self.assertEqual([row for row, _ in result], [2, 5])
+        self.assertEqual(
+            [booking.service for _, booking in result],
+            ["service1", "service4"],
+        )
+
+    def test_find_bookings_text_phone_number(self):
+        self.sheet.booking_data.get_all_records.return_value = [
+            dict(self.bookings[0], phone_number="+353 111111111")
+        ]
+
+        result = self.sheet.find_bookings("Den", "+353111111111")
+
+        self.assertEqual(len(result), 1)
+
+    def test_refresh_bookings(self):
+        spreadsheet = FakeSpreadsheet.from_records(
+            {"spa_info": SPA_INFO, "booking_data": BOOKING_DATA[:3]}
+        )
+        sheet = SpaSheet(spreadsheet)
+        self.assertEqual(sheet.find_bookings("Ann", "+353111111111"), [])
+        # Saved by another session
+        spreadsheet.sheets["booking_data"].append_rows(
+            [list(dict(BOOKING_DATA[0], name="Ann").values())]
+        )
+
+        sheet.refresh_bookings()
+
+        self.assertEqual(
+            [row for row, _ in sheet.find_bookings("Ann", "+353111111111")],
+            [5],
+        )
+
+    def test_find_bookings_not_found(self):
+        result = self.sheet.find_bookings("John", "+353111111111")
+
+        self.assertEqual(result, [])
+
+
+class TestValuesToRecords(TestCase):
+    def test_records(self):
+        values = [
+            ["name", "price", "note"],
+            ["service1", "10", "x"],
+            ["service2", "2.5"],
+        ]
+
+        self.assertEqual(
+            values_to_records(values),
+            [
+                {"name": "service1", "price": 10, "note": "x"},
+                {"name": "service2", "price": 2.5, "note": ""},
+            ],
+        )
+
+    def test_empty(self):
+        self.assertEqual(values_to_records([]), [])
+        self.assertEqual(values_to_records([["name"]]), [])
+
+
+class TestBooking(TestCase):
+    def test_from_record(self):
+        booking = Booking.from_record(BOOKING_DATA[0])
+
+        self.assertEqual(booking.service, "service1")
+        self.assertEqual(booking.phone_number, "+353111111111")
+        self.assertEqual(booking.day, date(2024, 2, 26).toordinal())
+        self.assertEqual((booking.start, booking.end), (480, 600))
+
+    def test_dict_access(self):
+        booking = Booking.from_record(BOOKING_DATA[0])
+
+        self.assertEqual(booking["date"], "2024-02-26")
+        self.assertEqual(booking["start_time"], "08:00")
+        self.assertEqual(booking["end_time"], "10:00")
+
+    def test_normalize_phone_number(self):
+        self.assertEqual(normalize_phone_number(353111111111), "+353111111111")
+        self.assertEqual(
+            normalize_phone_number("+353 111 111 111"), "+353111111111"
+        )
+        self.assertEqual(normalize_phone_number(""), "")
+
+
+class TestBookingStore(TestCase):
+    def setUp(self):
+        self.store = BookingStore()
+        for record in BOOKING_DATA[:5]:
+            self.store.append(Booking.from_record(record))
+
+    def test_strings_kept_once(self):
+        self.assertEqual(len(self.store), 5)
+        self.assertEqual(self.store.strings.count("service1"), 1)
+        self.assertEqual(self.store.strings.count("+353111111111"), 1)
+
+    def test_booking(self):
+        booking = self.store.booking(2)
+
+        self.assertEqual(booking, Booking.from_record(BOOKING_DATA[2]))
+
+    def test_filter(self):
+        result = self.store.filter(services="service1", names="John")
+
+        self.assertEqual(result, [1, 4])
+
+    def test_filter_unknown_value(self):
+        self.assertEqual(self.store.filter(names="Unknown"), [])
+
+    def test_filter_by_number(self):
+        day = date(2024, 2, 26).toordinal()
+
+        self.assertEqual(self.store.filter(days=day, starts=720), [2])
+
+    def test_scan(self):
+        result = list(self.store.scan([0, 3]))
+
+        self.assertEqual(
+            [booking.service for booking in result], ["service1", "service4"]
+        )
+
+    def test_delete(self):
+        self.store.delete(1)
+
+        self.assertEqual(len(self.store), 4)
+        self.assertEqual(self.store.booking(1).service, "service3")
+        self.assertEqual(
+            self.store.intervals("service1", date(2024, 2, 26).toordinal()),
+            [(480, 600), (1140, 1260)],
+        )
+
+    def test_find_customer(self):
+        self.assertEqual(self.store.find_customer("+353222222222"), [1, 4])
+        self.assertEqual(
+            self.store.find_customer("+353111111111", "Den"), [0, 3]
+        )
+        self.assertEqual(self.store.find_customer("+353111111111", "Joe"), [])
+        self.assertEqual(self.store.find_customer("+353999999999"), [])
+
+    def test_find_customer_after_changes(self):
+        self.store.delete(0)
+        self.store.append(Booking.from_record(BOOKING_DATA[0]))
+
+        self.assertEqual(self.store.find_customer("+353111111111"), [2, 4])
+        self.assertEqual(self.store.find_customer("+353222222222"), [0, 3])
+
+    def test_position(self):
+        row_id = self.store.ids[3]
+        self.store.delete(1)
+
+        self.assertEqual(self.store.position(row_id), 2)
+        self.assertIsNone(self.store.position(1))
+
+    def test_intervals_unknown_service(self):
+        day = date(2024, 2, 26).toordinal()
+
+        self.assertEqual(self.store.intervals("unknown", day), [])
+
+    def test_intervals_with_same_start(self):
+        store = BookingStore()
+        for start_time, end_time in (
+            ("10:00", "12:00"),
+            ("10:00", "11:00"),
+            ("09:00", "13:00"),
+            ("10:00", "11:00"),
+        ):
+            store.append(
+                Booking.from_record(
+                    dict(
+                        BOOKING_DATA[0],
+                        start_time=start_time,
+                        end_time=end_time,
+                    )
+                )
+            )
+        day = date(2024, 2, 26).toordinal()
+
+        self.assertEqual(
+            store.intervals("service1", day),
+            [(540, 780), (600, 660), (600, 660), (600, 720)],
+        )
+        store.delete(0)
+        store.delete(0)
+        self.assertEqual(
+            store.intervals("service1", day), [(540, 780), (600, 660)]
+        )
+
+
+class TestBookingIndex(TestCase):
+    def setUp(self):
+        self.index = BookingIndex(MagicMock(return_value=BOOKING_DATA), 10)
+
+    def test_intervals_sorted(self):
+        result = self.index.intervals("service1", date(2024, 2, 26))
+
+        self.assertEqual(result, [(480, 600), (600, 720), (1140, 1260)])
+
+    def test_no_intervals(self):
+        result = self.index.intervals("service1", date(2024, 2, 27))
+
+        self.assertEqual(result, [])
+
+    def test_add_keeps_order(self):
+        self.index.get()
+        self.index.add(
+            {
+                "service": "service3",
+                "date": "2024-02-26",
+                "start_time": "09:00",
+                "end_time": "12:00",
+            }
+        )
+
+        result = self.index.intervals("service3", date(2024, 2, 26))
+        self.assertEqual(result, [(540, 720), (720, 900)])
+
+    def test_add_before_load(self):
+        self.index.add(BOOKING_DATA[0])
+
+        result = self.index.intervals("service1", date(2024, 2, 26))
+        self.assertEqual(result, [(480, 600), (600, 720), (1140, 1260)])
+
+    def test_invalidated_by_another_thread(self):
+        update = self.index.update
+
+        def update_and_invalidate(records):
+            store = update(records)
+            thread = threading.Thread(target=self.index.invalidate)
+            thread.start()
+            thread.join()
+            return store
+
+        self.index.update = update_and_invalidate
+
+        result = self.index.intervals("service1", date(2024, 2, 26))
+
+        self.assertEqual(result, [(480, 600), (600, 720), (1140, 1260)])
+        self.assertTrue(self.index.is_stale)
+
+
+class TestServiceIndex(TestCase):
+    def test_from_records(self):
+        index = ServiceIndex.from_records(SPA_INFO)
+
+        self.assertEqual(len(index.services), len(SPA_INFO))
+        self.assertEqual(
+            [service.name for service in index.by_type["main"]],
+            ["service1", "service3"],
+        )
+        self.assertEqual(
+            [service.name for service in index.by_type["sub"]],
+            ["service2", "service4"],
+        )
+        self.assertIs(index.by_name["service2"], index.by_type["sub"][0])
+
+    def test_service_dict_access(self):
+        service = Service.from_record(SPA_INFO[0])
+
+        self.assertEqual(service["name"], "service1")
+        self.assertEqual(service["price"], 10.0)
+
+
+class TestRecordCache(TestCase):
+    def setUp(self):
+        self.loader = MagicMock(return_value=SPA_INFO)
+        self.cache = RecordCache(self.loader, ttl=10)
+
+    def test_get_loads_lazily(self):
+        self.loader.assert_not_called()
+
+        self.assertEqual(self.cache.get(), SPA_INFO)
+        self.assertEqual(self.cache.get(), SPA_INFO)
+        self.loader.assert_called_once()
+
+    @patch("source.sheet_manager.monotonic")
+    def test_expired_data_reloaded(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        self.cache.get()
+        mock_monotonic.return_value = 109
+        self.cache.get()
+        self.assertEqual(self.loader.call_count, 1)
+
+        mock_monotonic.return_value = 110
+        self.cache.get()
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_invalidate(self):
+        self.cache.get()
+        self.cache.invalidate()
+
+        self.assertTrue(self.cache.is_stale)
+        self.cache.get()
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_refresh(self):
+        self.cache.get()
+        result = self.cache.refresh()
+
+        self.assertEqual(result, SPA_INFO)
+        self.assertEqual(self.loader.call_count, 2)
+
+
+class TestSyncedBookingIndex(TestCase):
+    def setUp(self):
+        self.spreadsheet = FakeSpreadsheet.from_records(
+            {"spa_info": SPA_INFO, "booking_data": BOOKING_DATA[:3]}
+        )
+        self.worksheet = self.spreadsheet.sheets["booking_data"]
+        self.sheet = SpaSheet(self.spreadsheet, delta_sync=True)
+        self.index = self.sheet.bookings
+        self.index.get()
+        self.spreadsheet.limiter.reset()
+
+    def append(self, record: dict) -> None:
+        header = self.worksheet.rows[0]
+        self.worksheet.rows.append([record.get(key, "") for key in header])
+
+    def test_index_type(self):
+        self.assertIsInstance(self.index, SyncedBookingIndex)
+        self.assertEqual(len(self.index.get()), 3)
+
+    def test_new_rows_synced(self):
+        self.append(BOOKING_DATA[3])
+        self.append(BOOKING_DATA[4])
+
+        store = self.index.refresh()
+
+        self.assertEqual(self.spreadsheet.limiter.counts, {"batch_get": 1})
+        self.assertEqual(len(store), 5)
+        self.assertEqual(
+            store.booking(4), Booking.from_record(BOOKING_DATA[4])
+        )
+
+    def test_saved_booking_not_duplicated(self):
+        self.sheet.save_booking(BOOKING_DATA[3])
+        self.append(BOOKING_DATA[4])
+
+        store = self.index.refresh()
+
+        self.assertEqual(len(store), 5)
+        self.assertEqual(len(self.index.fingerprints), 5)
+        self.assertNotIn("get_all_values", self.spreadsheet.limiter.counts)
+
+    def test_malformed_row_skipped(self):
+        self.append(dict(BOOKING_DATA[4], date="26/02/2024"))
+        self.append(BOOKING_DATA[3])
+
+        with self.assertLogs("source.sheet_manager", "WARNING"):
+            self.index.refresh()
+
+        self.assertEqual(
+            [row for row, _ in self.index.find("Den", "+353111111111")],
+            [2, 6],
+        )
+
+    def test_booking_saved_during_sync_kept(self):
+        self.append(BOOKING_DATA[3])
+        batch_get = self.worksheet.batch_get
+
+        def read_then_save(ranges):
+            values = batch_get(ranges)
+            # Saved by a session thread while the rows are read
+            self.sheet.save_booking(BOOKING_DATA[4])
+            return values
+
+        with patch.object(
+            self.worksheet, "batch_get", side_effect=read_then_save
+        ):
+            store = self.index.refresh()
+
+        self.assertEqual(len(store), 5)
+        self.assertEqual(len(self.index.fingerprints), 5)
+        self.assertEqual(self.index.find("John", "+353222222222")[-1][0], 6)
+
+    def test_deleted_row_reloads(self):
+        del self.worksheet.rows[2]
+
+        store = self.index.refresh()
+
+        self.assertEqual(len(store), 2)
+        self.assertEqual(self.spreadsheet.limiter.counts["get_all_values"], 1)
+
+    def test_edited_row_reloads(self):
+        self.worksheet.rows[3][1] = "Ann"
+
+        store = self.index.refresh()
+
+        self.assertEqual(store.booking(2).name, "Ann")
+        self.assertEqual(self.spreadsheet.limiter.counts["get_all_values"], 1)
+
+    def test_header_change_reloads(self):
+        self.worksheet.rows[0].append("note")
+
+        self.index.refresh()
+
+        self.assertEqual(self.spreadsheet.limiter.counts["get_all_values"], 1)
+
+    @patch("source.sheet_manager.monotonic")
+    def test_full_sync_interval(self, mock_monotonic):
+        index = SyncedBookingIndex(self.worksheet, 60, full_sync_interval=600)
+        mock_monotonic.return_value = 1000
+        index.get()
+        mock_monotonic.return_value = 1100
+        index.refresh()
+        self.assertEqual(self.spreadsheet.limiter.counts["get_all_values"], 1)
+
+        mock_monotonic.return_value = 1600
+        index.refresh()
+        self.assertEqual(self.spreadsheet.limiter.counts["get_all_values"], 2)
+
+    def test_delete_bookings_keeps_sync(self):
+        bookings = self.sheet.find_bookings("Den", "+353111111111")
+        self.sheet.delete_bookings(bookings)
+        self.append(BOOKING_DATA[3])
+
+        store = self.index.refresh()
+
+        self.assertEqual(len(store), 3)
+        self.assertEqual(len(self.index.fingerprints), 3)
+        self.assertNotIn("get_all_values", self.spreadsheet.limiter.counts)
+
+
+class TestPrefetch(TestCase):
+    def setUp(self):
+        self.spreadsheet = FakeSpreadsheet.from_records(
+            {"spa_info": SPA_INFO, "booking_data": BOOKING_DATA[:3]},
+            latency=0.1,
+        )
+        self.sheet = SpaSheet(self.spreadsheet)
+        self.spreadsheet.limiter.reset()
+
+    def test_prefetch_in_parallel(self):
+        started = monotonic()
+        result = self.sheet.prefetch()
+
+        self.assertTrue(result)
+        self.assertLess(monotonic() - started, 0.25)
+        self.assertEqual(
+            self.spreadsheet.limiter.counts, {"values_batch_get": 1}
+        )
+        self.assertFalse(self.sheet.catalog.is_stale)
+        self.assertFalse(self.sheet.bookings.is_stale)
+        self.assertFalse(self.sheet.booking_header.is_stale)
+
+    def test_deadline(self):
+        result = self.sheet.prefetch(timeout=0.01)
+        services = self.sheet.get_services()
+
+        self.assertFalse(result)
+        self.assertEqual(len(services), len(SPA_INFO))
+        # The menu waits for the prefetch instead of loading again
+        self.assertEqual(
+            self.spreadsheet.limiter.counts, {"values_batch_get": 1}
+        )
+
+    def test_failed_load(self):
+        self.spreadsheet.limiter.quotas["read"] = 0
+
+        self.assertFalse(self.sheet.prefetch())
+        self.assertTrue(self.sheet.catalog.is_stale)
+
+    def test_header_cached(self):
+        self.sheet.prefetch()
+        self.sheet.save_booking(dict(BOOKING_DATA[3], name="Ann"))
+        self.sheet.save_booking(dict(BOOKING_DATA[4], name="Ann"))
+
+        self.assertEqual(
+            self.spreadsheet.limiter.counts,
+            {"values_batch_get": 1, "worksheet": 1, "append_rows": 2},
+        )
@@ -0,0 +1,233 @@
+import threading
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from gspread.exceptions import APIError
+from requests import Response
+
+from source.fake_spreadsheet import FakeSpreadsheet, quota_error
+from source.sheet_manager import SpaSheet
+from source.sheets_client import (
+    QuotaSpreadsheet,
+    SheetConnection,
+    SheetsClient,
+    SingleFlight,
+    TokenBucket,
+)
+from tests.test_sheet_manager import BOOKING_DATA, SPA_INFO
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def server_error(status: int = 503) -> APIError:
+    response = Response()
+    response.status_code = status
+    response._content = b'{"error": {"code": 503, "message": "Unavailable"}}'
+    return APIError(response)
+
+
+class TestTokenBucket(TestCase):
+    def test_burst_then_rate(self):
+        fake_time = FakeTime()
+        bucket = TokenBucket(1, 2, fake_time.clock, fake_time.sleep)
+
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertAlmostEqual(bucket.acquire(), 1)
+
+    def test_refill(self):
+        fake_time = FakeTime()
+        bucket = TokenBucket(1, 1, fake_time.clock, fake_time.sleep)
+        bucket.acquire()
+        fake_time.now = 5
+
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertEqual(fake_time.sleeps, [])
+
+
+class TestSingleFlight(TestCase):
+    def test_concurrent_calls_share_result(self):
+        single_flight = SingleFlight()
+        started = threading.Event()
+        joined = threading.Event()
+        release = threading.Event()
+        func = MagicMock(return_value="result")
+
+        class JoinEvent(threading.Event):
+            def wait(self, timeout=None):
+                joined.set()
+                return super().wait(timeout)
+
+        def slow():
+            single_flight.calls["key"].done = JoinEvent()
+            started.set()
+            release.wait()
+            return func()
+
+        results = []
+        leader = threading.Thread(
+            target=lambda: results.append(single_flight.do("key", slow))
+        )
+        leader.start()
+        started.wait()
+        follower = threading.Thread(
+            target=lambda: results.append(single_flight.do("key", func))
+        )
+        follower.start()
+        joined.wait()
+        release.set()
+        leader.join()
+        follower.join()
+
+        func.assert_called_once()
+        self.assertEqual(
+            sorted(results), [("result", False), ("result", True)]
+        )
+        self.assertEqual(single_flight.calls, {})
+
+    def test_error_is_raised(self):
+        single_flight = SingleFlight()
+
+        with self.assertRaises(KeyError):
+            single_flight.do("key", MagicMock(side_effect=KeyError))
+
+        self.assertEqual(single_flight.do("key", lambda: 1), (1, False))
+
+
+class TestSheetsClient(TestCase):
+    def setUp(self):
+        self.fake_time = FakeTime()
+        self.client = SheetsClient(
+            read_quota=60,
+            clock=self.fake_time.clock,
+            sleep=self.fake_time.sleep,
+        )
+
+    def test_retry_on_quota_error(self):
+        func = MagicMock(side_effect=[quota_error("read"), "result"])
+
+        result = self.client.read("key", func)
+
+        self.assertEqual(result, "result")
+        self.assertEqual(func.call_count, 2)
+        self.assertEqual(self.client.stats()["retried"], 1)
+        self.assertEqual(self.client.stats()["requests"], 2)
+
+    def test_backoff_with_jitter(self):
+        func = MagicMock(side_effect=[server_error()] * 3 + ["result"])
+
+        with patch(
+            "source.sheets_client.random.uniform", side_effect=max
+        ) as mock_uniform:
+            self.client.read("key", func)
+
+        self.assertEqual(self.fake_time.sleeps, [1, 2, 4])
+        self.assertEqual(mock_uniform.call_args.args, (0, 4))
+
+    def test_give_up_after_max_retries(self):
+        client = SheetsClient(max_retries=2, sleep=self.fake_time.sleep)
+        func = MagicMock(side_effect=quota_error("read"))
+
+        with self.assertRaises(APIError):
+            client.read("key", func)
+
+        self.assertEqual(func.call_count, 3)
+        self.assertEqual(client.stats()["failed"], 1)
+
+    def test_write_not_retried_on_server_error(self):
+        func = MagicMock(side_effect=server_error())
+
+        with self.assertRaises(APIError):
+            self.client.write(func)
+
+        func.assert_called_once()
+
+    def test_not_found_not_retried(self):
+        func = MagicMock(side_effect=server_error(404))
+
+        with self.assertRaises(APIError):
+            self.client.read("key", func)
+
+        func.assert_called_once()
+
+    def test_throttled(self):
+        client = SheetsClient(
+            read_quota=1,
+            clock=self.fake_time.clock,
+            sleep=self.fake_time.sleep,
+        )
+
+        client.read("first", MagicMock())
+        client.read("second", MagicMock())
+
+        self.assertEqual(client.stats()["throttled"], 1)
+        self.assertAlmostEqual(self.fake_time.now, 60)
+
+
+class TestQuotaSpreadsheet(TestCase):
+    def setUp(self):
+        self.fake_time = FakeTime()
+        self.spreadsheet = FakeSpreadsheet.from_records(
+            {"spa_info": SPA_INFO, "booking_data": BOOKING_DATA}
+        )
+        self.client = SheetsClient(
+            clock=self.fake_time.clock, sleep=self.fake_time.sleep
+        )
+        self.spa_sheet = SpaSheet(
+            QuotaSpreadsheet(self.spreadsheet, self.client)
+        )
+
+    def test_spa_sheet_survives_quota_errors(self):
+        self.spreadsheet.limiter.quotas["read"] = 1
+        self.spreadsheet.limiter.window = 5
+        self.spreadsheet.limiter.clock = self.fake_time.clock
+        self.spreadsheet.limiter.reset()
+
+        with patch("source.sheets_client.random.uniform", side_effect=max):
+            services = self.spa_sheet.get_services("main")
+            self.spa_sheet.bookings.refresh()
+            bookings = self.spa_sheet.find_bookings("Den", "+353111111111")
+
+        self.assertEqual(len(services), 2)
+        self.assertEqual(len(bookings), 2)
+        self.assertGreater(self.client.stats()["retried"], 0)
+
+    def test_worksheet_attributes(self):
+        self.assertEqual(self.spa_sheet.booking_data.title, "booking_data")
+        self.assertEqual(
+            self.spa_sheet.booking_data.id,
+            self.spreadsheet.sheets["booking_data"].id,
+        )
+
+    def test_writes_through_client(self):
+        self.spa_sheet.save_booking(dict(BOOKING_DATA[0], name="Ann"))
+
+        self.assertEqual(self.spreadsheet.limiter.counts["append_rows"], 1)
+        self.assertEqual(self.client.stats()["requests"], 3)
+
+
+class TestSheetConnection(TestCase):
+    @patch("source.sheets_client.gspread.authorize")
+    @patch("source.sheets_client.Credentials.from_service_account_file")
+    def test_opened_once_on_first_use(self, mock_credentials, mock_authorize):
+        connection = SheetConnection("spa_booking")
+
+        mock_authorize.assert_not_called()
+        first = connection.open()
+        second = connection.open()
+
+        self.assertIs(first, second)
+        mock_credentials.assert_called_once()
+        mock_authorize.return_value.open.assert_called_once_with("spa_booking")
+        self.assertIs(first.client, connection.client)
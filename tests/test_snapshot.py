@@ -0,0 +1,154 @@
+import os
+import pickle
+from datetime import date
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from source.fake_spreadsheet import FakeSpreadsheet, quota_error
+from source.sheet_manager import SpaSheet
+from source.snapshot import SCHEMA_VERSION, Snapshot
+from tests.test_sheet_manager import BOOKING_DATA, SPA_INFO
+
+MONDAY = date(2024, 2, 26)
+
+
+class TestSnapshot(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "snapshot.pickle")
+        self.snapshot = Snapshot("spa_booking", self.path)
+        self.spreadsheet = FakeSpreadsheet.from_records(
+            {"spa_info": SPA_INFO, "booking_data": BOOKING_DATA[:3]}
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def saved_sheet(self, **kwargs) -> SpaSheet:
+        sheet = SpaSheet(self.spreadsheet, **kwargs)
+        sheet.get_services()
+        sheet.bookings.get()
+        self.assertTrue(self.snapshot.save(sheet))
+        return sheet
+
+    def test_load_without_requests(self):
+        sheet = self.saved_sheet()
+        new_sheet = SpaSheet(self.spreadsheet)
+        self.spreadsheet.limiter.reset()
+
+        self.assertTrue(self.snapshot.load(new_sheet))
+        self.assertEqual(new_sheet.get_services(), sheet.get_services())
+        self.assertEqual(
+            new_sheet.booked_intervals("service1", MONDAY),
+            sheet.booked_intervals("service1", MONDAY),
+        )
+        self.assertEqual(self.spreadsheet.limiter.total, 0)
+
+    def test_load_before_opening(self):
+        sheet = self.saved_sheet()
+        connection = MagicMock()
+        connection.open.return_value = self.spreadsheet
+        new_sheet = SpaSheet(None, connection=connection)
+
+        self.assertTrue(self.snapshot.load(new_sheet))
+        self.assertEqual(new_sheet.get_services(), sheet.get_services())
+        connection.open.assert_not_called()
+
+        new_sheet.reload()
+        connection.open.assert_called_once()
+
+    def test_stored_time_added_to_age(self):
+        self.saved_sheet()
+        with open(self.path, "rb") as file:
+            payload = pickle.load(file)
+        with open(self.path, "wb") as file:
+            pickle.dump(dict(payload, saved_at=payload["saved_at"] - 90), file)
+        new_sheet = SpaSheet(self.spreadsheet)
+
+        self.assertTrue(self.snapshot.load(new_sheet))
+        self.assertTrue(new_sheet.bookings.is_stale)
+        self.assertFalse(new_sheet.catalog.is_stale)
+
+    def test_missing_snapshot(self):
+        self.assertFalse(self.snapshot.load(SpaSheet(self.spreadsheet)))
+
+    def test_damaged_snapshot(self):
+        with open(self.path, "wb") as file:
+            file.write(b"not a pickle")
+
+        self.assertFalse(self.snapshot.load(SpaSheet(self.spreadsheet)))
+
+    def test_snapshot_of_removed_class(self):
+        with open(self.path, "wb") as file:
+            file.write(b"csource.removed_module\nBookingStore\n.")
+
+        self.assertFalse(self.snapshot.load(SpaSheet(self.spreadsheet)))
+
+    def test_outdated_schema(self):
+        self.saved_sheet()
+        with open(self.path, "rb") as file:
+            payload = pickle.load(file)
+        with open(self.path, "wb") as file:
+            pickle.dump(dict(payload, version=SCHEMA_VERSION - 1), file)
+
+        self.assertFalse(self.snapshot.load(SpaSheet(self.spreadsheet)))
+
+    def test_other_spreadsheet(self):
+        self.saved_sheet()
+        other = Snapshot("other", self.path)
+
+        self.assertFalse(other.load(SpaSheet(self.spreadsheet)))
+
+    def test_nothing_loaded_nothing_saved(self):
+        self.assertFalse(self.snapshot.save(SpaSheet(self.spreadsheet)))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_revalidate(self):
+        self.saved_sheet()
+        self.spreadsheet.sheets["booking_data"].append_rows(
+            [[BOOKING_DATA[3][key] for key in BOOKING_DATA[3]]]
+        )
+        new_sheet = SpaSheet(self.spreadsheet)
+        self.snapshot.load(new_sheet)
+        self.spreadsheet.limiter.reset()
+
+        self.snapshot.revalidate(new_sheet).join()
+
+        self.assertEqual(len(new_sheet.bookings.get()), 4)
+        self.assertEqual(
+            self.spreadsheet.limiter.counts["values_batch_get"], 1
+        )
+        reloaded = SpaSheet(self.spreadsheet)
+        self.snapshot.load(reloaded)
+        self.assertEqual(len(reloaded.bookings.get()), 4)
+
+    def test_revalidate_api_error(self):
+        self.saved_sheet()
+        new_sheet = SpaSheet(self.spreadsheet)
+        self.snapshot.load(new_sheet)
+
+        with patch.object(
+            self.spreadsheet,
+            "values_batch_get",
+            side_effect=quota_error("read"),
+        ):
+            self.snapshot.revalidate(new_sheet).join()
+
+        self.assertEqual(len(new_sheet.bookings.get()), 3)
+
+    def test_delta_sync_state(self):
+        sheet = self.saved_sheet(delta_sync=True)
+        new_sheet = SpaSheet(self.spreadsheet, delta_sync=True)
+        self.snapshot.load(new_sheet)
+        self.spreadsheet.limiter.reset()
+
+        new_sheet.bookings.refresh()
+
+        self.assertEqual(
+            new_sheet.bookings.fingerprints, sheet.bookings.fingerprints
+        )
+        # The worksheet is looked up on the first sync
+        self.assertEqual(
+            self.spreadsheet.limiter.counts, {"worksheet": 1, "batch_get": 1}
+        )
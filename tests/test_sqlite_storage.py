@@ -0,0 +1,114 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from unittest import TestCase
+
+from source.sheet_manager import Booking
+from source.sqlite_storage import SQLiteStorage
+from tests.test_sheet_manager import BOOKING_DATA, SPA_INFO
+
+
+class TestSQLiteStorage(TestCase):
+    def setUp(self):
+        self.storage = SQLiteStorage(":memory:")
+        self.storage.import_records(SPA_INFO, BOOKING_DATA[:5])
+
+    def test_get_services(self):
+        result = self.storage.get_services("main")
+
+        self.assertEqual(
+            [service.name for service in result], ["service1", "service3"]
+        )
+        self.assertEqual(self.storage.get_service("service4").duration, 4.0)
+
+    def test_booked_intervals(self):
+        result = self.storage.booked_intervals("service1", date(2024, 2, 26))
+
+        self.assertEqual(result, [(480, 600), (600, 720), (1140, 1260)])
+
+    def test_get_available_times_for_date_and_service(self):
+        result = self.storage.get_available_times_for_date_and_service(
+            "2024-02-26", "service1"
+        )
+
+        self.assertEqual(
+            [time_range[0].hour for time_range in result],
+            [12, 13, 14, 15, 16, 17],
+        )
+
+    def test_find_bookings(self):
+        result = self.storage.find_bookings("Den", "+353 111111111")
+
+        self.assertEqual(
+            [booking for _, booking in result],
+            [
+                Booking.from_record(BOOKING_DATA[0]),
+                Booking.from_record(BOOKING_DATA[3]),
+            ],
+        )
+
+    def test_save_booking(self):
+        info = {
+            "service": "service3",
+            "name": "Joe",
+            "phone_number": "+353123456789",
+            "date": "2024-02-27",
+            "start_time": "09:00",
+            "end_time": "12:00",
+        }
+
+        self.storage.save_booking(info)
+
+        self.assertEqual(
+            self.storage.booked_intervals("service3", date(2024, 2, 27)),
+            [(540, 720)],
+        )
+        self.assertEqual(
+            len(self.storage.find_bookings("Joe", "+353123456789")), 1
+        )
+
+    def test_delete_bookings(self):
+        bookings = self.storage.find_bookings("John", "+353222222222")
+
+        self.storage.delete_bookings(bookings)
+
+        self.assertEqual(
+            self.storage.find_bookings("John", "+353222222222"), []
+        )
+        self.assertEqual(
+            self.storage.booked_intervals("service1", date(2024, 2, 26)),
+            [(480, 600)],
+        )
+
+    def test_import_skips_malformed_rows(self):
+        bookings = [BOOKING_DATA[0], dict(BOOKING_DATA[1], date="")]
+
+        self.storage.import_records(SPA_INFO, bookings)
+
+        self.assertEqual(
+            self.storage.booked_intervals("service1", date(2024, 2, 26)),
+            [(480, 600)],
+        )
+
+    def test_failed_import_keeps_data(self):
+        with self.assertRaises(sqlite3.Error):
+            self.storage.import_records([{"name": "service9"}], [])
+
+        self.assertEqual(len(self.storage.get_services("main")), 2)
+        self.assertEqual(
+            len(self.storage.find_bookings("Den", "+353 111111111")), 2
+        )
+
+    def test_threads_share_connection(self):
+        info = dict(BOOKING_DATA[0], name="Ann")
+
+        def book(_):
+            self.storage.save_booking(info)
+            return self.storage.find_bookings("Ann", info["phone_number"])
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(book, range(20)))
+
+        self.assertEqual(
+            len(self.storage.find_bookings("Ann", info["phone_number"])), 20
+        )
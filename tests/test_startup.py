@@ -0,0 +1,49 @@
+import builtins
+import sys
+from unittest import TestCase
+
+from source.startup import StartupProfile, warm_up
+
+
+class TestStartupProfile(TestCase):
+    def test_phases(self):
+        profile = StartupProfile()
+
+        with profile.phase("storage"):
+            pass
+
+        self.assertEqual([name for name, _ in profile.phases], ["storage"])
+        self.assertIn("storage", profile.report()[1])
+
+    def test_imports_timed(self):
+        sys.modules.pop("colorsys", None)
+        original_import = builtins.__import__
+        profile = StartupProfile()
+        profile.install()
+        try:
+            import colorsys  # noqa: F401
+        finally:
+            profile.uninstall()
+
+        self.assertEqual(
+            [(depth, name) for depth, name, _, _ in profile.imports],
+            [(0, "colorsys")],
+        )
+        self.assertIs(builtins.__import__, original_import)
+
+    def test_disabled(self):
+        original_import = builtins.__import__
+        profile = StartupProfile(enabled=False)
+
+        profile.install()
+
+        self.assertIs(builtins.__import__, original_import)
+
+
+class TestWarmUp(TestCase):
+    def test_modules_imported(self):
+        sys.modules.pop("colorsys", None)
+
+        warm_up(("colorsys", "missing_module")).join()
+
+        self.assertIn("colorsys", sys.modules)
@@ -5,6 +5,7 @@ from unittest import TestCase
 # https://stackoverflow.com/questions/4481954/trying-to-mock-datetime-date-today-but-not-working
 from freezegun import freeze_time
 
+from source.availability import SlotMask
 from source.validators import (
     validate_date,
     validate_integer_option,
@@ -155,11 +156,32 @@ class ValidateTime(TestCase):
         ]
 
     def test_valid_time(self):
-        data = "08:30"
+        data = "08:00"
         result = validate_time(data, self.time_ranges)
 
         self.assertIsNone(result)
 
+    def test_time_not_start_of_range(self):
+        data = "08:30"
+        message = "Your time is not in the available time ranges."
+
+        with self.assertRaises(ValueError) as context:
+            validate_time(data, self.time_ranges)
+
+        self.assertEqual(str(context.exception), message)
+
+    def test_valid_time_slot_mask(self):
+        slot_mask = SlotMask.from_minutes([480, 900, 1020])
+        result = validate_time("17:00", slot_mask)
+
+        self.assertIsNone(result)
+
+    def test_time_not_in_slot_mask(self):
+        slot_mask = SlotMask.from_minutes([480, 900, 1020])
+
+        with self.assertRaises(ValueError):
+            validate_time("17:05", slot_mask)
+
     def test_time_not_in_range(self):
         data = "10:00"
         message = "Your time is not in the available time ranges."
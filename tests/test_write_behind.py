@@ -0,0 +1,224 @@
+import os
+import time
+from datetime import date
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from source.fake_spreadsheet import FakeSpreadsheet
+from source.sheet_manager import SpaSheet
+from source.write_behind import BookingFlusher, BookingQueue
+from tests.test_sheet_manager import BOOKING_DATA, SPA_INFO
+
+NEW_BOOKING = dict(
+    BOOKING_DATA[0], name="Ann", start_time="16:00", end_time="18:00"
+)
+
+
+class TestBookingQueue(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "queue.jsonl")
+        self.queues = []
+
+    def tearDown(self):
+        for queue in self.queues:
+            queue.close()
+        self.directory.cleanup()
+
+    def queue(self) -> BookingQueue:
+        queue = BookingQueue(self.path)
+        self.queues.append(queue)
+        return queue
+
+    def test_put_and_pending(self):
+        queue = self.queue()
+        first = queue.put(BOOKING_DATA[0])
+        second = queue.put(BOOKING_DATA[1])
+
+        self.assertEqual(
+            queue.pending(),
+            [(first, BOOKING_DATA[0]), (second, BOOKING_DATA[1])],
+        )
+        self.assertEqual(queue.pending(1), [(first, BOOKING_DATA[0])])
+        self.assertEqual(queue.replayed, set())
+
+    def test_replay_after_restart(self):
+        queue = self.queue()
+        first = queue.put(BOOKING_DATA[0])
+        second = queue.put(BOOKING_DATA[1])
+        queue.ack([first])
+        queue.close()
+
+        replayed = self.queue()
+
+        self.assertEqual(replayed.records(), [BOOKING_DATA[1]])
+        self.assertEqual(replayed.replayed, {second})
+        self.assertFalse(os.path.exists(queue.path))
+
+    def test_cut_last_line(self):
+        queue = self.queue()
+        queue.put(BOOKING_DATA[0])
+        queue.close()
+        with open(queue.path, "a", encoding="utf-8") as file:
+            file.write('{"id": "cut", "rec')
+
+        replayed = self.queue()
+        replayed.put(BOOKING_DATA[1])
+        replayed.close()
+
+        self.assertEqual(
+            self.queue().records(), [BOOKING_DATA[0], BOOKING_DATA[1]]
+        )
+
+    def test_file_cleared_when_empty(self):
+        queue = self.queue()
+        queue.ack([queue.put(BOOKING_DATA[0])])
+
+        self.assertEqual(os.path.getsize(queue.path), 0)
+
+        queue.close()
+
+        self.assertFalse(os.path.exists(queue.path))
+
+    def test_processes_keep_own_bookings(self):
+        first = self.queue()
+        second = self.queue()
+        first.ack([first.put(BOOKING_DATA[0])])
+        entry_id = second.put(BOOKING_DATA[1])
+
+        # Started while both processes are running
+        third = self.queue()
+
+        self.assertEqual(len(third), 0)
+        self.assertEqual(second.records(), [BOOKING_DATA[1]])
+        self.assertEqual(first.records(), [])
+
+        second.close()
+        fourth = self.queue()
+        fifth = self.queue()
+
+        self.assertEqual(fourth.records(), [BOOKING_DATA[1]])
+        self.assertEqual(fourth.replayed, {entry_id})
+        self.assertEqual(len(fifth), 0)
+
+
+class TestWriteBehindSheet(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "queue.jsonl")
+        self.spreadsheet = FakeSpreadsheet.from_records(
+            {"spa_info": SPA_INFO, "booking_data": BOOKING_DATA[:3]}
+        )
+        self.booking_data = self.spreadsheet.sheets["booking_data"]
+        self.spa_sheet = SpaSheet(
+            self.spreadsheet, queue=BookingQueue(self.path)
+        )
+        self.spreadsheet.limiter.reset()
+
+    def tearDown(self):
+        self.spa_sheet.queue.close()
+        self.directory.cleanup()
+
+    def test_save_booking_is_queued(self):
+        self.spa_sheet.save_booking(NEW_BOOKING)
+
+        self.assertEqual(self.spreadsheet.limiter.total, 0)
+        self.assertEqual(len(self.spa_sheet.queue), 1)
+
+    def test_queued_booking_is_booked(self):
+        self.spa_sheet.save_booking(NEW_BOOKING)
+        self.spa_sheet.bookings.invalidate()
+
+        self.assertIn(
+            (960, 1080),
+            self.spa_sheet.booked_intervals("service1", date(2024, 2, 26)),
+        )
+
+    def test_flush_in_one_request(self):
+        for start_time in ("16:00", "18:00", "19:00"):
+            self.spa_sheet.save_booking(
+                dict(NEW_BOOKING, start_time=start_time)
+            )
+
+        appended = BookingFlusher(self.spa_sheet).flush()
+
+        self.assertEqual(appended, 3)
+        self.assertEqual(self.spreadsheet.limiter.counts["append_rows"], 1)
+        self.assertEqual(self.booking_data.row_count, 7)
+        self.assertEqual(len(self.spa_sheet.queue), 0)
+
+    def test_flush_in_batches(self):
+        for start_time in ("16:00", "18:00", "19:00"):
+            self.spa_sheet.save_booking(
+                dict(NEW_BOOKING, start_time=start_time)
+            )
+
+        BookingFlusher(self.spa_sheet, batch_size=2).flush()
+
+        self.assertEqual(self.spreadsheet.limiter.counts["append_rows"], 2)
+
+    def test_replay_skips_written_bookings(self):
+        self.spa_sheet.save_booking(NEW_BOOKING)
+        self.spa_sheet.save_booking(dict(NEW_BOOKING, start_time="19:00"))
+        # The process stopped after the first row was appended
+        self.booking_data.append_rows(
+            [[NEW_BOOKING.get(key, "") for key in self.booking_data.rows[0]]]
+        )
+
+        self.spa_sheet.queue.close()
+        spa_sheet = SpaSheet(self.spreadsheet, queue=BookingQueue(self.path))
+        BookingFlusher(spa_sheet).flush()
+        spa_sheet.queue.close()
+
+        self.assertEqual(
+            self.booking_data.col_values(4)[-2:], ["16:00", "19:00"]
+        )
+        self.assertEqual(self.booking_data.row_count, 6)
+
+    def test_stop_flushes_queue(self):
+        flusher = BookingFlusher(self.spa_sheet, interval=60)
+        flusher.start()
+        self.spa_sheet.save_booking(NEW_BOOKING)
+
+        flusher.stop()
+
+        self.assertFalse(flusher.is_alive())
+        self.assertEqual(self.booking_data.row_count, 5)
+
+    def test_flusher_survives_errors(self):
+        flusher = BookingFlusher(self.spa_sheet, interval=0.01)
+        append_bookings = self.spa_sheet.append_bookings
+        self.spa_sheet.append_bookings = MagicMock(
+            side_effect=[ValueError("changed"), None]
+        )
+        self.spa_sheet.save_booking(NEW_BOOKING)
+
+        with self.assertLogs("source.write_behind"):
+            flusher.start()
+            while self.spa_sheet.append_bookings.call_count < 2:
+                time.sleep(0.01)
+        self.spa_sheet.append_bookings = append_bookings
+        flusher.stop()
+
+        self.assertFalse(flusher.is_alive())
+        self.assertEqual(len(self.spa_sheet.queue), 0)
+
+    def test_queued_booking_not_cancelled(self):
+        self.spa_sheet.save_booking(NEW_BOOKING)
+
+        self.assertEqual(
+            self.spa_sheet.find_bookings("Ann", "+353111111111"), []
+        )
+
+        BookingFlusher(self.spa_sheet).flush()
+
+        self.assertEqual(
+            [
+                row_number
+                for row_number, _ in self.spa_sheet.find_bookings(
+                    "Ann", "+353111111111"
+                )
+            ],
+            [5],
+        )